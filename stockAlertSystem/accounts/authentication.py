@@ -0,0 +1,34 @@
+from asgiref.sync import sync_to_async
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+def get_raw_jwt(request):
+    """
+    Read the JWT from the Authorization header, falling back to a ?token= query
+    parameter for clients such as EventSource that cannot set headers
+    """
+    authentication = JWTAuthentication()
+    header = authentication.get_header(request)
+    if header:
+        try:
+            return authentication.get_raw_token(header)
+        except AuthenticationFailed:
+            return None
+    return request.GET.get('token') or None
+
+def authenticate_jwt(request):
+    """Return the user for the request's JWT, or None if it is missing or invalid"""
+    raw_token = get_raw_jwt(request)
+    if raw_token is None:
+        return None
+    
+    authentication = JWTAuthentication()
+    try:
+        validated_token = authentication.get_validated_token(raw_token)
+        return authentication.get_user(validated_token)
+    except AuthenticationFailed:
+        return None
+
+async def aauthenticate_jwt(request):
+    """Async variant of authenticate_jwt for plain Django async views"""
+    return await sync_to_async(authenticate_jwt)(request)
@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Alert, AlertHistory
+from django.utils import timezone
+from .models import Alert, AlertHistory, AlertCheckWatermark
 
 @admin.register(Alert)
 class AlertAdmin(admin.ModelAdmin):
@@ -21,6 +22,10 @@ class AlertAdmin(admin.ModelAdmin):
             'fields': ('duration_minutes',),
             'classes': ('collapse',)
         }),
+        ('Percent Change / Crossover Settings', {
+            'fields': ('percent_change', 'period'),
+            'classes': ('collapse',)
+        }),
         ('Status', {
             'fields': ('status', 'is_active')
         }),
@@ -33,17 +38,17 @@ class AlertAdmin(admin.ModelAdmin):
     actions = ['activate_alerts', 'deactivate_alerts', 'reset_to_active']
     
     def activate_alerts(self, request, queryset):
-        updated = queryset.update(is_active=True)
+        updated = queryset.update(is_active=True, updated_at=timezone.now())
         self.message_user(request, f'{updated} alerts activated.')
     activate_alerts.short_description = "Activate selected alerts"
     
     def deactivate_alerts(self, request, queryset):
-        updated = queryset.update(is_active=False)
+        updated = queryset.update(is_active=False, updated_at=timezone.now())
         self.message_user(request, f'{updated} alerts deactivated.')
     deactivate_alerts.short_description = "Deactivate selected alerts"
     
     def reset_to_active(self, request, queryset):
-        updated = queryset.update(status='active', condition_start_time=None)
+        updated = queryset.update(status='active', condition_start_time=None, updated_at=timezone.now())
         self.message_user(request, f'{updated} alerts reset to active status.')
     reset_to_active.short_description = "Reset alerts to active status"
 
@@ -66,3 +71,8 @@ class AlertHistoryAdmin(admin.ModelAdmin):
     
     def has_change_permission(self, request, obj=None):
         return False  # AlertHistory records should not be modified
+
+@admin.register(AlertCheckWatermark)
+class AlertCheckWatermarkAdmin(admin.ModelAdmin):
+    list_display = ['name', 'checked_at', 'updated_at']
+    readonly_fields = ['updated_at']
@@ -0,0 +1,310 @@
+import bisect
+import logging
+import threading
+from array import array
+from datetime import timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+from stocks.fixedpoint import to_cents
+
+logger = logging.getLogger(__name__)
+
+# (alert_type, condition) packed into one byte; 0 is an unknown combination
+CONDITION_CODES = {
+    ('threshold', 'above'): 1,
+    ('threshold', 'below'): 2,
+    ('threshold', 'equals'): 3,
+    ('duration', 'above'): 4,
+    ('duration', 'below'): 5,
+    ('duration', 'equals'): 6,
+    ('percent', 'above'): 7,
+    ('percent', 'below'): 8,
+    ('percent', 'either'): 9,
+    ('sma_cross', 'above'): 10,
+    ('sma_cross', 'below'): 11,
+    ('ema_cross', 'above'): 12,
+    ('ema_cross', 'below'): 13,
+}
+
+# Codes whose target column holds a price, as opposed to a percent in basis points
+PRICE_TARGET_CODES = frozenset(range(1, 7))
+CONDITIONS_BY_CODE = {code: key for key, code in CONDITION_CODES.items()}
+
+# Record states. Removed rows stay in the index as tombstones until the next full load.
+STATE_INACTIVE = 0
+STATE_ACTIVE = 1
+STATE_TRIGGERED = 2
+STATE_REMOVED = 3
+
+# Columns read by the loaders, in AlertRecord.from_row order
+RECORD_FIELDS = (
+    'id', 'user_id', 'stock_id', 'alert_type', 'condition', 'target_price',
+    'duration_minutes', 'is_active', 'status', 'percent_change', 'period',
+)
+
+# Re-read alerts edited this close to the last sync, as the checker's watermark does
+SYNC_OVERLAP = timedelta(seconds=5)
+
+def alert_state(is_active, status):
+    if not is_active or status == 'inactive':
+        return STATE_INACTIVE
+    return STATE_TRIGGERED if status == 'triggered' else STATE_ACTIVE
+
+class AlertRecord:
+    """
+    Compact alert for in-memory evaluation: just the fields the engine needs,
+    with the target in integer cents instead of a Decimal. Percent change alerts
+    keep the percentage in basis points as their target and the window as their
+    duration; crossover alerts keep the period as their duration.
+    """
+    __slots__ = ('id', 'user_id', 'stock_id', 'condition', 'target_cents', 'duration_minutes', 'state')
+
+    def __init__(self, id, user_id, stock_id, condition, target_cents, duration_minutes, state):
+        self.id = id
+        self.user_id = user_id
+        self.stock_id = stock_id
+        self.condition = condition
+        self.target_cents = target_cents
+        self.duration_minutes = duration_minutes
+        self.state = state
+
+    @classmethod
+    def from_row(cls, row):
+        """Build a record from a values_list(*RECORD_FIELDS) row"""
+        (alert_id, user_id, stock_id, alert_type, condition, target_price,
+         duration_minutes, is_active, status, percent_change, period) = row
+        if alert_type in ('threshold', 'duration'):
+            target, duration = to_cents(target_price), duration_minutes
+        else:
+            # Basis points share the cents conversion: 2.5% -> 250
+            target, duration = to_cents(percent_change), period
+        return cls(
+            alert_id, user_id, stock_id, CONDITION_CODES.get((alert_type, condition), 0),
+            target or 0, duration or 0, alert_state(is_active, status)
+        )
+
+    @classmethod
+    def from_alert(cls, alert):
+        return cls.from_row(tuple(getattr(alert, field) for field in RECORD_FIELDS))
+
+    @property
+    def alert_type(self):
+        return CONDITIONS_BY_CODE.get(self.condition, (None, None))[0]
+
+    def __repr__(self):
+        return f"AlertRecord(id={self.id}, stock_id={self.stock_id}, condition={self.condition}, target_cents={self.target_cents})"
+
+class AlertIndex:
+    """
+    Resident copy of every alert, stored column-wise in typed arrays (about 38
+    bytes per alert) and kept sorted by id. Lookups return AlertRecord views.
+    Writes made in this process are applied through model signals; sync() picks
+    up changes made elsewhere. The scheduled alert check scans it for candidates
+    and refresh planning reads trigger distances from it.
+    """
+    # (attribute, array typecode) in AlertRecord.__slots__ order
+    COLUMNS = (
+        ('ids', 'q'),
+        ('user_ids', 'q'),
+        ('stock_ids', 'q'),
+        ('conditions', 'b'),
+        ('target_cents', 'q'),
+        ('durations', 'i'),
+        ('states', 'b'),
+    )
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            for name, typecode in self.COLUMNS:
+                setattr(self, name, array(typecode))
+            self.removed_count = 0
+            self.synced_at = None
+
+    @property
+    def is_loaded(self):
+        return self.synced_at is not None
+
+    def __len__(self):
+        return len(self.ids) - self.removed_count
+
+    def memory_bytes(self):
+        return sum(getattr(self, name).itemsize * len(getattr(self, name)) for name, _ in self.COLUMNS)
+
+    def _find(self, alert_id):
+        i = bisect.bisect_left(self.ids, alert_id)
+        return i if i < len(self.ids) and self.ids[i] == alert_id else None
+
+    def _columns(self):
+        return [getattr(self, name) for name, _ in self.COLUMNS]
+
+    def _record_at(self, i):
+        return AlertRecord(*(column[i] for column in self._columns()))
+
+    def _values(self, record):
+        return (
+            record.id, record.user_id, record.stock_id, record.condition,
+            record.target_cents, record.duration_minutes, record.state,
+        )
+
+    def upsert(self, record):
+        with self._lock:
+            i = self._find(record.id)
+            if i is not None:
+                if self.states[i] == STATE_REMOVED:
+                    self.removed_count -= 1
+                for column, value in zip(self._columns(), self._values(record)):
+                    column[i] = value
+                return
+
+            # New alerts normally have the highest id, so this is an append
+            i = bisect.bisect_left(self.ids, record.id)
+            for column, value in zip(self._columns(), self._values(record)):
+                if i == len(column):
+                    column.append(value)
+                else:
+                    column.insert(i, value)
+
+    def remove(self, alert_id):
+        """Tombstone an alert; returns whether it was live"""
+        with self._lock:
+            i = self._find(alert_id)
+            if i is None or self.states[i] == STATE_REMOVED:
+                return False
+            self.states[i] = STATE_REMOVED
+            self.removed_count += 1
+            return True
+
+    def set_state(self, alert_ids, state):
+        with self._lock:
+            for alert_id in alert_ids:
+                i = self._find(alert_id)
+                if i is not None and self.states[i] != STATE_REMOVED:
+                    self.states[i] = state
+
+    def get(self, alert_id):
+        with self._lock:
+            i = self._find(alert_id)
+            if i is None or self.states[i] == STATE_REMOVED:
+                return None
+            return self._record_at(i)
+
+    def records(self, state=None):
+        """Live records, optionally only those in one state"""
+        with self._lock:
+            rows = [i for i, row_state in enumerate(self.states)
+                    if row_state != STATE_REMOVED and (state is None or row_state == state)]
+            return [self._record_at(i) for i in rows]
+
+    def active_records(self, stock_ids=None, alert_ids=()):
+        """Active records on the given stocks (every stock when None) plus the given alerts, by id"""
+        with self._lock:
+            rows = [
+                i for i, (alert_id, stock_id, state) in enumerate(zip(self.ids, self.stock_ids, self.states))
+                if state == STATE_ACTIVE and (stock_ids is None or stock_id in stock_ids or alert_id in alert_ids)
+            ]
+            return [self._record_at(i) for i in rows]
+
+    def load(self, queryset=None, chunk_size=10000):
+        """Rebuild the whole index, streaming rows straight from values_list"""
+        from .models import Alert
+
+        started_at = timezone.now()
+        queryset = Alert.objects.all() if queryset is None else queryset
+        columns = [array(typecode) for _, typecode in self.COLUMNS]
+        rows = queryset.order_by('id').values_list(*RECORD_FIELDS).iterator(chunk_size=chunk_size)
+        for row in rows:
+            for column, value in zip(columns, self._values(AlertRecord.from_row(row))):
+                column.append(value)
+
+        with self._lock:
+            for (name, _), column in zip(self.COLUMNS, columns):
+                setattr(self, name, column)
+            self.removed_count = 0
+            self.synced_at = started_at
+
+        logger.info(f"Loaded alert index: {len(self)} alerts, {self.memory_bytes()} bytes")
+        return len(self)
+
+    def sync(self):
+        """
+        Apply alerts created, edited, triggered or deleted since the last load or
+        sync. Triggers do not touch updated_at, so they are found from their
+        AlertHistory rows; deletes from AlertDeletion.
+        """
+        from .models import Alert, AlertHistory, AlertDeletion
+
+        if not self.is_loaded:
+            return self.load()
+
+        started_at = timezone.now()
+        since = self.synced_at - SYNC_OVERLAP
+        triggered_ids = AlertHistory.objects.filter(triggered_at__gte=since).values('alert_id')
+        rows = Alert.objects.filter(
+            Q(updated_at__gte=since) | Q(id__in=triggered_ids)
+        ).values_list(*RECORD_FIELDS)
+        count = 0
+        for row in rows:
+            self.upsert(AlertRecord.from_row(row))
+            count += 1
+        for alert_id in AlertDeletion.objects.filter(deleted_at__gte=since).values_list('alert_id', flat=True):
+            count += self.remove(alert_id)
+        self.synced_at = started_at
+        return count
+
+    def columns(self):
+        """Copies of the column arrays as (name, array) pairs, e.g. for a snapshot"""
+        with self._lock:
+            return [(name, array(typecode, getattr(self, name))) for name, typecode in self.COLUMNS]
+
+    def restore(self, columns, synced_at):
+        """
+        Install column arrays saved by columns(); sync() then applies alerts
+        edited after synced_at
+        """
+        columns = dict(columns)
+        if set(columns) != {name for name, _ in self.COLUMNS} or len({len(c) for c in columns.values()}) != 1:
+            raise ValueError("Incomplete alert index columns")
+        with self._lock:
+            for name, typecode in self.COLUMNS:
+                if columns[name].typecode != typecode:
+                    raise ValueError(f"Column {name} has typecode {columns[name].typecode}, expected {typecode}")
+            for name, _ in self.COLUMNS:
+                setattr(self, name, columns[name])
+            self.removed_count = self.states.count(STATE_REMOVED)
+            self.synced_at = synced_at
+
+    def trigger_distances(self, prices):
+        """
+        Relative distance from each stock's price (cents, keyed by stock id) to its
+        nearest active alert target. Stocks without active price-target alerts are omitted.
+        """
+        distances = {}
+        with self._lock:
+            rows = zip(self.stock_ids, self.conditions, self.target_cents, self.states)
+            for stock_id, condition, target_cents, state in rows:
+                if state != STATE_ACTIVE or condition not in PRICE_TARGET_CODES or stock_id not in prices:
+                    continue
+                price = prices[stock_id]
+                distance = abs(price - target_cents) / price if price else 0.0
+                if distance < distances.get(stock_id, float('inf')):
+                    distances[stock_id] = distance
+        return distances
+
+# Global alert index instance
+alert_index_instance = None
+alert_index_lock = threading.Lock()
+
+def get_alert_index():
+    """Get or create the global in-memory alert index (loaded on first sync)"""
+    global alert_index_instance
+    if alert_index_instance is None:
+        with alert_index_lock:
+            if alert_index_instance is None:
+                alert_index_instance = AlertIndex()
+    return alert_index_instance
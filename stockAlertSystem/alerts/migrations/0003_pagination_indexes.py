@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-19 04:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alerts', '0002_alter_alert_duration_minutes'),
+        ('stocks', '0005_stockpricerollup_rollupwatermark'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='alert_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alerthistory',
+            index=models.Index(fields=['alert', '-triggered_at', '-id'], name='alerthist_alert_trig_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alerthistory',
+            index=models.Index(fields=['-triggered_at', '-id'], name='alerthist_triggered_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.4 on 2026-10-19 04:13
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alerts', '0003_pagination_indexes'),
+        ('stocks', '0005_stockpricerollup_rollupwatermark'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(fields=['user', 'status', '-created_at'], name='alert_user_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['stock', 'status'], name='alert_active_stock_idx'),
+        ),
+    ]
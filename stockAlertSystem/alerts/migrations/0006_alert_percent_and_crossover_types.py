@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-19 04:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alerts', '0005_alertcheckwatermark'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alert',
+            name='percent_change',
+            field=models.DecimalField(blank=True, decimal_places=2, help_text='Move in percent that triggers a percent change alert', max_digits=6, null=True),
+        ),
+        migrations.AddField(
+            model_name='alert',
+            name='period',
+            field=models.PositiveIntegerField(blank=True, help_text='Window in minutes for percent change alerts, number of ticks for SMA/EMA alerts', null=True),
+        ),
+        migrations.AlterField(
+            model_name='alert',
+            name='alert_type',
+            field=models.CharField(choices=[('threshold', 'Threshold Alert'), ('duration', 'Duration Alert'), ('percent', 'Percent Change Alert'), ('sma_cross', 'SMA Crossover Alert'), ('ema_cross', 'EMA Crossover Alert')], max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='alert',
+            name='target_price',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.4 on 2026-10-19 05:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alerts', '0006_alert_percent_and_crossover_types'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlertDeletion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('alert_id', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Alert Deletion',
+                'verbose_name_plural': 'Alert Deletions',
+            },
+        ),
+    ]
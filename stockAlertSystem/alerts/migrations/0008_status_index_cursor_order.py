@@ -0,0 +1,24 @@
+# Generated by Django 5.2.4 on 2026-10-19 06:18
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alerts', '0007_alertdeletion'),
+        ('stocks', '0007_rollupwatermark_compacted_until'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='alert',
+            name='alert_user_status_idx',
+        ),
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(fields=['user', 'status', '-created_at', '-id'], name='alert_user_status_idx'),
+        ),
+    ]
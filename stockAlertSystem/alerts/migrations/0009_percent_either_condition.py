@@ -0,0 +1,30 @@
+# Generated by Django 5.2.4 on 2026-10-19 06:27
+
+from django.db import migrations, models
+
+
+def percent_equals_to_either(apps, schema_editor):
+    """Percent change alerts used 'equals' to mean a move either way"""
+    Alert = apps.get_model('alerts', 'Alert')
+    Alert.objects.filter(alert_type='percent', condition='equals').update(condition='either')
+
+
+def percent_either_to_equals(apps, schema_editor):
+    Alert = apps.get_model('alerts', 'Alert')
+    Alert.objects.filter(alert_type='percent', condition='either').update(condition='equals')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alerts', '0008_status_index_cursor_order'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='alert',
+            name='condition',
+            field=models.CharField(choices=[('above', 'Above'), ('below', 'Below'), ('equals', 'Equals'), ('either', 'Either direction')], max_length=10),
+        ),
+        migrations.RunPython(percent_equals_to_either, percent_either_to_equals),
+    ]
@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.contrib.auth.models import User
 from stocks.models import Stock
 
@@ -6,12 +8,19 @@ class Alert(models.Model):
     ALERT_TYPES = [
         ('threshold', 'Threshold Alert'),
         ('duration', 'Duration Alert'),
+        ('percent', 'Percent Change Alert'),
+        ('sma_cross', 'SMA Crossover Alert'),
+        ('ema_cross', 'EMA Crossover Alert'),
     ]
     
+    # Alert types compared against target_price
+    PRICE_TARGET_TYPES = ('threshold', 'duration')
+    
     CONDITIONS = [
         ('above', 'Above'),
         ('below', 'Below'),
         ('equals', 'Equals'),
+        ('either', 'Either direction'),
     ]
     
     STATUS_CHOICES = [
@@ -24,11 +33,23 @@ class Alert(models.Model):
     stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='alerts')
     alert_type = models.CharField(max_length=10, choices=ALERT_TYPES)
     condition = models.CharField(max_length=10, choices=CONDITIONS)
-    target_price = models.DecimalField(max_digits=10, decimal_places=2)
+    target_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     
     # For duration alerts
     duration_minutes = models.IntegerField(default=0, help_text="Duration in minutes for duration alerts", blank=True, null=True)
     
+    # For percent change and moving average crossover alerts. Condition 'above' means
+    # a rise / crossing above the average, 'below' a fall / crossing below, and
+    # 'either' (percent change only) a move of at least percent_change either way.
+    percent_change = models.DecimalField(
+        max_digits=6, decimal_places=2, null=True, blank=True,
+        help_text="Move in percent that triggers a percent change alert"
+    )
+    period = models.PositiveIntegerField(
+        null=True, blank=True,
+        help_text="Window in minutes for percent change alerts, number of ticks for SMA/EMA alerts"
+    )
+    
     # Alert status and metadata
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='active')
     is_active = models.BooleanField(default=True)
@@ -43,17 +64,59 @@ class Alert(models.Model):
         ordering = ['-created_at']
         verbose_name = "Alert"
         verbose_name_plural = "Alerts"
+        indexes = [
+            # Back the (created_at, id) cursor pagination of a user's alerts
+            models.Index(fields=['user', '-created_at', '-id'], name='alert_user_created_idx'),
+            # User alert lists filtered by status (active/triggered actions), in cursor order
+            models.Index(fields=['user', 'status', '-created_at', '-id'], name='alert_user_status_idx'),
+            # Alert checker: only active alerts, grouped by stock
+            models.Index(
+                fields=['stock', 'status'],
+                condition=models.Q(is_active=True),
+                name='alert_active_stock_idx',
+            ),
+        ]
     
     def __str__(self):
-        return f"{self.user.username} - {self.stock.symbol} {self.condition} {self.target_price}"
+        return f"{self.user.username} - {self.stock.symbol} {self.condition} {self.target_display}"
+    
+    @property
+    def target_display(self):
+        if self.alert_type == 'percent':
+            return f"{self.percent_change}% in {self.period}m"
+        if self.alert_type in ('sma_cross', 'ema_cross'):
+            return f"{self.alert_type[:3].upper()}({self.period})"
+        return self.target_price
     
     @property
     def description(self):
         if self.alert_type == 'threshold':
             return f"Alert when {self.stock.symbol} goes {self.condition} ${self.target_price}"
+        elif self.alert_type == 'percent':
+            direction = {'above': 'rises', 'below': 'falls'}.get(self.condition, 'moves')
+            return f"Alert when {self.stock.symbol} {direction} {self.percent_change}% within {self.period} minutes"
+        elif self.alert_type in ('sma_cross', 'ema_cross'):
+            return f"Alert when {self.stock.symbol} crosses {self.condition} its {self.period}-tick {self.alert_type[:3].upper()}"
         else:
             return f"Alert when {self.stock.symbol} stays {self.condition} ${self.target_price} for {self.duration_minutes} minutes"
 
+# Keep this process's in-memory alert index in step with alert writes made here;
+# other processes pick them up on their next sync (deletes via AlertDeletion)
+@receiver(post_save, sender=Alert)
+def upsert_index_on_save(sender, instance, **kwargs):
+    from .index import get_alert_index, AlertRecord
+    index = get_alert_index()
+    if index.is_loaded:
+        index.upsert(AlertRecord.from_alert(instance))
+
+@receiver(post_delete, sender=Alert)
+def remove_index_on_delete(sender, instance, **kwargs):
+    from .index import get_alert_index
+    AlertDeletion.objects.create(alert_id=instance.id)
+    index = get_alert_index()
+    if index.is_loaded:
+        index.remove(instance.id)
+
 class AlertHistory(models.Model):
     alert = models.ForeignKey(Alert, on_delete=models.CASCADE, related_name='history')
     triggered_at = models.DateTimeField(auto_now_add=True)
@@ -66,6 +129,36 @@ class AlertHistory(models.Model):
         ordering = ['-triggered_at']
         verbose_name = "Alert History"
         verbose_name_plural = "Alert History"
+        # Back the (triggered_at, id) cursor pagination of alert history
+        indexes = [
+            models.Index(fields=['alert', '-triggered_at', '-id'], name='alerthist_alert_trig_idx'),
+            models.Index(fields=['-triggered_at', '-id'], name='alerthist_triggered_idx'),
+        ]
     
     def __str__(self):
         return f"{self.alert.stock.symbol} - {self.triggered_at.strftime('%Y-%m-%d %H:%M')}"
+
+class AlertCheckWatermark(models.Model):
+    """Start time of the last completed alert check; later runs only look at what changed since"""
+    name = models.CharField(max_length=50, unique=True)
+    checked_at = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = "Alert Check Watermark"
+        verbose_name_plural = "Alert Check Watermarks"
+    
+    def __str__(self):
+        return f"{self.name} @ {self.checked_at}"
+
+class AlertDeletion(models.Model):
+    """Id of a deleted alert, kept for a day so other processes can drop it from their alert index"""
+    alert_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    
+    class Meta:
+        verbose_name = "Alert Deletion"
+        verbose_name_plural = "Alert Deletions"
+    
+    def __str__(self):
+        return f"Alert {self.alert_id} deleted @ {self.deleted_at}"
@@ -3,6 +3,26 @@ from .models import Alert, AlertHistory
 from stocks.serializers import StockSerializer
 from accounts.serializers import UserSerializer
 
+def validate_alert_settings(alert_type, data):
+    """Per-type checks shared by the alert serializers"""
+    if alert_type in Alert.PRICE_TARGET_TYPES:
+        # Validate target price is positive
+        if (data.get('target_price') or 0) <= 0:
+            raise serializers.ValidationError("Target price must be positive")
+        if data.get('condition') == 'either':
+            raise serializers.ValidationError("Only percent change alerts can use condition 'either'")
+        return
+    
+    if not data.get('period') or data['period'] <= 0:
+        raise serializers.ValidationError(f"{alert_type} alerts must have period > 0")
+    if alert_type == 'percent':
+        if (data.get('percent_change') or 0) <= 0:
+            raise serializers.ValidationError("Percent change alerts must have percent_change > 0")
+        if data.get('condition') == 'equals':
+            raise serializers.ValidationError("Percent change alerts must use condition 'above', 'below' or 'either'")
+    elif data.get('condition') in ('equals', 'either'):
+        raise serializers.ValidationError("Crossover alerts must use condition 'above' or 'below'")
+
 class AlertSerializer(serializers.ModelSerializer):
     stock_details = StockSerializer(source='stock', read_only=True)
     user_details = UserSerializer(source='user', read_only=True)
@@ -11,7 +31,7 @@ class AlertSerializer(serializers.ModelSerializer):
         model = Alert
         fields = [
             'id', 'user', 'stock', 'alert_type', 'condition', 'target_price',
-            'duration_minutes', 'status', 'is_active', 'created_at', 'updated_at',
+            'duration_minutes', 'percent_change', 'period', 'status', 'is_active', 'created_at', 'updated_at',
             'last_checked', 'condition_start_time', 'stock_details', 'user_details'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at', 'last_checked', 'condition_start_time']
@@ -22,9 +42,7 @@ class AlertSerializer(serializers.ModelSerializer):
         if data.get('alert_type') == 'duration' and data.get('duration_minutes', 0) <= 0:
             raise serializers.ValidationError("Duration alerts must have duration_minutes > 0")
         
-        # Validate target price is positive
-        if data.get('target_price', 0) <= 0:
-            raise serializers.ValidationError("Target price must be positive")
+        validate_alert_settings(data.get('alert_type'), data)
         
         return data
     
@@ -48,7 +66,10 @@ class AlertCreateSerializer(serializers.ModelSerializer):
     """Simplified serializer for creating alerts"""
     class Meta:
         model = Alert
-        fields = ['id', 'stock', 'alert_type', 'condition', 'target_price', 'duration_minutes', 'status', 'is_active', 'created_at']
+        fields = [
+            'id', 'stock', 'alert_type', 'condition', 'target_price', 'duration_minutes',
+            'percent_change', 'period', 'status', 'is_active', 'created_at'
+        ]
         read_only_fields = ['id', 'status', 'is_active', 'created_at']
     
     def validate(self, data):
@@ -57,9 +78,7 @@ class AlertCreateSerializer(serializers.ModelSerializer):
         if data.get('alert_type') == 'duration' and data.get('duration_minutes', 0) <= 0:
             raise serializers.ValidationError("Duration alerts must have duration_minutes > 0")
         
-        # Validate target price is positive
-        if data.get('target_price', 0) <= 0:
-            raise serializers.ValidationError("Target price must be positive")
+        validate_alert_settings(data.get('alert_type'), data)
         
         return data
 
@@ -67,7 +86,7 @@ class AlertUpdateSerializer(serializers.ModelSerializer):
     """Serializer for updating alerts"""
     class Meta:
         model = Alert
-        fields = ['condition', 'target_price', 'duration_minutes', 'is_active']
+        fields = ['condition', 'target_price', 'duration_minutes', 'percent_change', 'period', 'is_active']
     
     def validate(self, data):
         """Custom validation for alert updates"""
@@ -75,8 +94,12 @@ class AlertUpdateSerializer(serializers.ModelSerializer):
         if self.instance.alert_type == 'duration' and data.get('duration_minutes', 0) <= 0:
             raise serializers.ValidationError("Duration alerts must have duration_minutes > 0")
         
-        # Validate target price is positive
-        if data.get('target_price', 0) <= 0:
-            raise serializers.ValidationError("Target price must be positive")
+        validate_alert_settings(self.instance.alert_type, {
+            'condition': self.instance.condition,
+            'target_price': self.instance.target_price,
+            'percent_change': self.instance.percent_change,
+            'period': self.instance.period,
+            **data
+        })
         
         return data
@@ -1,83 +1,261 @@
 from django.utils import timezone
 from django.core.cache import cache
 from django.conf import settings
-from .models import Alert, AlertHistory
+from django.db import transaction
+from django.db.models import BigIntegerField, F, Q
+from django.db.models.functions import Cast, Round
+from datetime import timedelta
+from .models import Alert, AlertHistory, AlertCheckWatermark, AlertDeletion
 from stocks.models import Stock
-from decimal import Decimal
+from stocks.quotes import get_quote, get_quotes
+from stocks.fixedpoint import CENTS_PER_UNIT, from_cents, to_cents
+from stocks.indicators import get_indicator_engine
+from realtime.services import publish_alert_triggered
+from .timers import get_timer_wheel, duration_deadline
+from .index import get_alert_index, CONDITIONS_BY_CODE, STATE_TRIGGERED
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Change watermark for check_all_alerts. The overlap re-reads a few seconds
+# before the previous run started so price writes committing mid-run are not missed.
+ALERT_CHECK_WATERMARK = 'check_all_alerts'
+WATERMARK_OVERLAP = timedelta(seconds=5)
+
+# Rows (or ids) per INSERT/UPDATE statement when persisting a tick's results
+TRIGGER_BATCH_SIZE = 1000
+
+# Alerts fetched, evaluated and persisted together by the scheduled check
+ALERT_CHECK_CHUNK_SIZE = 500
+
+# How long deletion markers are kept for other processes' alert indexes
+ALERT_DELETION_RETENTION = timedelta(days=1)
+
+# Alert types evaluated from per-stock incremental indicators
+INDICATOR_ALERT_TYPES = ('percent', 'sma_cross', 'ema_cross')
+
+def target_cents_expression(field='target_price'):
+    """A two-place decimal column as an integer (cents, or basis points for percents), computed by the database"""
+    return Cast(Round(F(field) * CENTS_PER_UNIT), BigIntegerField())
+
+def condition_met(condition, price_cents, target_cents):
+    """Integer-cent comparison used by every evaluation path"""
+    if condition == 'above':
+        return price_cents > target_cents
+    if condition == 'below':
+        return price_cents < target_cents
+    if condition == 'equals':
+        # Within one cent
+        return abs(price_cents - target_cents) <= 1
+    return False
+
+def get_alerts_to_check():
+    """
+    Active, untriggered alerts as model instances ready for evaluate_alerts, with
+    their stock and the user's profile loaded and integer-cent targets annotated
+    """
+    return Alert.objects.filter(is_active=True, status='active').select_related(
+        'stock', 'user__profile'
+    ).annotate(
+        target_cents=target_cents_expression(), percent_bp=target_cents_expression('percent_change')
+    )
+
+def evaluate_alerts(alerts):
+    """
+    Evaluate alerts against their current quotes and persist any triggers.
+    Returns (checked_count, AlertHistory rows recorded, alerts evaluated) for the
+    caller's summary and last_checked heartbeat.
+    """
+    # One multi-get for every symbol instead of reading prices row by row
+    quotes = get_quotes({alert.stock.symbol for alert in alerts})
+    # Catch the indicators up with ticks recorded by other processes, at most
+    # once per INDICATOR_SYNC_INTERVAL however many chunks are evaluated
+    get_indicator_engine().sync_if_stale()
+    triggers = []
+    checked_count = 0
+    evaluated = []
+    
+    for alert in alerts:
+        try:
+            checked_count += 1
+            
+            # Get current stock price
+            stock = alert.stock
+            quote = quotes.get(stock.symbol) if stock else None
+            if not quote or not quote['price']:
+                logger.warning(f"Alert {alert.id}: No price data for {stock.symbol if stock else 'Unknown'}")
+                continue
+            
+            # Compare integer cents; Decimals are only used for the trigger record
+            price_cents = quote['price_cents']
+            evaluated.append(alert)
+            is_triggered = False
+            trigger_reason = ""
+            
+            # Check threshold alerts
+            if alert.alert_type == 'threshold':
+                if alert.condition in ('above', 'below') and condition_met(alert.condition, price_cents, alert.target_cents):
+                    is_triggered = True
+                    trigger_reason = f"Price ${quote['price']} {alert.condition} threshold ${alert.target_price}"
+            
+            # Check duration alerts. This starts or resets the condition timer;
+            # expiry itself is fired by the duration timer wheel
+            elif alert.alert_type == 'duration':
+                holds = alert.condition == 'below' and condition_met('below', price_cents, alert.target_cents)
+                if track_duration_condition(alert, holds):
+                    is_triggered = True
+                    trigger_reason = duration_trigger_reason(alert, quote['price'])
+            
+            # Percent change and crossover alerts read the stock's shared indicators
+            elif alert.alert_type in INDICATOR_ALERT_TYPES:
+                is_triggered, trigger_reason = check_indicator_condition(alert, quote['price'])
+            
+            # Triggers are persisted together once every alert has been evaluated
+            if is_triggered:
+                triggers.append((alert, quote['price'], trigger_reason))
+            
+        except Exception as e:
+            logger.error(f"Error checking alert {alert.id}: {e}")
+            continue
+    
+    return checked_count, persist_triggers(triggers), evaluated
+
+def evaluate_records(records):
+    """
+    Evaluate resident index records against their current quotes without loading
+    models. Only the alerts that matched are fetched and evaluated as models (to
+    record the trigger and notify), along with those whose state lives on the row:
+    duration alerts whose condition holds or whose timer is armed, and crossovers
+    that have crossed (they are compared with updated_at). Returns the same tuple
+    as evaluate_alerts, with the records that had a quote as the evaluated ones.
+    """
+    symbols = dict(Stock.objects.filter(
+        id__in={record.stock_id for record in records}
+    ).values_list('id', 'symbol'))
+    quotes = get_quotes(set(symbols.values()))
+    engine = get_indicator_engine()
+    engine.sync_if_stale()
+    wheel = get_timer_wheel()
+    candidate_ids = []
+    evaluated = []
+    
+    for record in records:
+        try:
+            quote = quotes.get(symbols.get(record.stock_id))
+            if not quote or not quote['price']:
+                logger.warning(f"Alert {record.id}: No price data for stock {record.stock_id}")
+                continue
+            
+            evaluated.append(record)
+            price_cents = quote['price_cents']
+            alert_type, condition = CONDITIONS_BY_CODE.get(record.condition, (None, None))
+            if alert_type == 'threshold':
+                matched = condition in ('above', 'below') and condition_met(condition, price_cents, record.target_cents)
+            elif alert_type == 'duration':
+                holds = condition == 'below' and condition_met('below', price_cents, record.target_cents)
+                matched = holds or record.id in wheel
+            elif alert_type == 'percent':
+                indicator = engine.require(record.stock_id, ('change', record.duration_minutes))
+                matched = indicator.moved(condition, record.target_cents)
+            elif alert_type in INDICATOR_ALERT_TYPES:
+                indicator = engine.require(record.stock_id, (alert_type.split('_')[0], record.duration_minutes))
+                matched = indicator.crossed_since(condition, None)
+            else:
+                matched = False
+            
+            if matched:
+                candidate_ids.append(record.id)
+        except Exception as e:
+            logger.error(f"Error checking alert {record.id}: {e}")
+    
+    alerts = list(get_alerts_to_check().filter(id__in=candidate_ids)) if candidate_ids else []
+    _, histories, _ = evaluate_alerts(alerts)
+    return len(records), histories, evaluated
+
+def check_alerts(alert_ids=None, user=None, symbols=None):
+    """
+    Check a scoped set of active alerts: specific ids, one user's alerts and/or
+    alerts on the given symbols. Uses the same engine as check_all_alerts but
+    does not move its watermark, and only the checked alerts get a heartbeat.
+    """
+    try:
+        started_at = timezone.now()
+        alerts = get_alerts_to_check()
+        if alert_ids is not None:
+            alerts = alerts.filter(id__in=alert_ids)
+        if user is not None:
+            alerts = alerts.filter(user=user)
+        if symbols is not None:
+            alerts = alerts.filter(stock__symbol__in=symbols)
+        alerts = list(alerts)
+        
+        checked_count, histories, evaluated = evaluate_alerts(alerts)
+        if evaluated:
+            Alert.objects.filter(id__in=[alert.id for alert in evaluated]).update(last_checked=started_at)
+        
+        result = {
+            'checked_count': checked_count,
+            'triggered_count': len(histories),
+            'triggered_alert_ids': [history.alert_id for history in histories],
+            'timestamp': timezone.now().isoformat()
+        }
+        
+        logger.info(f"Scoped alert check completed: {result}")
+        return result
+        
+    except Exception as e:
+        logger.error(f"Error in check_alerts: {e}")
+        return None
+
 def check_all_alerts():
     """
-    Check all active alerts against current stock prices
+    Check active alerts whose stock price changed since the previous run
     Used by the APScheduler
     """
     try:
-        # Get all active alerts
-        active_alerts = Alert.objects.filter(is_active=True)
-        triggered_count = 0
+        started_at = timezone.now()
+        since = AlertCheckWatermark.objects.filter(
+            name=ALERT_CHECK_WATERMARK
+        ).values_list('checked_at', flat=True).first()
+        
+        # Candidates come from the resident alert index, brought up to date with
+        # edits made elsewhere; models are only loaded for alerts that match
+        index = get_alert_index()
+        index.sync()
+        if since is None:
+            records = index.active_records()
+        else:
+            since_overlap = since - WATERMARK_OVERLAP
+            changed_stock_ids = set(Stock.objects.filter(
+                price_changed_at__gte=since_overlap
+            ).values_list('id', flat=True))
+            edited_ids = set(Alert.objects.filter(
+                is_active=True, status='active', updated_at__gte=since_overlap
+            ).values_list('id', flat=True))
+            records = index.active_records(changed_stock_ids, edited_ids)
+        
+        # Evaluate and persist a chunk at a time, so model instances and pending
+        # triggers stay bounded by the chunk size
         checked_count = 0
+        triggered_count = 0
+        evaluated_stock_ids = set()
+        for i in range(0, len(records), ALERT_CHECK_CHUNK_SIZE):
+            chunk_checked, histories, evaluated = evaluate_records(records[i:i + ALERT_CHECK_CHUNK_SIZE])
+            checked_count += chunk_checked
+            triggered_count += len(histories)
+            evaluated_stock_ids.update(record.stock_id for record in evaluated)
         
-        for alert in active_alerts:
-            try:
-                checked_count += 1
-                
-                # Get current stock price
-                stock = alert.stock
-                if not stock or not stock.price:
-                    logger.warning(f"Alert {alert.id}: No price data for {stock.symbol if stock else 'Unknown'}")
-                    continue
-                
-                current_price = stock.price
-                is_triggered = False
-                trigger_reason = ""
-                
-                # Check threshold alerts
-                if alert.alert_type == 'threshold':
-                    if alert.condition == 'above' and current_price > alert.target_price:
-                        is_triggered = True
-                        trigger_reason = f"Price ${current_price} above threshold ${alert.target_price}"
-                    elif alert.condition == 'below' and current_price < alert.target_price:
-                        is_triggered = True
-                        trigger_reason = f"Price ${current_price} below threshold ${alert.target_price}"
-                
-                # Check duration alerts
-                elif alert.alert_type == 'duration':
-                    # For duration alerts, we need to check if the condition has been met for the specified duration
-                    if alert.condition == 'below' and current_price < alert.target_price:
-                        # Check if price has been below threshold for the required duration
-                        duration_met = check_duration_condition(alert, current_price)
-                        if duration_met:
-                            is_triggered = True
-                            trigger_reason = f"Price ${current_price} below ${alert.target_price} for {alert.duration_minutes} minutes"
-                
-                # If alert is triggered, create alert history record
-                if is_triggered:
-                    alert_history = AlertHistory.objects.create(
-                        alert=alert,
-                        stock_price=current_price,
-                        message=trigger_reason
-                    )
-                    
-                    # Send notification
-                    send_alert_notification(alert, alert_history)
-                    
-                    # Update alert status to triggered
-                    alert.status = 'triggered'
-                    alert.save()
-                    
-                    triggered_count += 1
-                    logger.info(f"Alert {alert.id} triggered: {trigger_reason}")
-                
-            except Exception as e:
-                logger.error(f"Error checking alert {alert.id}: {e}")
-                continue
+        mark_alerts_checked(evaluated_stock_ids, started_at)
+        
+        AlertCheckWatermark.objects.update_or_create(
+            name=ALERT_CHECK_WATERMARK, defaults={'checked_at': started_at}
+        )
         
         result = {
             'checked_count': checked_count,
             'triggered_count': triggered_count,
-            'total_alerts': len(active_alerts),
+            'total_alerts': len(records),
+            'full_scan': since is None,
             'timestamp': timezone.now().isoformat()
         }
         
@@ -88,55 +266,243 @@ def check_all_alerts():
         logger.error(f"Error in check_all_alerts: {e}")
         return None
 
+def mark_alerts_checked(stock_ids, checked_at):
+    """
+    Heartbeat for last_checked: one UPDATE per batch of evaluated stocks rather
+    than a save() per alert. Alerts on stocks whose price did not move were
+    skipped because their outcome cannot have changed, so they keep the time
+    they were last evaluated against a new price. Only alerts the checker scans
+    (active status) are touched; triggered ones keep their last check time.
+    """
+    stock_ids = list(stock_ids)
+    updated = 0
+    for i in range(0, len(stock_ids), TRIGGER_BATCH_SIZE):
+        updated += Alert.objects.filter(
+            is_active=True, status='active', stock_id__in=stock_ids[i:i + TRIGGER_BATCH_SIZE]
+        ).update(last_checked=checked_at)
+    return updated
+
+def duration_trigger_reason(alert, current_price):
+    return f"Price ${current_price} below ${alert.target_price} for {alert.duration_minutes} minutes"
+
+def claim_alerts(alert_ids):
+    """
+    Lock the still-active alerts among `alert_ids` for the current transaction and
+    return their ids. Rows locked by a concurrent checker are skipped rather than
+    waited on, and rows it already marked triggered no longer match, so each
+    trigger is claimed by exactly one checker.
+    """
+    claimed = set()
+    for i in range(0, len(alert_ids), TRIGGER_BATCH_SIZE):
+        claimed.update(Alert.objects.select_for_update(skip_locked=True).filter(
+            id__in=alert_ids[i:i + TRIGGER_BATCH_SIZE], is_active=True, status='active'
+        ).values_list('id', flat=True))
+    return claimed
+
+def wants_email(user):
+    """Whether trigger emails should be queued for a user (profile preference, if any)"""
+    profile = getattr(user, 'profile', None)
+    return bool(user.email) and (profile is None or profile.email_notifications)
+
+def persist_triggers(triggers):
+    """
+    Persist one tick's triggers, given as (alert, stock_price, reason) tuples, in a
+    single transaction: claim the alerts, then a bulk insert of AlertHistory, one
+    status UPDATE per batch of alert ids and a bulk insert of pending email
+    Notifications. Triggers already claimed by another checker are dropped. Emails
+    and realtime events go out once the transaction has committed.
+    """
+    from notifications.models import Notification
+    
+    if not triggers:
+        return []
+    
+    with transaction.atomic():
+        claimed = claim_alerts([alert.id for alert, _, _ in triggers])
+        triggers = [trigger for trigger in triggers if trigger[0].id in claimed]
+        if not triggers:
+            return []
+        
+        alerts = [alert for alert, _, _ in triggers]
+        histories = AlertHistory.objects.bulk_create([
+            AlertHistory(alert=alert, stock_price=stock_price, message=reason)
+            for alert, stock_price, reason in triggers
+        ], batch_size=TRIGGER_BATCH_SIZE)
+        
+        # Status only; a full save() would also bump updated_at and put the
+        # alert back in front of the change-driven checker
+        alert_ids = [alert.id for alert in alerts]
+        for i in range(0, len(alert_ids), TRIGGER_BATCH_SIZE):
+            Alert.objects.filter(id__in=alert_ids[i:i + TRIGGER_BATCH_SIZE]).update(status='triggered')
+        transaction.on_commit(lambda: get_alert_index().set_state(alert_ids, STATE_TRIGGERED))
+        
+        notifications = []
+        for alert, alert_history in zip(alerts, histories):
+            alert.status = 'triggered'
+            if wants_email(alert.user):
+                subject, message = format_alert_notification(alert, alert_history)
+                notifications.append(Notification(
+                    user_id=alert.user_id,
+                    alert_history=alert_history,
+                    notification_type='email',
+                    subject=subject,
+                    message=message
+                ))
+        Notification.objects.bulk_create(notifications, batch_size=TRIGGER_BATCH_SIZE)
+        
+        transaction.on_commit(lambda: deliver_triggers(list(zip(alerts, histories)), notifications))
+    
+    logger.info(f"Persisted {len(histories)} alert triggers")
+    return histories
+
+def deliver_triggers(triggered, notifications=()):
+    """
+    Send the email Notifications queued by persist_triggers and the realtime events
+    for persisted (alert, alert_history) pairs. The alerts' users are already
+    loaded, so delivery adds no per-trigger lookups.
+    """
+    try:
+        from notifications.services import deliver_email_notifications
+        deliver_email_notifications(notifications, {alert.user_id: alert.user for alert, _ in triggered})
+    except Exception as e:
+        logger.error(f"Error delivering alert notifications: {e}")
+    
+    for alert, alert_history in triggered:
+        publish_alert_triggered(alert, alert_history)
+        logger.info(f"Alert {alert.id} triggered: {alert_history.message}")
+
+def fire_due_duration_alerts(now=None):
+    """
+    Trigger duration alerts whose deadline has passed, if their condition still holds.
+    Called by the scheduler at the earliest deadline in the timer wheel.
+    """
+    try:
+        due_ids = get_timer_wheel().pop_due(now)
+        if not due_ids:
+            return 0
+        
+        alerts = list(Alert.objects.filter(
+            id__in=due_ids, is_active=True, status='active', alert_type='duration',
+            condition_start_time__isnull=False
+        ).select_related('stock', 'user__profile').annotate(target_cents=target_cents_expression()))
+        quotes = get_quotes({alert.stock.symbol for alert in alerts})
+        
+        triggers = []
+        for alert in alerts:
+            try:
+                quote = quotes.get(alert.stock.symbol)
+                if not quote or not quote['price']:
+                    continue
+                
+                current_price = quote['price']
+                holds = alert.condition == 'below' and condition_met('below', quote['price_cents'], alert.target_cents)
+                if track_duration_condition(alert, holds):
+                    triggers.append((alert, current_price, duration_trigger_reason(alert, current_price)))
+            except Exception as e:
+                logger.error(f"Error firing duration alert {alert.id}: {e}")
+        
+        persist_triggers(triggers)
+        logger.info(f"Duration timers fired: {len(due_ids)} due, {len(triggers)} triggered")
+        return len(triggers)
+        
+    except Exception as e:
+        logger.error(f"Error in fire_due_duration_alerts: {e}")
+        return 0
+
 def check_duration_condition(alert, current_price, target_price=None):
     """
     Check if a duration condition has been met
     """
     try:
-        from django.utils import timezone
-        from datetime import timedelta
-        
         # Use target_price parameter if provided, otherwise use alert.target_price
         threshold = target_price if target_price is not None else alert.target_price
+        holds = alert.condition == 'below' and condition_met('below', to_cents(current_price), to_cents(threshold))
+        return track_duration_condition(alert, holds)
         
-        if alert.condition == 'below' and current_price < threshold:
+    except Exception as e:
+        logger.error(f"Error checking duration condition: {e}")
+        return False
+
+def track_duration_condition(alert, holds):
+    """
+    Start, keep or reset a duration alert's condition timer given whether its
+    price condition currently holds. Returns True once it has held long enough.
+    """
+    try:
+        if holds:
             # Check if condition has been met for the required duration
-            if hasattr(alert, 'condition_start_time') and alert.condition_start_time:
+            if alert.condition_start_time:
+                # The condition may have started in another process; make sure this
+                # process's wheel holds its deadline (a no-op when it already does)
+                get_timer_wheel().schedule(alert.id, duration_deadline(alert))
+                
                 # Check if enough time has passed
                 time_elapsed = timezone.now() - alert.condition_start_time
                 required_duration = timedelta(minutes=alert.duration_minutes)
                 
                 return time_elapsed >= required_duration
             else:
-                # First time condition is met, start timing
+                # First time condition is met, start timing. Only the timer column is
+                # written so the check does not look like a user edit (updated_at)
                 alert.condition_start_time = timezone.now()
-                alert.save()
+                Alert.objects.filter(id=alert.id).update(condition_start_time=alert.condition_start_time)
+                get_timer_wheel().schedule(alert.id, duration_deadline(alert))
                 return False
         else:
             # Condition not met, reset timing
-            if hasattr(alert, 'condition_start_time') and alert.condition_start_time:
+            if alert.condition_start_time:
                 alert.condition_start_time = None
-                alert.save()
+                Alert.objects.filter(id=alert.id).update(condition_start_time=None)
+                get_timer_wheel().cancel(alert.id)
             return False
             
     except Exception as e:
         logger.error(f"Error checking duration condition: {e}")
         return False
 
+def indicator_key(alert):
+    """Engine key of the per-stock indicator an alert reads"""
+    if alert.alert_type == 'percent':
+        return ('change', alert.period)
+    return (alert.alert_type.split('_')[0], alert.period)
+
+def check_indicator_condition(alert, current_price):
+    """
+    Evaluate a percent change or moving average crossover alert against the
+    stock's incremental indicators. Returns (met, reason).
+    """
+    try:
+        indicator = get_indicator_engine().require(alert.stock_id, indicator_key(alert))
+        
+        if alert.alert_type == 'percent':
+            threshold_bp = getattr(alert, 'percent_bp', None)
+            if threshold_bp is None:
+                threshold_bp = to_cents(alert.percent_change)
+            if indicator.moved(alert.condition, threshold_bp):
+                return True, (
+                    f"Price ${current_price} moved {indicator.change_percent():+.2f}% "
+                    f"within {alert.period} minutes"
+                )
+            return False, ""
+        
+        # Crossovers since the alert was created, edited or reset; it stops being
+        # checked once triggered, so each crossing fires it at most once
+        if indicator.crossed_since(alert.condition, alert.updated_at):
+            average = from_cents(round(indicator.value))
+            name = alert.alert_type.split('_')[0].upper()
+            return True, f"Price ${current_price} crossed {alert.condition} its {alert.period}-tick {name} ${average}"
+        return False, ""
+        
+    except Exception as e:
+        logger.error(f"Error checking indicator condition: {e}")
+        return False, ""
+
 def check_threshold_condition(alert, current_price, target_price):
     """
     Check if a threshold condition has been met
     """
     try:
-        if alert.condition == 'above':
-            return current_price > target_price
-        elif alert.condition == 'below':
-            return current_price < target_price
-        elif alert.condition == 'equals':
-            # Use tolerance for equals condition (0.01 or 1 cent)
-            tolerance = Decimal('0.01')
-            return abs(current_price - target_price) <= tolerance
-        return False
+        return condition_met(alert.condition, to_cents(current_price), to_cents(target_price))
     except Exception as e:
         logger.error(f"Error checking threshold condition: {e}")
         return False
@@ -146,39 +512,54 @@ def check_alert_condition(alert):
     Check if an alert condition is met
     """
     try:
-        if not alert.stock or not alert.stock.price:
+        quote = get_quote(alert.stock.symbol) if alert.stock else None
+        if not quote or not quote['price']:
             return False
         
-        current_price = alert.stock.price
+        current_price = quote['price']
+        
+        # update() rather than save() so updated_at only tracks user edits
+        alert.last_checked = timezone.now()
+        Alert.objects.filter(id=alert.id).update(last_checked=alert.last_checked)
         
         if alert.alert_type == 'threshold':
             return check_threshold_condition(alert, current_price, alert.target_price)
         elif alert.alert_type == 'duration':
             return check_duration_condition(alert, current_price)
+        elif alert.alert_type in INDICATOR_ALERT_TYPES:
+            return check_indicator_condition(alert, current_price)[0]
         
         return False
     except Exception as e:
         logger.error(f"Error checking alert condition: {e}")
         return False
 
-def send_alert_notification(alert, alert_history):
-    """
-    Send notification for triggered alert
-    """
-    try:
-        from notifications.services import send_email_notification
-        
-        # Prepare notification data
-        subject = f"Stock Alert: {alert.stock.symbol} {alert.condition} {alert.target_price}"
-        message = f"""
+def format_alert_notification(alert, alert_history):
+    """Subject and body of the email sent for a trigger"""
+    subject = f"Stock Alert: {alert.stock.symbol} {alert.condition} {alert.target_display}"
+    if alert.alert_type in Alert.PRICE_TARGET_TYPES:
+        condition = f"{alert.condition} ${alert.target_price}"
+    else:
+        condition = alert.description
+    message = f"""
         Your stock alert has been triggered
 
         Stock: {alert.stock.symbol}
-        Condition: {alert.condition} ${alert.target_price}
+        Condition: {condition}
         Current Price: ${alert_history.stock_price}
         Triggered At: {alert_history.triggered_at}
         Reason: {alert_history.message}
         """
+    return subject, message
+
+def send_alert_notification(alert, alert_history):
+    """
+    Send notification for triggered alert
+    """
+    try:
+        from notifications.services import send_email_notification
+        
+        subject, message = format_alert_notification(alert, alert_history)
         
         # Send email notification directly (no Celery)
         if alert.user.email:
@@ -211,6 +592,9 @@ def cleanup_old_alerts(days=90):
             triggered_at__lt=cutoff_date
         ).delete()
         
+        # Every alert index reloads daily, so older deletion markers are no longer read
+        AlertDeletion.objects.filter(deleted_at__lt=timezone.now() - ALERT_DELETION_RETENTION).delete()
+        
         logger.info(f"Cleaned up {deleted_count} old triggered alerts (older than {days} days)")
         return deleted_count
         
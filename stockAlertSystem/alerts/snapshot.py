@@ -0,0 +1,188 @@
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+from array import array
+from datetime import datetime
+
+from django.conf import settings
+from django.utils import timezone
+
+from stocks.fixedpoint import to_micros, from_micros
+
+logger = logging.getLogger(__name__)
+
+# File layout: magic, then a little-endian (version, header length) pair, then a
+# JSON header describing the sections that follow it. Sections are raw
+# machine-order typed arrays so they load with one copy out of the memory map;
+# nothing in the file is ever executed or unpickled.
+SNAPSHOT_MAGIC = b'SAEVAL'
+SNAPSHOT_VERSION = 3
+PREAMBLE = struct.Struct('<HI')
+
+def to_iso(value):
+    return value.isoformat() if value else None
+
+def from_iso(value):
+    return datetime.fromisoformat(value) if value else None
+
+def write_snapshot(path, meta, arrays):
+    """Write JSON metadata and named typed arrays to path, atomically"""
+    sections = []
+    offset = 0
+    payloads = []
+    for name, values in arrays:
+        data = values.tobytes()
+        sections.append({'name': name, 'typecode': values.typecode, 'offset': offset, 'length': len(data)})
+        payloads.append(data)
+        offset += len(data)
+
+    header = json.dumps({
+        'meta': meta,
+        'byteorder': sys.byteorder,
+        'itemsizes': {s['typecode']: array(s['typecode']).itemsize for s in sections},
+        'sections': sections,
+    }).encode()
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(SNAPSHOT_MAGIC)
+        f.write(PREAMBLE.pack(SNAPSHOT_VERSION, len(header)))
+        f.write(header)
+        for data in payloads:
+            f.write(data)
+    os.replace(tmp_path, path)
+    return len(SNAPSHOT_MAGIC) + PREAMBLE.size + len(header) + offset
+
+def read_snapshot(path):
+    """
+    Read a file written by write_snapshot(); returns (meta, arrays), the
+    latter keyed by section name. Raises ValueError for files this build cannot use.
+    """
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        with memoryview(mapped) as view:
+            if mapped[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+                raise ValueError("Not an evaluation snapshot")
+            start = len(SNAPSHOT_MAGIC)
+            version, header_length = PREAMBLE.unpack_from(view, start)
+            if version != SNAPSHOT_VERSION:
+                raise ValueError(f"Snapshot version {version}, expected {SNAPSHOT_VERSION}")
+            start += PREAMBLE.size
+            header = json.loads(mapped[start:start + header_length])
+            start += header_length
+
+            if header['byteorder'] != sys.byteorder or any(
+                array(typecode).itemsize != itemsize for typecode, itemsize in header['itemsizes'].items()
+            ):
+                raise ValueError("Snapshot written on an incompatible platform")
+
+            arrays = {}
+            for section in header['sections']:
+                begin = start + section['offset']
+                with view[begin:begin + section['length']] as data:
+                    if len(data) != section['length']:
+                        raise ValueError(f"Snapshot section {section['name']} is truncated")
+                    if section['typecode'] not in header['itemsizes']:
+                        raise ValueError(f"Snapshot section {section['name']} has no type")
+                    values = array(section['typecode'])
+                    values.frombytes(data)
+                    arrays[section['name']] = values
+
+    return header['meta'], arrays
+
+def sections(arrays, prefix):
+    """(name, array) pairs for the sections under one prefix, with the prefix removed"""
+    return [(name[len(prefix):], values) for name, values in arrays.items() if name.startswith(prefix)]
+
+def save_evaluation_snapshot(path=None):
+    """
+    Snapshot the alert index, duration timers and indicator engine with the
+    time they were captured. Used periodically by the scheduler.
+    """
+    from stocks.indicators import get_indicator_engine
+    from .index import get_alert_index
+    from .timers import get_timer_wheel
+
+    path = path or settings.EVALUATION_SNAPSHOT_PATH
+    try:
+        index = get_alert_index()
+        if not index.is_loaded:
+            logger.info("Alert index not loaded yet; skipping evaluation snapshot")
+            return False
+
+        # Taken before any state is copied, so replaying from it cannot miss an edit
+        meta = {'watermark': to_iso(timezone.now()), 'index_synced_at': to_iso(index.synced_at)}
+        arrays = [(f"index.{name}", column) for name, column in index.columns()]
+        meta['indicators'], indicator_arrays = get_indicator_engine().snapshot()
+        arrays += [(f"indicators.{name}", values) for name, values in indicator_arrays]
+        wheel = get_timer_wheel()
+        meta['timers_synced_at'] = to_iso(wheel.synced_at)
+        deadlines = wheel.deadlines()
+        arrays += [
+            ('timers.ids', array('q', [alert_id for alert_id, _ in deadlines])),
+            ('timers.deadlines', array('q', [to_micros(deadline) for _, deadline in deadlines])),
+        ]
+
+        size = write_snapshot(path, meta, arrays)
+        logger.info(f"Saved evaluation snapshot ({size} bytes) to {path}")
+        return True
+    except Exception as e:
+        logger.error(f"Error saving evaluation snapshot: {e}")
+        return False
+
+def load_evaluation_snapshot(path=None):
+    """
+    Warm-start the alert index, duration timers and indicator engine from the
+    last snapshot, then replay only what changed in the database since. Returns
+    False, leaving the caller to rebuild everything, when there is no usable
+    snapshot; one older than the alert deletion markers is unusable, since deletes
+    made after it could no longer be replayed.
+    """
+    from stocks.indicators import get_indicator_engine
+    from .services import ALERT_DELETION_RETENTION
+    from .index import get_alert_index
+    from .timers import get_timer_wheel, sync_duration_timers
+
+    path = path or settings.EVALUATION_SNAPSHOT_PATH
+    if not os.path.exists(path):
+        return False
+
+    index = get_alert_index()
+    wheel = get_timer_wheel()
+    engine = get_indicator_engine()
+    try:
+        meta, arrays = read_snapshot(path)
+        watermark = from_iso(meta['watermark'])
+        index_synced_at = from_iso(meta['index_synced_at'])
+        if index_synced_at is None or index_synced_at < timezone.now() - ALERT_DELETION_RETENTION:
+            raise ValueError("Snapshot predates the retained alert deletions")
+
+        columns = sections(arrays, 'index.')
+        if not columns:
+            raise ValueError("Snapshot has no alert index")
+        index.restore(columns, index_synced_at)
+
+        # Only conditions started after the snapshot's timer sync are read back;
+        # ones cleared since are dropped when their deadline fires
+        wheel.restore(zip(arrays['timers.ids'], map(from_micros, arrays['timers.deadlines'])))
+        wheel.synced_at = from_iso(meta['timers_synced_at'])
+        if not engine.restore(meta['indicators'], sections(arrays, 'indicators.')):
+            raise ValueError("Indicator state from another version")
+
+        edited = index.sync()
+        timers = sync_duration_timers()
+        ticks = engine.sync()
+        logger.info(
+            f"Restored evaluation snapshot from {watermark.isoformat()}: {len(index)} alerts, "
+            f"{len(wheel)} timers; replayed {edited} alert edits, {timers} timer starts and {ticks} ticks"
+        )
+        return True
+    except Exception as e:
+        logger.error(f"Error loading evaluation snapshot {path}: {e}")
+        index.clear()
+        wheel.clear()
+        engine.clear()
+        return False
@@ -7,11 +7,13 @@ from rest_framework import status
 from rest_framework_simplejwt.tokens import RefreshToken
 from decimal import Decimal
 from datetime import timedelta
+from stockAlertSystem.testing import IndexUsageTestMixin
 import json
+from unittest.mock import patch
 
 from .models import Alert, AlertHistory
 from stocks.models import Stock
-from .services import check_alert_condition, check_threshold_condition, check_duration_condition
+from .services import check_alert_condition, check_threshold_condition, check_duration_condition, check_all_alerts
 
 class AlertModelTest(TestCase):
     def setUp(self):
@@ -199,11 +201,13 @@ class AlertAPITest(APITestCase):
             email='test@example.com',
             password='testpass123'
         )
-        self.stock = Stock.objects.create(
-            symbol='AAPL',
-            name='Apple Inc.',
-            price=Decimal('150.00')
-        )
+        # Committed, so the quote is written through to the cache
+        with self.captureOnCommitCallbacks(execute=True):
+            self.stock = Stock.objects.create(
+                symbol='AAPL',
+                name='Apple Inc.',
+                price=Decimal('150.00')
+            )
         
         # Get JWT token
         refresh = RefreshToken.for_user(self.user)
@@ -256,9 +260,62 @@ class AlertAPITest(APITestCase):
         response = self.client.get(url)
         
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)  # Only user's alerts
-        self.assertEqual(response.data[0]['stock'], self.stock.id)
+        self.assertEqual(len(response.data['results']), 1)  # Only user's alerts
+        self.assertEqual(response.data['results'][0]['stock'], self.stock.id)
     
+    def test_alert_list_cursor_pagination(self):
+        """Test alert lists are cursor paginated newest first"""
+        alerts = [
+            Alert.objects.create(
+                user=self.user,
+                stock=self.stock,
+                alert_type='threshold',
+                condition='above',
+                target_price=Decimal(f'{200 + i}.00')
+            )
+            for i in range(3)
+        ]
+        
+        url = reverse('alerts:alert-active')
+        response = self.client.get(url, {'page_size': 2})
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([a['id'] for a in response.data['results']], [alerts[2].id, alerts[1].id])
+        self.assertIsNotNone(response.data['next'])
+        
+        response = self.client.get(response.data['next'])
+        self.assertEqual([a['id'] for a in response.data['results']], [alerts[0].id])
+        self.assertIsNone(response.data['next'])
+
+    def test_cursor_pages_through_equal_timestamps(self):
+        """Test the cursor seeks on (created_at, id) so rows sharing a timestamp are neither skipped nor repeated"""
+        alerts = [
+            Alert.objects.create(user=self.user, stock=self.stock, alert_type='threshold',
+                                 condition='above', target_price=Decimal(f'{200 + i}.00'))
+            for i in range(5)
+        ]
+        Alert.objects.update(created_at=timezone.now())
+        expected = sorted((alert.id for alert in alerts), reverse=True)
+
+        url = reverse('alerts:alert-active')
+        seen = []
+        pages = []
+        response = self.client.get(url, {'page_size': 2})
+        while True:
+            pages.append(response)
+            seen += [a['id'] for a in response.data['results']]
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual(seen, expected)
+
+        # And back again from the last page
+        response = self.client.get(pages[-1].data['previous'])
+        self.assertEqual([a['id'] for a in response.data['results']], expected[2:4])
+
+        response = self.client.get(url, {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
     def test_alert_detail(self):
         """Test retrieving specific alert details"""
         alert = Alert.objects.create(
@@ -331,6 +388,43 @@ class AlertAPITest(APITestCase):
         response = self.client.post(url)
         self.assertTrue(response.data['is_active'])
     
+    def test_check_condition_scoped_to_alert(self):
+        """Test the check action evaluates only the requested alert"""
+        other_user = User.objects.create_user(username='other', email='other@example.com', password='testpass123')
+        alert = Alert.objects.create(user=self.user, stock=self.stock, alert_type='threshold',
+                                     condition='below', target_price=Decimal('200.00'))
+        other = Alert.objects.create(user=other_user, stock=self.stock, alert_type='threshold',
+                                     condition='below', target_price=Decimal('200.00'))
+        
+        url = reverse('alerts:alert-check-condition', args=[alert.id])
+        # auth user, alert lookup, scoped select, claim transaction (6), heartbeat
+        with self.assertNumQueries(10):
+            response = self.client.post(url)
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['triggered'])
+        self.assertEqual(response.data['result']['checked_count'], 1)
+        other.refresh_from_db()
+        self.assertEqual(other.status, 'active')
+        self.assertIsNone(other.last_checked)
+    
+    def test_check_all_for_user_and_symbols(self):
+        """Test the per-user check covers only the user's alerts on the given symbols"""
+        msft = Stock.objects.create(symbol='MSFT', name='Microsoft', price=Decimal('300.00'))
+        Alert.objects.create(user=self.user, stock=self.stock, alert_type='threshold',
+                             condition='below', target_price=Decimal('200.00'))
+        Alert.objects.create(user=self.user, stock=msft, alert_type='threshold',
+                             condition='below', target_price=Decimal('400.00'))
+        
+        url = reverse('alerts:alert-check-all')
+        response = self.client.post(url, {'symbols': ['MSFT']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['result']['checked_count'], 1)
+        self.assertEqual(Alert.objects.filter(status='triggered', stock=msft).count(), 1)
+        
+        response = self.client.post(url, {'symbols': 'MSFT'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
     def test_unauthorized_access(self):
         """Test that unauthorized users cannot access alerts"""
         self.client.credentials()  # Remove authentication
@@ -361,8 +455,71 @@ class AlertAPITest(APITestCase):
         response = self.client.get(url)
         
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]['stock_price'], '210.00')
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['stock_price'], '210.00')
+
+    def test_alert_history_export(self):
+        """Test streaming alert history export only includes the user's history"""
+        alert = Alert.objects.create(
+            user=self.user,
+            stock=self.stock,
+            alert_type='threshold',
+            condition='above',
+            target_price=Decimal('200.00')
+        )
+        AlertHistory.objects.create(alert=alert, stock_price=Decimal('210.00'), message='Test alert triggered')
+        
+        other_user = User.objects.create_user(username='otheruser', email='other@example.com', password='testpass123')
+        other_alert = Alert.objects.create(
+            user=other_user,
+            stock=self.stock,
+            alert_type='threshold',
+            condition='below',
+            target_price=Decimal('100.00')
+        )
+        AlertHistory.objects.create(alert=other_alert, stock_price=Decimal('90.00'), message='Other alert')
+        
+        url = reverse('alerts:alert-history-export')
+        response = self.client.get(url, {'symbol': 'AAPL', 'output': 'ndjson'})
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['alert_id'], alert.id)
+        self.assertEqual(rows[0]['stock_price'], '210.00')
+
+    def test_refresh_alert_evaluates_fresh_price(self):
+        """Test the async refresh endpoint fetches a new price and evaluates the alert"""
+        alert = Alert.objects.create(
+            user=self.user,
+            stock=self.stock,
+            alert_type='threshold',
+            condition='above',
+            target_price=Decimal('200.00')
+        )
+        
+        with patch('stocks.services.afetch_stock_price', return_value=Decimal('205.00')), \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('alerts:alert-refresh', args=[alert.id]))
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), {
+            'alert_id': alert.id, 'symbol': 'AAPL', 'price': '205.00', 'condition_met': True
+        })
+    
+    def test_refresh_other_users_alert_not_found(self):
+        """Test users cannot refresh alerts they do not own"""
+        other_user = User.objects.create_user(username='otheruser', email='other@example.com', password='testpass123')
+        alert = Alert.objects.create(
+            user=other_user,
+            stock=self.stock,
+            alert_type='threshold',
+            condition='above',
+            target_price=Decimal('200.00')
+        )
+        
+        response = self.client.post(reverse('alerts:alert-refresh', args=[alert.id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
 
 class AlertEdgeCaseTest(TestCase):
     def setUp(self):
@@ -440,3 +597,617 @@ class AlertEdgeCaseTest(TestCase):
         
         alert.refresh_from_db()
         self.assertEqual(alert.status, 'active')
+
+class AlertCheckSkipListTest(TestCase):
+    def setUp(self):
+        from .index import get_alert_index
+        get_alert_index().clear()
+        self.user = User.objects.create_user(username='testuser', email='', password='testpass123')
+        self.stock = Stock.objects.create(symbol='AAPL', name='Apple Inc.', price=Decimal('150.00'))
+        self.other = Stock.objects.create(symbol='MSFT', name='Microsoft', price=Decimal('300.00'))
+        Alert.objects.create(user=self.user, stock=self.stock, alert_type='threshold',
+                             condition='above', target_price=Decimal('200.00'))
+        Alert.objects.create(user=self.user, stock=self.other, alert_type='threshold',
+                             condition='above', target_price=Decimal('400.00'))
+    
+    def rewind_watermark(self):
+        """Pretend the last check ran a minute ago, past the overlap window"""
+        from .models import AlertCheckWatermark
+        AlertCheckWatermark.objects.update(checked_at=timezone.now() - timedelta(minutes=1))
+        Alert.objects.update(updated_at=timezone.now() - timedelta(minutes=2))
+        Stock.objects.update(price_changed_at=timezone.now() - timedelta(minutes=2))
+        self.stock.refresh_from_db()
+    
+    def test_only_changed_stocks_are_checked(self):
+        """Test later runs skip alerts whose stock price has not moved"""
+        from stocks.services import record_stock_price
+        first = check_all_alerts()
+        self.assertEqual((first['checked_count'], first['full_scan']), (2, True))
+        
+        self.rewind_watermark()
+        self.assertEqual(check_all_alerts()['checked_count'], 0)
+        
+        self.rewind_watermark()
+        record_stock_price(self.stock, Decimal('151.00'))
+        result = check_all_alerts()
+        self.assertEqual((result['checked_count'], result['full_scan']), (1, False))
+    
+    def test_only_matching_alerts_are_loaded(self):
+        """Test the check scans index records and loads models only for alerts that match"""
+        from .services import evaluate_alerts
+        matching = Alert.objects.create(user=self.user, stock=self.stock, alert_type='threshold',
+                                        condition='below', target_price=Decimal('200.00'))
+        with patch('alerts.services.evaluate_alerts', wraps=evaluate_alerts) as evaluate:
+            result = check_all_alerts()
+        
+        self.assertEqual((result['checked_count'], result['triggered_count']), (3, 1))
+        self.assertEqual([[alert.id for alert in call.args[0]] for call in evaluate.call_args_list], [[matching.id]])
+    
+    def test_unchanged_price_does_not_count_as_change(self):
+        """Test re-recording the same price leaves the stock off the check list"""
+        from stocks.services import record_stock_price
+        check_all_alerts()
+        self.rewind_watermark()
+        
+        record_stock_price(self.stock, Decimal('150.00'))
+        self.assertEqual(check_all_alerts()['checked_count'], 0)
+
+    def test_last_checked_heartbeat(self):
+        """Test last_checked moves only for alerts on evaluated stocks, in one statement"""
+        from stocks.services import record_stock_price
+        check_all_alerts()
+        self.assertEqual(Alert.objects.filter(last_checked__isnull=True).count(), 0)
+        
+        self.rewind_watermark()
+        Alert.objects.update(last_checked=None)
+        record_stock_price(self.stock, Decimal('151.00'))
+        check_all_alerts()
+        
+        checked = Alert.objects.get(stock=self.stock)
+        self.assertIsNotNone(checked.last_checked)
+        self.assertLess(checked.updated_at, checked.last_checked)
+        self.assertIsNone(Alert.objects.get(stock=self.other).last_checked)
+    
+    def test_mark_alerts_checked_single_update(self):
+        """Test the heartbeat is one UPDATE regardless of how many alerts it covers"""
+        from .services import mark_alerts_checked
+        with self.assertNumQueries(1):
+            updated = mark_alerts_checked([self.stock.id, self.other.id], timezone.now())
+        self.assertEqual(updated, 2)
+    
+    def test_mark_alerts_checked_skips_triggered(self):
+        """Test the heartbeat leaves alerts that already triggered alone"""
+        from .services import mark_alerts_checked
+        Alert.objects.filter(stock=self.other).update(status='triggered')
+        self.assertEqual(mark_alerts_checked([self.stock.id, self.other.id], timezone.now()), 1)
+        self.assertIsNone(Alert.objects.get(stock=self.other).last_checked)
+
+class BulkTriggerPersistenceTest(TestCase):
+    def setUp(self):
+        from .index import get_alert_index
+        get_alert_index().clear()
+        self.user = User.objects.create_user(username='testuser', email='test@example.com', password='testpass123')
+        self.stock = Stock.objects.create(symbol='AAPL', name='Apple Inc.', price=Decimal('250.00'))
+        self.alerts = [
+            Alert.objects.create(user=self.user, stock=self.stock, alert_type='threshold',
+                                 condition='above', target_price=Decimal(200 + i))
+            for i in range(5)
+        ]
+    
+    def test_triggers_persisted_with_constant_queries(self):
+        """Test a burst of triggers is written with the same statements as a single one"""
+        from notifications.models import Notification
+        from .services import persist_triggers
+        triggers = [(alert, Decimal('250.00'), 'Price above target') for alert in self.alerts]
+        
+        # savepoint, claim, history insert, status update, notification insert, release
+        with self.assertNumQueries(6):
+            histories = persist_triggers(triggers)
+        
+        self.assertEqual(len(histories), 5)
+        self.assertEqual(Alert.objects.filter(status='triggered').count(), 5)
+        self.assertEqual(Notification.objects.filter(status='pending', notification_type='email').count(), 5)
+    
+    def test_delivery_after_commit(self):
+        """Test emails go out after commit and mark the pending notifications sent"""
+        from django.core import mail
+        from notifications.models import Notification
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            result = check_all_alerts()
+            self.assertEqual(len(mail.outbox), 0)
+        
+        self.assertEqual(result['triggered_count'], 5)
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(Notification.objects.filter(status='sent').count(), 5)
+
+    def test_delivery_is_batched(self):
+        """Test delivering a burst of triggers is one status UPDATE with no per-trigger lookups"""
+        from django.core import mail
+        from notifications.models import Notification
+        from .services import persist_triggers
+        triggers = [(alert, Decimal('250.00'), 'Price above target') for alert in self.alerts]
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            persist_triggers(triggers)
+        with self.assertNumQueries(1):
+            for callback in callbacks:
+                callback()
+
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(Notification.objects.filter(status='sent').exclude(sent_at=None).count(), 5)
+
+    def test_delivery_failure_marks_only_failed_notifications(self):
+        """Test a rejected email marks its own notification failed and the rest sent"""
+        from django.core import mail
+        from django.core.mail.backends.locmem import EmailBackend
+        from notifications.models import Notification
+        from .services import persist_triggers
+        other = User.objects.create_user(username='other', email='bad@example.com', password='testpass123')
+        self.alerts[0].user = other
+        Alert.objects.filter(id=self.alerts[0].id).update(user=other)
+
+        send_messages = EmailBackend.send_messages
+        def reject_bad_address(backend, messages):
+            if messages[0].to == ['bad@example.com']:
+                raise ValueError("Recipient refused")
+            return send_messages(backend, messages)
+
+        with patch.object(EmailBackend, 'send_messages', reject_bad_address):
+            with self.captureOnCommitCallbacks(execute=True):
+                persist_triggers([(alert, Decimal('250.00'), 'Price above target') for alert in self.alerts])
+
+        self.assertEqual(len(mail.outbox), 4)
+        failed = Notification.objects.get(status='failed')
+        self.assertEqual((failed.user, failed.error_message), (other, 'Recipient refused'))
+        self.assertEqual(Notification.objects.filter(status='sent').count(), 4)
+    
+    def test_trigger_recorded_once(self):
+        """Test a trigger claimed by one checker is dropped by any other"""
+        from .services import persist_triggers
+        trigger = (self.alerts[0], Decimal('250.00'), 'Price above target')
+        self.assertEqual(len(persist_triggers([trigger])), 1)
+        
+        # A second checker that evaluated the same stale alert row
+        stale = Alert.objects.get(id=self.alerts[0].id)
+        stale.status = 'active'
+        self.assertEqual(persist_triggers([(stale, Decimal('250.00'), 'Price above target')]), [])
+        self.assertEqual(AlertHistory.objects.filter(alert=self.alerts[0]).count(), 1)
+    
+    def test_triggered_alerts_not_rechecked(self):
+        """Test a later full check does not fire already triggered alerts again"""
+        check_all_alerts()
+        from .models import AlertCheckWatermark
+        AlertCheckWatermark.objects.all().delete()
+        self.assertEqual(check_all_alerts()['triggered_count'], 0)
+        self.assertEqual(AlertHistory.objects.count(), 5)
+    
+    def test_target_cents_computed_in_database(self):
+        """Test checked alerts carry exact integer-cent targets for the comparison loop"""
+        from .services import get_alerts_to_check
+        Alert.objects.filter(id=self.alerts[0].id).update(target_price=Decimal('0.29'))
+        targets = {alert.id: alert.target_cents for alert in get_alerts_to_check()}
+        self.assertEqual(targets[self.alerts[0].id], 29)
+        self.assertEqual(targets[self.alerts[1].id], 20100)
+    
+    def test_check_streams_in_chunks(self):
+        """Test the scheduled check evaluates and persists alerts chunk by chunk"""
+        from .services import persist_triggers
+        with patch('alerts.services.ALERT_CHECK_CHUNK_SIZE', 2), \
+                patch('alerts.services.persist_triggers', wraps=persist_triggers) as persist:
+            result = check_all_alerts()
+        
+        self.assertEqual((result['total_alerts'], result['checked_count'], result['triggered_count']), (5, 5, 5))
+        self.assertEqual([len(call.args[0]) for call in persist.call_args_list], [2, 2, 1])
+    
+    def test_email_preference_respected(self):
+        """Test no pending email is queued for users who turned email notifications off"""
+        from notifications.models import Notification
+        self.user.profile.email_notifications = False
+        self.user.profile.save()
+        
+        check_all_alerts()
+        self.assertEqual(AlertHistory.objects.count(), 5)
+        self.assertEqual(Notification.objects.count(), 0)
+    
+    def test_status_update_keeps_updated_at(self):
+        """Test marking alerts triggered does not put them back on the change-driven check list"""
+        from .services import persist_triggers
+        before = Alert.objects.get(id=self.alerts[0].id).updated_at
+        persist_triggers([(self.alerts[0], Decimal('250.00'), 'Price above target')])
+        self.assertEqual(Alert.objects.get(id=self.alerts[0].id).updated_at, before)
+
+class DurationTimerWheelTest(TestCase):
+    def setUp(self):
+        from .timers import get_timer_wheel
+        self.wheel = get_timer_wheel()
+        self.wheel.clear()
+        self.user = User.objects.create_user(username='testuser', email='', password='testpass123')
+        self.stock = Stock.objects.create(symbol='AAPL', name='Apple Inc.', price=Decimal('150.00'))
+    
+    def create_pending(self, minutes_ago, duration_minutes=5):
+        return Alert.objects.create(
+            user=self.user, stock=self.stock, alert_type='duration', condition='below',
+            target_price=Decimal('160.00'), duration_minutes=duration_minutes,
+            condition_start_time=timezone.now() - timedelta(minutes=minutes_ago)
+        )
+    
+    def test_deadlines_pop_in_order(self):
+        """Test due alerts pop earliest first and cancelled or moved entries are skipped"""
+        from .timers import DurationTimerWheel
+        armed = []
+        wheel = DurationTimerWheel(waker=armed.append)
+        now = timezone.now()
+        wheel.schedule(1, now - timedelta(seconds=30))
+        wheel.schedule(2, now - timedelta(seconds=60))
+        wheel.schedule(3, now - timedelta(seconds=10))
+        wheel.schedule(4, now + timedelta(minutes=5))
+        wheel.cancel(3)
+        wheel.schedule(1, now + timedelta(minutes=1))
+        
+        self.assertEqual(wheel.pop_due(now), [2])
+        self.assertEqual(wheel.next_deadline(), now + timedelta(minutes=1))
+        # Armed for each new earliest deadline, then re-armed after firing
+        self.assertEqual(armed[0], now - timedelta(seconds=30))
+        self.assertEqual(armed[-1], now + timedelta(minutes=1))
+    
+    def test_rebuild_from_database(self):
+        """Test pending duration alerts are reloaded with start + duration deadlines"""
+        from .timers import rebuild_duration_timers
+        alert = self.create_pending(minutes_ago=2, duration_minutes=10)
+        Alert.objects.create(user=self.user, stock=self.stock, alert_type='duration', condition='below',
+                             target_price=Decimal('160.00'), duration_minutes=10)
+        
+        self.assertEqual(rebuild_duration_timers(), 1)
+        self.assertEqual(self.wheel.next_deadline(), alert.condition_start_time + timedelta(minutes=10))
+    
+    def test_condition_start_schedules_deadline(self):
+        """Test starting a duration condition puts its deadline on the wheel"""
+        alert = Alert.objects.create(user=self.user, stock=self.stock, alert_type='duration', condition='below',
+                                     target_price=Decimal('160.00'), duration_minutes=15)
+        self.assertFalse(check_duration_condition(alert, Decimal('150.00')))
+        self.assertEqual(self.wheel.next_deadline(), alert.condition_start_time + timedelta(minutes=15))
+        
+        # Price recovers: timer cancelled
+        self.assertFalse(check_duration_condition(alert, Decimal('170.00')))
+        self.assertIsNone(self.wheel.next_deadline())
+
+    def test_condition_timer_does_not_touch_updated_at(self):
+        """Test starting and resetting a duration timer writes only condition_start_time"""
+        alert = Alert.objects.create(user=self.user, stock=self.stock, alert_type='duration', condition='below',
+                                     target_price=Decimal('160.00'), duration_minutes=15)
+        updated_at = alert.updated_at
+
+        with self.assertNumQueries(1):
+            check_duration_condition(alert, Decimal('150.00'))
+        alert.refresh_from_db()
+        self.assertIsNotNone(alert.condition_start_time)
+        self.assertEqual(alert.updated_at, updated_at)
+
+        check_duration_condition(alert, Decimal('170.00'))
+        alert.refresh_from_db()
+        self.assertIsNone(alert.condition_start_time)
+        self.assertEqual(alert.updated_at, updated_at)
+    
+    def test_conditions_started_elsewhere_are_armed(self):
+        """Test the scheduler arms only duration conditions started since its last sync"""
+        from .services import fire_due_duration_alerts
+        from .timers import rebuild_duration_timers, sync_duration_timers
+        # Armed by the startup load, so later syncs don't read it again
+        armed = self.create_pending(minutes_ago=2)
+        self.assertEqual(rebuild_duration_timers(), 1)
+        # Cleared by another process after this one armed it
+        stale = self.create_pending(minutes_ago=1)
+        self.wheel.schedule(stale.id, timezone.now())
+        Alert.objects.filter(id=stale.id).update(condition_start_time=None)
+        # Started by a web request: nothing was put on this process's wheel
+        started = self.create_pending(minutes_ago=0)
+        
+        self.assertEqual(sync_duration_timers(), 1)
+        self.assertIn((started.id, started.condition_start_time + timedelta(minutes=5)), self.wheel.deadlines())
+        
+        # The cleared condition's stale deadline is dropped when it fires
+        self.assertEqual(fire_due_duration_alerts(), 0)
+        self.assertEqual(sorted(self.wheel.deadlines()), [
+            (armed.id, armed.condition_start_time + timedelta(minutes=5)),
+            (started.id, started.condition_start_time + timedelta(minutes=5)),
+        ])
+        
+        # Re-checking a condition that still holds keeps its deadline armed
+        self.wheel.clear()
+        self.assertFalse(check_duration_condition(started, Decimal('150.00')))
+        self.assertEqual(self.wheel.next_deadline(), started.condition_start_time + timedelta(minutes=5))
+    
+    def test_fire_due_alerts(self):
+        """Test expired timers trigger only when the condition still holds"""
+        from .services import fire_due_duration_alerts
+        from .timers import rebuild_duration_timers
+        holding = self.create_pending(minutes_ago=10)
+        other_stock = Stock.objects.create(symbol='MSFT', name='Microsoft', price=Decimal('300.00'))
+        recovered = self.create_pending(minutes_ago=10)
+        recovered.stock = other_stock
+        recovered.save()
+        rebuild_duration_timers()
+        
+        self.assertEqual(fire_due_duration_alerts(), 1)
+        holding.refresh_from_db()
+        recovered.refresh_from_db()
+        self.assertEqual(holding.status, 'triggered')
+        self.assertEqual(AlertHistory.objects.filter(alert=holding).count(), 1)
+        self.assertIsNone(recovered.condition_start_time)
+
+class IndicatorAlertTest(TestCase):
+    def setUp(self):
+        from stocks.indicators import get_indicator_engine
+        from .index import get_alert_index
+        get_indicator_engine().clear()
+        get_alert_index().clear()
+        self.user = User.objects.create_user(username='testuser', email='', password='testpass123')
+        self.stock = Stock.objects.create(symbol='AAPL', name='Apple Inc.', price=Decimal('100.00'))
+    
+    def record(self, *prices):
+        from stocks.services import record_stock_price
+        for price in prices:
+            record_stock_price(self.stock, Decimal(price))
+    
+    def test_percent_change_alert(self):
+        """Test a percent alert fires once the move within its window reaches the threshold"""
+        alert = Alert.objects.create(user=self.user, stock=self.stock, alert_type='percent',
+                                     condition='below', percent_change=Decimal('5.00'), period=30)
+        self.record('100.00', '97.00')
+        self.assertEqual(check_all_alerts()['triggered_count'], 0)
+        
+        self.record('94.90')
+        self.assertEqual(check_all_alerts()['triggered_count'], 1)
+        history = AlertHistory.objects.get(alert=alert)
+        self.assertIn('-5.10%', history.message)
+    
+    def test_sma_crossover_alert(self):
+        """Test a crossover alert fires when the price crosses its moving average"""
+        alert = Alert.objects.create(user=self.user, stock=self.stock, alert_type='sma_cross',
+                                     condition='above', period=3)
+        self.record('100.00', '99.00', '98.00')
+        self.assertFalse(check_alert_condition(alert))
+        
+        self.record('105.00')
+        self.assertTrue(check_alert_condition(alert))
+        self.assertEqual(check_all_alerts()['triggered_count'], 1)
+    
+    def test_alerts_on_a_stock_share_indicators(self):
+        """Test alerts with the same window use one indicator instance"""
+        from stocks.indicators import get_indicator_engine
+        from .services import indicator_key
+        first = Alert.objects.create(user=self.user, stock=self.stock, alert_type='ema_cross',
+                                     condition='below', period=10)
+        second = Alert.objects.create(user=self.user, stock=self.stock, alert_type='ema_cross',
+                                      condition='above', period=10)
+        engine = get_indicator_engine()
+        self.assertIs(engine.require(self.stock.id, indicator_key(first)),
+                      engine.require(self.stock.id, indicator_key(second)))
+    
+    def test_create_validation(self):
+        """Test indicator alerts need a period and no target price"""
+        from .serializers import AlertCreateSerializer
+        valid = AlertCreateSerializer(data={'stock': self.stock.id, 'alert_type': 'percent', 'condition': 'above',
+                                            'percent_change': '2.50', 'period': 15})
+        self.assertTrue(valid.is_valid(), valid.errors)
+        missing = AlertCreateSerializer(data={'stock': self.stock.id, 'alert_type': 'sma_cross', 'condition': 'above'})
+        self.assertFalse(missing.is_valid())
+        equals = AlertCreateSerializer(data={'stock': self.stock.id, 'alert_type': 'sma_cross',
+                                             'condition': 'equals', 'period': 5})
+        self.assertFalse(equals.is_valid())
+    
+    def test_percent_either_direction(self):
+        """Test only percent alerts take 'either', which fires on a move in both directions"""
+        from .serializers import AlertCreateSerializer
+        def serializer(alert_type, condition, **fields):
+            return AlertCreateSerializer(data={'stock': self.stock.id, 'alert_type': alert_type,
+                                               'condition': condition, **fields})
+        self.assertTrue(serializer('percent', 'either', percent_change='2.00', period=15).is_valid())
+        self.assertFalse(serializer('percent', 'equals', percent_change='2.00', period=15).is_valid())
+        self.assertFalse(serializer('ema_cross', 'either', period=5).is_valid())
+        self.assertFalse(serializer('threshold', 'either', target_price='100.00').is_valid())
+        
+        alert = Alert.objects.create(user=self.user, stock=self.stock, alert_type='percent',
+                                     condition='either', percent_change=Decimal('2.00'), period=30)
+        self.record('100.00', '103.00')
+        self.assertEqual(check_all_alerts()['triggered_count'], 1)
+        self.assertEqual(alert.description, "Alert when AAPL moves 2.00% within 30 minutes")
+
+class ResidentAlertIndexTest(TestCase):
+    def setUp(self):
+        from .index import get_alert_index
+        self.index = get_alert_index()
+        self.index.clear()
+        self.user = User.objects.create_user(username='testuser', email='', password='testpass123')
+        self.stock = Stock.objects.create(symbol='AAPL', name='Apple Inc.', price=Decimal('150.00'))
+        self.alert = Alert.objects.create(user=self.user, stock=self.stock, alert_type='threshold',
+                                          condition='above', target_price=Decimal('200.25'))
+    
+    def test_load_builds_compact_records(self):
+        """Test loading from values_list yields slot records with cents targets"""
+        from .index import AlertRecord, CONDITION_CODES, STATE_ACTIVE
+        self.assertEqual(self.index.load(), 1)
+        
+        record = self.index.get(self.alert.id)
+        self.assertIsInstance(record, AlertRecord)
+        self.assertFalse(hasattr(record, '__dict__'))
+        self.assertEqual(record.target_cents, 20025)
+        self.assertEqual(record.condition, CONDITION_CODES[('threshold', 'above')])
+        self.assertEqual((record.stock_id, record.state, record.alert_type), (self.stock.id, STATE_ACTIVE, 'threshold'))
+        # Typed columns: well under 64 bytes per resident alert
+        self.assertLess(self.index.memory_bytes(), 64)
+    
+    def test_signals_and_sync_keep_index_current(self):
+        """Test local writes update the index and sync picks up rows edited elsewhere"""
+        from .index import STATE_INACTIVE
+        self.index.load()
+        second = Alert.objects.create(user=self.user, stock=self.stock, alert_type='duration',
+                                      condition='below', target_price=Decimal('140.00'), duration_minutes=5)
+        self.assertEqual(self.index.get(second.id).duration_minutes, 5)
+        
+        second_id = second.id
+        second.delete()
+        self.assertIsNone(self.index.get(second_id))
+        self.assertEqual(len(self.index), 1)
+        
+        # Bulk update bypasses signals, like a write from another process
+        Alert.objects.filter(id=self.alert.id).update(is_active=False, updated_at=timezone.now())
+        self.assertEqual(self.index.sync(), 1)
+        self.assertEqual(self.index.get(self.alert.id).state, STATE_INACTIVE)
+    
+    def test_triggered_state_and_distances(self):
+        """Test committed triggers leave the index and distances only count active alerts"""
+        from .services import persist_triggers
+        from .index import STATE_TRIGGERED
+        self.index.load()
+        self.assertAlmostEqual(self.index.trigger_distances({self.stock.id: 15000})[self.stock.id], 0.335)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            persist_triggers([(self.alert, Decimal('201.00'), 'Price above target')])
+        self.assertEqual(self.index.get(self.alert.id).state, STATE_TRIGGERED)
+        self.assertEqual(self.index.trigger_distances({self.stock.id: 15000}), {})
+
+    def test_sync_sees_triggers_and_deletes_from_other_processes(self):
+        """Test sync applies triggers (which keep updated_at) and deletes made through another index"""
+        from .index import AlertIndex, STATE_TRIGGERED
+        from .services import persist_triggers
+        second = Alert.objects.create(user=self.user, stock=self.stock, alert_type='threshold',
+                                      condition='below', target_price=Decimal('100.00'))
+        # A separate index stands in for another process: our signals never reach it
+        other = AlertIndex()
+        other.load()
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            persist_triggers([(self.alert, Decimal('201.00'), 'Price above target')])
+        second_id = second.id
+        second.delete()
+        
+        with self.assertNumQueries(2):
+            other.sync()
+        self.assertEqual(other.get(self.alert.id).state, STATE_TRIGGERED)
+        self.assertIsNone(other.get(second_id))
+
+class EvaluationSnapshotTest(TestCase):
+    def setUp(self):
+        import os
+        import tempfile
+        from stocks.indicators import get_indicator_engine
+        from .index import get_alert_index
+        from .timers import get_timer_wheel
+        self.index = get_alert_index()
+        self.wheel = get_timer_wheel()
+        self.engine = get_indicator_engine()
+        for state in (self.index, self.wheel, self.engine):
+            state.clear()
+        self.path = os.path.join(tempfile.mkdtemp(), 'evaluation.bin')
+        
+        self.user = User.objects.create_user(username='testuser', email='', password='testpass123')
+        self.stock = Stock.objects.create(symbol='AAPL', name='Apple Inc.', price=Decimal('150.00'))
+        self.alert = Alert.objects.create(user=self.user, stock=self.stock, alert_type='threshold',
+                                          condition='above', target_price=Decimal('200.25'))
+        self.duration = Alert.objects.create(user=self.user, stock=self.stock, alert_type='duration',
+                                             condition='above', target_price=Decimal('140.00'),
+                                             duration_minutes=5, condition_start_time=timezone.now())
+    
+    def test_restore_replays_only_changes(self):
+        """Test a restart loads the snapshot and replays edits made after it instead of rebuilding"""
+        from stocks.services import record_stock_price
+        from .index import STATE_INACTIVE
+        from .snapshot import save_evaluation_snapshot, load_evaluation_snapshot
+        from .timers import rebuild_duration_timers
+        self.index.load()
+        rebuild_duration_timers()
+        record_stock_price(self.stock, Decimal('151.00'))
+        self.assertTrue(save_evaluation_snapshot(self.path))
+        
+        # Process restarts; meanwhile another one edits alerts without our signals
+        for state in (self.index, self.wheel, self.engine):
+            state.clear()
+        now = timezone.now()
+        Alert.objects.filter(id=self.alert.id).update(is_active=False, updated_at=now)
+        Alert.objects.filter(id=self.duration.id).update(condition_start_time=None, updated_at=now)
+        started = Alert.objects.create(user=self.user, stock=self.stock, alert_type='duration',
+                                       condition='below', target_price=Decimal('160.00'),
+                                       duration_minutes=5, condition_start_time=now)
+        
+        # Incremental queries only: index edits and deletions, timers started since, new ticks
+        with self.assertNumQueries(4):
+            self.assertTrue(load_evaluation_snapshot(self.path))
+        self.assertEqual(len(self.index), 3)
+        self.assertEqual(self.index.get(self.alert.id).state, STATE_INACTIVE)
+        # The cleared condition's deadline is only dropped once it fires
+        self.assertEqual(sorted(alert_id for alert_id, _ in self.wheel.deadlines()), [self.duration.id, started.id])
+        self.assertEqual(self.engine.summary(self.stock.id)['windows']['15m']['max'], 15100)
+    
+    def test_timer_deadlines_round_trip(self):
+        """Test pending duration deadlines survive the snapshot to the microsecond"""
+        from .snapshot import save_evaluation_snapshot, load_evaluation_snapshot
+        from .timers import rebuild_duration_timers
+        self.index.load()
+        rebuild_duration_timers()
+        deadlines = self.wheel.deadlines()
+        self.assertTrue(save_evaluation_snapshot(self.path))
+        
+        self.wheel.clear()
+        self.assertTrue(load_evaluation_snapshot(self.path))
+        self.assertEqual(self.wheel.deadlines(), deadlines)
+        self.assertEqual(self.wheel.next_deadline(), deadlines[0][1])
+    
+    def test_snapshot_older_than_deletion_markers_falls_back(self):
+        """Test a snapshot whose deletes can no longer be replayed is rejected"""
+        from .snapshot import save_evaluation_snapshot, load_evaluation_snapshot
+        self.index.load()
+        self.assertTrue(save_evaluation_snapshot(self.path))
+        
+        with patch('alerts.services.ALERT_DELETION_RETENTION', timedelta(0)):
+            self.assertFalse(load_evaluation_snapshot(self.path))
+        self.assertFalse(self.index.is_loaded)
+        self.assertTrue(load_evaluation_snapshot(self.path))
+    
+    def test_unusable_snapshot_falls_back(self):
+        """Test a missing or corrupt snapshot is rejected and leaves nothing half-restored"""
+        from .snapshot import save_evaluation_snapshot, load_evaluation_snapshot
+        self.assertFalse(load_evaluation_snapshot(self.path))
+        
+        self.index.load()
+        self.assertTrue(save_evaluation_snapshot(self.path))
+        with open(self.path, 'r+b') as f:
+            f.truncate(f.seek(0, 2) - 1)
+        self.assertFalse(load_evaluation_snapshot(self.path))
+        self.assertFalse(self.index.is_loaded)
+
+class AlertIndexUsageTest(IndexUsageTestMixin, TestCase):
+    """EXPLAIN checks that the hot alert queries are served by their indexes"""
+    def setUp(self):
+        super().setUp()
+        self.stock = Stock.objects.create(symbol='AAPL', name='Apple Inc.', price=Decimal('150.00'))
+        for i in range(20):
+            Alert.objects.create(
+                user=self.user,
+                stock=self.stock,
+                alert_type='threshold',
+                condition='above',
+                target_price=Decimal(f'{200 + i}.00')
+            )
+    
+    def test_active_alert_scan_uses_partial_index(self):
+        """Test the checker's active alert scan uses the partial stock index"""
+        self.assertUsesIndex(
+            Alert.objects.filter(is_active=True, status='active').select_related('stock'),
+            'alert_active_stock_idx'
+        )
+        self.assertUsesIndex(
+            Alert.objects.filter(is_active=True, stock_id__in=[self.stock.id]),
+            'alert_active_stock_idx'
+        )
+    
+    def test_user_status_list_uses_index(self):
+        """Test the active/triggered actions page through the (user, status, created_at, id) index"""
+        from stockAlertSystem.pagination import CreatedAtCursorPagination
+        alerts = Alert.objects.filter(user=self.user).select_related('stock').filter(status='active')
+        for after in (None, alerts.order_by('-created_at', '-id')[5]):
+            self.assertUsesIndex(
+                self.paginated(alerts, CreatedAtCursorPagination, after),
+                'alert_user_status_idx'
+            )
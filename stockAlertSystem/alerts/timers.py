@@ -0,0 +1,165 @@
+import heapq
+import logging
+import threading
+from datetime import timedelta
+
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Conditions started elsewhere commit a little after their start time; re-read
+# this much before the last sync so none are missed
+SYNC_OVERLAP = timedelta(seconds=5)
+
+class DurationTimerWheel:
+    """
+    Min-heap of deadlines (condition_start_time + duration) for duration alerts
+    whose condition has started. Rescheduled or cancelled alerts leave stale heap
+    entries behind; those are skipped when popped. A waker callback is told about
+    the earliest deadline so the scheduler can fire exactly when it expires.
+    """
+    def __init__(self, waker=None):
+        self._heap = []
+        self._deadlines = {}
+        self._lock = threading.Lock()
+        self._armed_for = None
+        self.waker = waker
+        # When sync_duration_timers() last read the database; None until a full load
+        self.synced_at = None
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    def __contains__(self, alert_id):
+        return alert_id in self._deadlines
+
+    def _wake(self):
+        # Called with the lock held
+        deadline = self._peek()
+        if deadline is None or deadline == self._armed_for:
+            return None
+        self._armed_for = deadline
+        return deadline
+
+    def _peek(self):
+        while self._heap:
+            deadline, alert_id = self._heap[0]
+            if self._deadlines.get(alert_id) == deadline:
+                return deadline
+            heapq.heappop(self._heap)
+        return None
+
+    def _notify(self, deadline):
+        if deadline is not None and self.waker is not None:
+            try:
+                self.waker(deadline)
+            except Exception as e:
+                logger.error(f"Error arming duration alert timer: {e}")
+
+    def schedule(self, alert_id, deadline):
+        with self._lock:
+            if self._deadlines.get(alert_id) == deadline:
+                return
+            self._deadlines[alert_id] = deadline
+            heapq.heappush(self._heap, (deadline, alert_id))
+            wake_at = self._wake()
+        self._notify(wake_at)
+
+    def cancel(self, alert_id):
+        with self._lock:
+            self._deadlines.pop(alert_id, None)
+
+    def next_deadline(self):
+        with self._lock:
+            return self._peek()
+
+    def pop_due(self, now=None):
+        """Remove and return the ids of alerts whose deadline has passed"""
+        now = now or timezone.now()
+        due = []
+        with self._lock:
+            while True:
+                deadline = self._peek()
+                if deadline is None or deadline > now:
+                    break
+                _, alert_id = heapq.heappop(self._heap)
+                del self._deadlines[alert_id]
+                due.append(alert_id)
+            self._armed_for = None
+            wake_at = self._wake()
+        self._notify(wake_at)
+        return due
+
+    def deadlines(self):
+        """Pending (alert_id, deadline) pairs"""
+        with self._lock:
+            return list(self._deadlines.items())
+
+    def restore(self, deadlines):
+        """Replace every pending deadline at once, e.g. from a snapshot"""
+        with self._lock:
+            self._deadlines = dict(deadlines)
+            self._heap = [(deadline, alert_id) for alert_id, deadline in self._deadlines.items()]
+            heapq.heapify(self._heap)
+            self._armed_for = None
+            wake_at = self._wake()
+        self._notify(wake_at)
+
+    def clear(self):
+        with self._lock:
+            self._heap = []
+            self._deadlines = {}
+            self._armed_for = None
+            self.synced_at = None
+
+def duration_deadline(alert):
+    return alert.condition_start_time + timedelta(minutes=alert.duration_minutes or 0)
+
+# Global timer wheel instance
+timer_wheel_instance = None
+timer_wheel_lock = threading.Lock()
+
+def get_timer_wheel():
+    """Get or create the global duration alert timer wheel"""
+    global timer_wheel_instance
+    if timer_wheel_instance is None:
+        with timer_wheel_lock:
+            if timer_wheel_instance is None:
+                timer_wheel_instance = DurationTimerWheel()
+    return timer_wheel_instance
+
+def sync_duration_timers():
+    """
+    Arm duration conditions started by other processes (e.g. a web request's
+    check) since the last sync; the first sync after clear() loads every pending
+    one. Conditions cleared or triggered elsewhere are not looked for: their stale
+    deadlines are dropped when they fire, since fire_due_duration_alerts re-reads
+    the alert. Run by the scheduler before each check. Returns the number armed.
+    """
+    from .models import Alert
+
+    wheel = get_timer_wheel()
+    started_at = timezone.now()
+    pending = Alert.objects.filter(
+        is_active=True, status='active', alert_type='duration', condition_start_time__isnull=False
+    )
+    if wheel.synced_at is not None:
+        pending = pending.filter(condition_start_time__gte=wheel.synced_at - SYNC_OVERLAP)
+
+    armed = 0
+    for alert_id, condition_start_time, duration_minutes in pending.values_list(
+        'id', 'condition_start_time', 'duration_minutes'
+    ):
+        wheel.schedule(alert_id, condition_start_time + timedelta(minutes=duration_minutes or 0))
+        armed += 1
+    wheel.synced_at = started_at
+    return armed
+
+def rebuild_duration_timers():
+    """Reload every pending duration alert from the database, e.g. on startup"""
+    wheel = get_timer_wheel()
+    wheel.clear()
+    sync_duration_timers()
+
+    logger.info(f"Rebuilt duration alert timers: {len(wheel)} pending")
+    return len(wheel)
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import AlertViewSet, AlertHistoryViewSet
+from .views import AlertViewSet, AlertHistoryViewSet, AlertRefreshView
 
 app_name = 'alerts'
 
@@ -9,5 +9,6 @@ router.register(r'alerts', AlertViewSet, basename='alert')
 router.register(r'history', AlertHistoryViewSet, basename='alert-history')
 
 urlpatterns = [
+    path('alerts/<int:pk>/refresh/', AlertRefreshView.as_view(), name='alert-refresh'),
     path('', include(router.urls)),
 ]
@@ -4,12 +4,22 @@ from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
 from django.db.models import Q
 from django.utils import timezone
+from django.http import JsonResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from django.utils.decorators import method_decorator
+from asgiref.sync import sync_to_async
 
 from .models import Alert, AlertHistory
 from .serializers import (
     AlertSerializer, AlertHistorySerializer, AlertCreateSerializer, AlertUpdateSerializer
 )
-from .services import check_all_alerts
+from .services import check_alerts, check_alert_condition
+from accounts.authentication import aauthenticate_jwt
+from stocks.quotes import get_quote
+from stocks.services import aupdate_single_stock_price
+from stockAlertSystem.pagination import TriggeredAtCursorPagination
+from stocks.exports import EXPORT_CHUNK_SIZE, EXPORT_FORMATS, parse_time_range, streaming_export_response
 
 class AlertViewSet(viewsets.ModelViewSet):
     """ViewSet for managing user alerts"""
@@ -36,18 +46,38 @@ class AlertViewSet(viewsets.ModelViewSet):
         """Manually check if an alert condition is met"""
         alert = self.get_object()
         
-        # Check the alert condition directly
-        try:
-            # This will check all alerts, but we can enhance it later
-            result = check_all_alerts()
+        # Evaluate only this alert; other users' alerts are left to the scheduler
+        result = check_alerts(alert_ids=[alert.id])
+        if result is None:
             return Response({
-                'message': 'Alert condition check completed',
-                'result': result
-            })
-        except Exception as e:
+                'error': 'Failed to check alert condition'
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        
+        return Response({
+            'message': 'Alert condition check completed',
+            'triggered': alert.id in result['triggered_alert_ids'],
+            'result': result
+        })
+    
+    @action(detail=False, methods=['post'])
+    def check_all(self, request):
+        """Check the current user's active alerts, optionally limited to some symbols"""
+        symbols = request.data.get('symbols')
+        if symbols is not None and not isinstance(symbols, list):
+            return Response({
+                'error': 'symbols must be a list'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        result = check_alerts(user=request.user, symbols=symbols)
+        if result is None:
             return Response({
-                'error': f'Failed to check alert condition: {str(e)}'
+                'error': 'Failed to check alerts'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        
+        return Response({
+            'message': 'Alert check completed',
+            'result': result
+        })
     
     @action(detail=True, methods=['post'])
     def toggle_active(self, request, pk=None):
@@ -65,6 +95,11 @@ class AlertViewSet(viewsets.ModelViewSet):
     def active(self, request):
         """Get only active alerts"""
         active_alerts = self.get_queryset().filter(is_active=True, status='active')
+        page = self.paginate_queryset(active_alerts)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        
         serializer = self.get_serializer(active_alerts, many=True)
         return Response(serializer.data)
     
@@ -72,6 +107,11 @@ class AlertViewSet(viewsets.ModelViewSet):
     def triggered(self, request):
         """Get triggered alerts"""
         triggered_alerts = self.get_queryset().filter(status='triggered')
+        page = self.paginate_queryset(triggered_alerts)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        
         serializer = self.get_serializer(triggered_alerts, many=True)
         return Response(serializer.data)
     
@@ -79,9 +119,10 @@ class AlertViewSet(viewsets.ModelViewSet):
     def reset_triggered(self, request):
         """Reset all triggered alerts back to active"""
         try:
-            # Reset all triggered alerts for the current user
+            # Reset all triggered alerts for the current user; bumping updated_at
+            # puts them back in front of the alert checker
             triggered_alerts = self.get_queryset().filter(status='triggered')
-            updated_count = triggered_alerts.update(status='active', is_active=True)
+            updated_count = triggered_alerts.update(status='active', is_active=True, updated_at=timezone.now())
             
             return Response({
                 'message': f'Reset {updated_count} triggered alerts successfully',
@@ -96,6 +137,7 @@ class AlertHistoryViewSet(viewsets.ReadOnlyModelViewSet):
     """ViewSet for viewing alert history"""
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = AlertHistorySerializer
+    pagination_class = TriggeredAtCursorPagination
     
     def get_queryset(self):
         """Return alert history for the current user"""
@@ -128,5 +170,79 @@ class AlertHistoryViewSet(viewsets.ReadOnlyModelViewSet):
             )
         
         stock_history = self.get_queryset().filter(alert__stock__symbol=stock_symbol)
+        page = self.paginate_queryset(stock_history)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        
         serializer = self.get_serializer(stock_history, many=True)
         return Response(serializer.data)
+    
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Stream alert history as CSV or NDJSON, filtered by symbol and time range"""
+        output = request.query_params.get('output', 'csv').lower()
+        if output not in EXPORT_FORMATS:
+            return Response(
+                {'error': f'Unsupported output format: {output}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            start, end = parse_time_range(request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        history = AlertHistory.objects.filter(alert__user=request.user)
+        stock_symbol = request.query_params.get('symbol', '').upper()
+        if stock_symbol:
+            history = history.filter(alert__stock__symbol=stock_symbol)
+        if start:
+            history = history.filter(triggered_at__gte=start)
+        if end:
+            history = history.filter(triggered_at__lte=end)
+        
+        header = [
+            'id', 'alert_id', 'symbol', 'alert_type', 'condition', 'target_price',
+            'stock_price', 'triggered_at', 'message', 'notification_sent'
+        ]
+        rows = history.order_by('triggered_at', 'id').values_list(
+            'id', 'alert_id', 'alert__stock__symbol', 'alert__alert_type', 'alert__condition',
+            'alert__target_price', 'stock_price', 'triggered_at', 'message', 'notification_sent'
+        ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        
+        return streaming_export_response(
+            rows,
+            header=header,
+            output=output,
+            filename=f"alert_history_{stock_symbol.lower() or 'all'}",
+        )
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AlertRefreshView(View):
+    """
+    Fetch the latest price for an alert's stock and evaluate the alert against it.
+    Async, so the upstream call does not hold a worker; serve it through asgi.py.
+    """
+    async def post(self, request, pk):
+        user = await aauthenticate_jwt(request)
+        if user is None:
+            return JsonResponse({"error": "Authentication credentials were not provided or are invalid"}, status=401)
+        
+        try:
+            alert = await Alert.objects.select_related('stock').aget(pk=pk, user=user)
+        except Alert.DoesNotExist:
+            return JsonResponse({"error": "Alert not found"}, status=404)
+        
+        result = await aupdate_single_stock_price(alert.stock.symbol)
+        if result.startswith("Error:"):
+            return JsonResponse({"error": result}, status=502)
+        
+        condition_met = await sync_to_async(check_alert_condition)(alert)
+        quote = await sync_to_async(get_quote)(alert.stock.symbol)
+        return JsonResponse({
+            'alert_id': alert.id,
+            'symbol': alert.stock.symbol,
+            'price': quote['price'] if quote else None,
+            'condition_met': condition_met
+        })
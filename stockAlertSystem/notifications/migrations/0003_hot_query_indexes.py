@@ -0,0 +1,24 @@
+# Generated by Django 5.2.4 on 2026-10-19 04:13
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alerts', '0004_hot_query_indexes'),
+        ('notifications', '0002_pagination_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'status', '-created_at'], name='notif_user_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['alert_history', 'notification_type'], name='notif_history_type_idx'),
+        ),
+    ]
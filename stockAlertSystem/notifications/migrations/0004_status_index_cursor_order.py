@@ -0,0 +1,24 @@
+# Generated by Django 5.2.4 on 2026-10-19 06:18
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alerts', '0008_status_index_cursor_order'),
+        ('notifications', '0003_hot_query_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='notification',
+            name='notif_user_status_idx',
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'status', '-created_at', '-id'], name='notif_user_status_idx'),
+        ),
+    ]
@@ -28,6 +28,14 @@ class Notification(models.Model):
         ordering = ['-created_at']
         verbose_name = "Notification"
         verbose_name_plural = "Notifications"
+        indexes = [
+            # Back the (created_at, id) cursor pagination of a user's notifications
+            models.Index(fields=['user', '-created_at', '-id'], name='notif_user_created_idx'),
+            # pending/sent/failed lists filter by user and status, in cursor order
+            models.Index(fields=['user', 'status', '-created_at', '-id'], name='notif_user_status_idx'),
+            # send_email_notification looks notifications up by (alert_history, notification_type)
+            models.Index(fields=['alert_history', 'notification_type'], name='notif_history_type_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.notification_type} - {self.status}"
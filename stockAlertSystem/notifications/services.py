@@ -6,6 +6,9 @@ from django.utils import timezone
 
 logger = logging.getLogger(__name__)
 
+# Notification ids per status UPDATE
+NOTIFICATION_BATCH_SIZE = 1000
+
 def send_email_notification(user_id, subject, message, alert_history_id=None):
     """Send email notification to user"""
     try:
@@ -78,6 +81,62 @@ def send_email_notification(user_id, subject, message, alert_history_id=None):
         
         return f"Error: {str(e)}"
 
+def deliver_email_notifications(notifications, users):
+    """
+    Send pending email Notification rows over one SMTP connection and record the
+    outcome with one UPDATE per batch of ids. `users` maps user id to the already
+    loaded User, so nothing is looked up per notification. Returns (sent, failed).
+    """
+    from django.core.mail import EmailMessage, get_connection
+    from .models import Notification
+    
+    if not notifications:
+        return 0, 0
+    
+    sent_ids = []
+    failed_ids = {}
+    try:
+        connection = get_connection(fail_silently=False)
+        connection.open()
+    except Exception as e:
+        logger.error(f"Error opening email connection: {e}")
+        failed_ids[str(e)] = [notification.id for notification in notifications]
+        connection = None
+    
+    if connection is not None:
+        try:
+            for notification in notifications:
+                email = EmailMessage(
+                    subject=notification.subject,
+                    body=notification.message,
+                    from_email=settings.EMAIL_HOST_USER,
+                    to=[users[notification.user_id].email],
+                    connection=connection,
+                )
+                # One message per call on the shared connection, so a bad
+                # address fails only its own notification
+                try:
+                    connection.send_messages([email])
+                    sent_ids.append(notification.id)
+                except Exception as e:
+                    logger.error(f"Error sending email notification {notification.id}: {e}")
+                    failed_ids.setdefault(str(e), []).append(notification.id)
+        finally:
+            connection.close()
+    
+    now = timezone.now()
+    for i in range(0, len(sent_ids), NOTIFICATION_BATCH_SIZE):
+        Notification.objects.filter(id__in=sent_ids[i:i + NOTIFICATION_BATCH_SIZE]).update(status='sent', sent_at=now)
+    for error, ids in failed_ids.items():
+        for i in range(0, len(ids), NOTIFICATION_BATCH_SIZE):
+            Notification.objects.filter(id__in=ids[i:i + NOTIFICATION_BATCH_SIZE]).update(
+                status='failed', error_message=error
+            )
+    
+    failed_count = sum(len(ids) for ids in failed_ids.values())
+    logger.info(f"Email notifications delivered: {len(sent_ids)} sent, {failed_count} failed")
+    return len(sent_ids), failed_count
+
 def send_bulk_email_notifications(notification_ids):
     """Send multiple email notifications in bulk"""
     logger.info(f"Starting bulk email send for {len(notification_ids)} notifications")
@@ -3,7 +3,9 @@ from django.test import TestCase
 from django.contrib.auth.models import User
 from stocks.models import Stock
 from alerts.models import Alert, AlertHistory
+from notifications.models import Notification
 from notifications.services import send_email_notification
+from stockAlertSystem.testing import IndexUsageTestMixin
 import logging
 
 class EmailNotificationTests(TestCase):
@@ -107,6 +109,46 @@ class EmailNotificationTests(TestCase):
         self.assertEqual(self.stock.name, 'Test Stock')
         self.assertEqual(float(self.stock.price), 100.00)
 
+class NotificationIndexUsageTest(IndexUsageTestMixin, TestCase):
+    """EXPLAIN checks that the hot notification queries are served by their indexes"""
+    def setUp(self):
+        super().setUp()
+        stock = Stock.objects.create(symbol='TEST', name='Test Stock', price=100.00)
+        alert = Alert.objects.create(
+            user=self.user,
+            stock=stock,
+            alert_type='threshold',
+            condition='above',
+            target_price=105.00
+        )
+        self.alert_history = AlertHistory.objects.create(alert=alert, stock_price=110.00, message='Test')
+        for status in ['pending', 'sent', 'failed'] * 5:
+            Notification.objects.create(
+                user=self.user,
+                alert_history=self.alert_history,
+                notification_type='email',
+                subject='Test',
+                message='Test',
+                status=status
+            )
+    
+    def test_status_list_uses_index(self):
+        """Test pending/sent/failed lists page through the (user, status, created_at, id) index"""
+        from stockAlertSystem.pagination import CreatedAtCursorPagination
+        notifications = Notification.objects.filter(user=self.user).select_related('alert_history').filter(status='pending')
+        for after in (None, notifications.order_by('-created_at', '-id')[2]):
+            self.assertUsesIndex(
+                self.paginated(notifications, CreatedAtCursorPagination, after),
+                'notif_user_status_idx'
+            )
+    
+    def test_alert_history_lookup_uses_index(self):
+        """Test send_email_notification's lookup uses the (alert_history, type) index"""
+        self.assertUsesIndex(
+            Notification.objects.filter(alert_history_id=self.alert_history.id, notification_type='email'),
+            'notif_history_type_idx'
+        )
+
 # Standalone test runner for development
 def run_standalone_tests():
     """Run tests outside of Django test framework"""
@@ -36,6 +36,11 @@ class NotificationViewSet(viewsets.ModelViewSet):
     def pending(self, request):
         """Get pending notifications"""
         pending_notifications = self.get_queryset().filter(status='pending')
+        page = self.paginate_queryset(pending_notifications)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        
         serializer = self.get_serializer(pending_notifications, many=True)
         return Response(serializer.data)
     
@@ -43,6 +48,11 @@ class NotificationViewSet(viewsets.ModelViewSet):
     def sent(self, request):
         """Get sent notifications"""
         sent_notifications = self.get_queryset().filter(status='sent')
+        page = self.paginate_queryset(sent_notifications)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        
         serializer = self.get_serializer(sent_notifications, many=True)
         return Response(serializer.data)
     
@@ -50,6 +60,11 @@ class NotificationViewSet(viewsets.ModelViewSet):
     def failed(self, request):
         """Get failed notifications"""
         failed_notifications = self.get_queryset().filter(status='failed')
+        page = self.paginate_queryset(failed_notifications)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        
         serializer = self.get_serializer(failed_notifications, many=True)
         return Response(serializer.data)
     
@@ -208,5 +223,10 @@ class NotificationHistoryViewSet(viewsets.ReadOnlyModelViewSet):
             )
         
         type_notifications = self.get_queryset().filter(notification_type=notification_type)
+        page = self.paginate_queryset(type_notifications)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        
         serializer = self.get_serializer(type_notifications, many=True)
         return Response(serializer.data)
@@ -0,0 +1,142 @@
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+logger = logging.getLogger(__name__)
+
+# Events buffered per subscriber before the oldest ones are dropped
+SUBSCRIBER_QUEUE_SIZE = 100
+
+class Subscription:
+    """
+    One connected client: the symbols and user it listens to, plus the
+    asyncio queue (bound to the client's event loop) its events are delivered to
+    """
+    def __init__(self, symbols, user_id, loop, max_queue=SUBSCRIBER_QUEUE_SIZE):
+        self.symbols = frozenset(symbols)
+        self.user_id = user_id
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.dropped = 0
+
+    def _put(self, event):
+        # Slow consumers lose their oldest events instead of growing without bound
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    def deliver(self, event):
+        """Hand an event to the subscriber's loop; safe to call from any thread"""
+        self.loop.call_soon_threadsafe(self._put, event)
+
+class EventBroker:
+    """
+    In-process pub/sub fanning price ticks and alert triggers out to subscribers.
+    Each event is encoded once and the same payload is handed to every listener,
+    so one price write reaches any number of clients without further queries.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_symbol = defaultdict(set)
+        self._by_user = defaultdict(set)
+
+    def subscribe(self, symbols=(), user_id=None, loop=None, max_queue=SUBSCRIBER_QUEUE_SIZE):
+        """Register a subscriber on the running (or given) event loop"""
+        loop = loop or asyncio.get_running_loop()
+        subscription = Subscription(symbols, user_id, loop, max_queue=max_queue)
+        with self._lock:
+            for symbol in subscription.symbols:
+                self._by_symbol[symbol].add(subscription)
+            if user_id is not None:
+                self._by_user[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for symbol in subscription.symbols:
+                listeners = self._by_symbol.get(symbol)
+                if listeners is not None:
+                    listeners.discard(subscription)
+                    if not listeners:
+                        del self._by_symbol[symbol]
+            listeners = self._by_user.get(subscription.user_id)
+            if listeners is not None:
+                listeners.discard(subscription)
+                if not listeners:
+                    del self._by_user[subscription.user_id]
+
+    def subscriber_count(self):
+        with self._lock:
+            return len({sub for subs in self._by_symbol.values() for sub in subs} |
+                       {sub for subs in self._by_user.values() for sub in subs})
+
+    def _fanout(self, listeners, event_type, payload):
+        if not listeners:
+            return 0
+        event = (event_type, json.dumps(payload, cls=DjangoJSONEncoder))
+        delivered = 0
+        for subscription in listeners:
+            try:
+                subscription.deliver(event)
+                delivered += 1
+            except RuntimeError:
+                # The subscriber's event loop is gone; the client disconnected
+                self.unsubscribe(subscription)
+        return delivered
+
+    def publish_price(self, symbol, price, timestamp):
+        with self._lock:
+            listeners = list(self._by_symbol.get(symbol, ()))
+        return self._fanout(listeners, 'price', {
+            'symbol': symbol,
+            'price': price,
+            'timestamp': timestamp,
+        })
+
+    def publish_alert(self, user_id, payload):
+        with self._lock:
+            listeners = list(self._by_user.get(user_id, ()))
+        return self._fanout(listeners, 'alert', payload)
+
+# Global broker instance
+broker_instance = None
+broker_lock = threading.Lock()
+
+def get_broker():
+    """Get or create the global event broker"""
+    global broker_instance
+    if broker_instance is None:
+        with broker_lock:
+            if broker_instance is None:
+                broker_instance = EventBroker()
+    return broker_instance
+
+def publish_price_tick(symbol, price, timestamp):
+    """Push a price update to every client subscribed to the symbol"""
+    try:
+        return get_broker().publish_price(symbol, price, timestamp)
+    except Exception as e:
+        logger.error(f"Error publishing price tick for {symbol}: {e}")
+        return 0
+
+def publish_alert_triggered(alert, alert_history):
+    """Push a trigger event to the alert owner's connected clients"""
+    try:
+        return get_broker().publish_alert(alert.user_id, {
+            'alert_id': alert.id,
+            'alert_history_id': alert_history.id,
+            'symbol': alert.stock.symbol,
+            'condition': alert.condition,
+            'target_price': alert.target_price,
+            'stock_price': alert_history.stock_price,
+            'message': alert_history.message,
+            'triggered_at': alert_history.triggered_at,
+        })
+    except Exception as e:
+        logger.error(f"Error publishing trigger for alert {alert.id}: {e}")
+        return 0
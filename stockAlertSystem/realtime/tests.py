@@ -0,0 +1,99 @@
+import asyncio
+import json
+import threading
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from stocks.models import Stock
+from stocks.services import record_stock_price
+from .services import EventBroker
+
+class EventBrokerTest(TestCase):
+    def test_price_fanout_by_symbol(self):
+        """Test price ticks only reach subscribers of that symbol"""
+        async def scenario():
+            broker = EventBroker()
+            aapl = broker.subscribe(symbols=['AAPL'])
+            msft = broker.subscribe(symbols=['MSFT'])
+
+            delivered = broker.publish_price('AAPL', Decimal('150.25'), timezone.now())
+            await asyncio.sleep(0)
+            return delivered, aapl.queue.qsize(), msft.queue.qsize(), aapl.queue.get_nowait()
+
+        delivered, aapl_size, msft_size, event = asyncio.run(scenario())
+        self.assertEqual(delivered, 1)
+        self.assertEqual((aapl_size, msft_size), (1, 0))
+        self.assertEqual(event[0], 'price')
+        self.assertEqual(json.loads(event[1])['price'], '150.25')
+
+    def test_publish_from_other_thread(self):
+        """Test events published from a worker thread land on the subscriber's loop"""
+        async def scenario():
+            broker = EventBroker()
+            subscription = broker.subscribe(user_id=7)
+            publisher = threading.Thread(target=broker.publish_alert, args=(7, {'alert_id': 1}))
+            publisher.start()
+            publisher.join()
+            return await asyncio.wait_for(subscription.queue.get(), 1)
+
+        event_type, data = asyncio.run(scenario())
+        self.assertEqual(event_type, 'alert')
+        self.assertEqual(json.loads(data), {'alert_id': 1})
+
+    def test_slow_subscriber_drops_oldest(self):
+        """Test a full subscriber queue keeps the newest events"""
+        async def scenario():
+            broker = EventBroker()
+            subscription = broker.subscribe(symbols=['AAPL'], max_queue=2)
+            for price in ['1.00', '2.00', '3.00']:
+                broker.publish_price('AAPL', Decimal(price), timezone.now())
+            await asyncio.sleep(0)
+            prices = [json.loads(subscription.queue.get_nowait()[1])['price'] for _ in range(2)]
+            broker.unsubscribe(subscription)
+            return prices, subscription.dropped, broker.subscriber_count()
+
+        prices, dropped, remaining = asyncio.run(scenario())
+        self.assertEqual(prices, ['2.00', '3.00'])
+        self.assertEqual(dropped, 1)
+        self.assertEqual(remaining, 0)
+
+class EventStreamViewTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.stock = Stock.objects.create(symbol='AAPL', name='Apple Inc.', price=Decimal('150.00'))
+        self.token = str(RefreshToken.for_user(self.user).access_token)
+
+    async def test_requires_authentication(self):
+        """Test the stream rejects requests without a valid token"""
+        response = await self.async_client.get(reverse('realtime:events'), {'symbols': 'AAPL'})
+        self.assertEqual(response.status_code, 401)
+
+    async def test_stream_receives_price_tick(self):
+        """Test a recorded price is pushed to a subscribed stream"""
+        response = await self.async_client.get(
+            reverse('realtime:events'), {'symbols': 'AAPL', 'token': self.token}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        stream = response.streaming_content
+        greeting = await anext(stream)
+        self.assertIn(b'subscribed to AAPL', greeting)
+
+        from asgiref.sync import sync_to_async
+        await sync_to_async(record_stock_price)(self.stock, Decimal('151.50'))
+
+        event = await asyncio.wait_for(anext(stream), 1)
+        self.assertTrue(event.startswith(b'event: price'))
+        self.assertIn(b'"price": "151.50"', event)
+
+        await stream.aclose()
@@ -0,0 +1,8 @@
+from django.urls import path
+from .views import EventStreamView
+
+app_name = 'realtime'
+
+urlpatterns = [
+    path('events/', EventStreamView.as_view(), name='events'),
+]
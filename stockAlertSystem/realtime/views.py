@@ -0,0 +1,55 @@
+import asyncio
+import logging
+
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views import View
+
+from accounts.authentication import aauthenticate_jwt
+from stocks.services import validate_stock_symbol
+from .services import get_broker
+
+logger = logging.getLogger(__name__)
+
+MAX_SUBSCRIBED_SYMBOLS = 50
+HEARTBEAT_SECONDS = 15
+
+class EventStreamView(View):
+    """
+    Server-Sent Events stream of price ticks for the requested symbols and
+    trigger events for the user's own alerts. Must be served through asgi.py.
+    """
+    async def get(self, request):
+        user = await aauthenticate_jwt(request)
+        if user is None:
+            return JsonResponse({"error": "Authentication credentials were not provided or are invalid"}, status=401)
+
+        symbols = [s.strip().upper() for s in request.GET.get('symbols', '').split(',') if s.strip()]
+        if len(symbols) > MAX_SUBSCRIBED_SYMBOLS:
+            return JsonResponse({"error": f"At most {MAX_SUBSCRIBED_SYMBOLS} symbols per stream"}, status=400)
+        for symbol in symbols:
+            is_valid, message = validate_stock_symbol(symbol)
+            if not is_valid:
+                return JsonResponse({"error": f"{symbol}: {message}"}, status=400)
+
+        async def stream():
+            # Subscribe once the response is actually being consumed so an
+            # abandoned response never leaves a registration behind
+            broker = get_broker()
+            subscription = broker.subscribe(symbols=symbols, user_id=user.id)
+            try:
+                yield f"retry: 5000\n: subscribed to {','.join(symbols) or 'alerts only'}\n\n"
+                while True:
+                    try:
+                        event_type, data = await asyncio.wait_for(subscription.queue.get(), HEARTBEAT_SECONDS)
+                    except asyncio.TimeoutError:
+                        yield ": keep-alive\n\n"
+                        continue
+                    yield f"event: {event_type}\ndata: {data}\n\n"
+            finally:
+                broker.unsubscribe(subscription)
+                logger.debug(f"Event stream closed for user {user.id}")
+
+        response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
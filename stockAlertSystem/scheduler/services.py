@@ -1,14 +1,19 @@
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.date import DateTrigger
 from apscheduler.jobstores.memory import MemoryJobStore
 from django.conf import settings
 import logging
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 import pytz
+from stocks.market_calendar import CALENDARS, get_calendars
 
 logger = logging.getLogger(__name__)
 
+# Minutes after the close before closing prices are fetched
+MARKET_CLOSE_DELAY = 5
+
 class StockScheduler:
     """
     APScheduler-based scheduler for stock price updates and alert checking
@@ -35,16 +40,44 @@ class StockScheduler:
     def setup_jobs(self):
         """Setup all scheduled jobs for the stock system"""
         
-        # Update stock prices every 2 minutes
-        self.scheduler.add_job(
-            self.update_stock_prices,
-            IntervalTrigger(minutes=2),
-            id='update_stock_prices',
-            name='Update Stock Prices',
-            max_instances=1,
-            replace_existing=True,
-            misfire_grace_time=120  # 2 minutes grace period
-        )
+        # Refresh prices per exchange calendar: high frequency during sessions,
+        # one closing refresh after each close, nothing while markets are shut
+        for calendar in get_calendars():
+            # Whole hours touching the session; market_hours_update trims the edges
+            close = calendar.close_time
+            last_hour = close.hour if close.minute else close.hour - 1
+            self.scheduler.add_job(
+                self.market_hours_update,
+                CronTrigger(
+                    day_of_week='mon-fri',
+                    hour=f"{calendar.open_time.hour}-{last_hour}",
+                    minute=f"*/{settings.MARKET_HOURS_UPDATE_INTERVAL}",
+                    timezone=calendar.timezone
+                ),
+                args=[calendar.name],
+                id=f'market_hours_update_{calendar.name}',
+                name=f'Market Hours Update ({calendar.name})',
+                max_instances=1,
+                replace_existing=True,
+                misfire_grace_time=settings.MARKET_HOURS_UPDATE_INTERVAL * 60
+            )
+            
+            after_close = datetime.combine(datetime.min, close) + timedelta(minutes=MARKET_CLOSE_DELAY)
+            self.scheduler.add_job(
+                self.market_close_update,
+                CronTrigger(
+                    day_of_week='mon-fri',
+                    hour=after_close.hour,
+                    minute=after_close.minute,
+                    timezone=calendar.timezone
+                ),
+                args=[calendar.name],
+                id=f'market_close_update_{calendar.name}',
+                name=f'Market Close Update ({calendar.name})',
+                max_instances=1,
+                replace_existing=True,
+                misfire_grace_time=3600
+            )
         
         # Check alerts every 4 minutes
         self.scheduler.add_job(
@@ -57,7 +90,15 @@ class StockScheduler:
             misfire_grace_time=240  # 4 minutes grace period
         )
         
-        
+        # Snapshot the in-memory evaluation state so a restart can warm-start from it
+        self.scheduler.add_job(
+            self.save_evaluation_snapshot,
+            IntervalTrigger(minutes=settings.EVALUATION_SNAPSHOT_INTERVAL),
+            id='evaluation_snapshot',
+            name='Evaluation Snapshot',
+            max_instances=1,
+            replace_existing=True
+        )
         
         # Daily cleanup job (midnight UTC)
         self.scheduler.add_job(
@@ -72,10 +113,10 @@ class StockScheduler:
         logger.info("Stock scheduler jobs configured successfully")
     
     def update_stock_prices(self):
-        """Update stock prices for all active stocks"""
+        """Update prices for the active stocks that are due, by priority, regardless of market hours"""
         try:
-            from stocks.services import update_all_stock_prices
-            result = update_all_stock_prices()
+            from stocks.refresh import update_prioritized_stock_prices
+            result = update_prioritized_stock_prices()
             logger.info(f"Stock prices updated successfully: {result}")
             return result
         except Exception as e:
@@ -86,6 +127,10 @@ class StockScheduler:
         """Check all active alerts against current stock prices"""
         try:
             from alerts.services import check_all_alerts
+            from alerts.timers import sync_duration_timers
+            
+            # Arm duration conditions started outside the scheduler (e.g. by API checks)
+            sync_duration_timers()
             result = check_all_alerts()
             logger.info(f"Alerts checked successfully: {result}")
             return result
@@ -93,31 +138,139 @@ class StockScheduler:
             logger.error(f"Error checking alerts: {e}")
             return None
     
-    def market_hours_update(self):
-        """Update during market hours with higher frequency"""
+    def start_duration_timers(self):
+        """Rebuild pending duration alert deadlines from the database and arm the timer"""
+        try:
+            from alerts.timers import get_timer_wheel, rebuild_duration_timers
+            
+            wheel = get_timer_wheel()
+            wheel.waker = self.arm_duration_timer
+            rebuild_duration_timers()
+        except Exception as e:
+            logger.error(f"Error starting duration alert timers: {e}")
+    
+    def load_alert_index(self):
+        """Load every alert into the resident in-memory alert index"""
+        try:
+            from alerts.index import get_alert_index
+            return get_alert_index().load()
+        except Exception as e:
+            logger.error(f"Error loading alert index: {e}")
+            return None
+    
+    def save_evaluation_snapshot(self):
+        """Write the alert index, duration timers and indicators to disk"""
         try:
-            from stocks.services import update_all_stock_prices
-            result = update_all_stock_prices()
+            from alerts.snapshot import save_evaluation_snapshot
+            return save_evaluation_snapshot()
+        except Exception as e:
+            logger.error(f"Error saving evaluation snapshot: {e}")
+            return False
+    
+    def warm_start(self):
+        """
+        Restore the evaluation state from the last snapshot and replay later
+        changes; without a usable snapshot, rebuild it from the database
+        """
+        try:
+            from alerts.snapshot import load_evaluation_snapshot
+            from alerts.timers import get_timer_wheel
+            
+            get_timer_wheel().waker = self.arm_duration_timer
+            if load_evaluation_snapshot():
+                return True
+        except Exception as e:
+            logger.error(f"Error restoring evaluation snapshot: {e}")
+        
+        self.start_duration_timers()
+        self.load_alert_index()
+        return False
+    
+    def arm_duration_timer(self, deadline):
+        """(Re)schedule the one-shot job that fires at the earliest duration deadline"""
+        self.scheduler.add_job(
+            self.fire_duration_alerts,
+            DateTrigger(run_date=deadline),
+            id='duration_alert_timer',
+            name='Duration Alert Timer',
+            replace_existing=True,
+            misfire_grace_time=None
+        )
+    
+    def fire_duration_alerts(self):
+        """Trigger duration alerts whose deadline has passed"""
+        try:
+            from alerts.services import fire_due_duration_alerts
+            result = fire_due_duration_alerts()
+            logger.info(f"Duration alert timers fired: {result} triggered")
+            return result
+        except Exception as e:
+            logger.error(f"Error firing duration alerts: {e}")
+            return None
+    
+    def market_hours_update(self, calendar_name='US'):
+        """Update due prices for one exchange calendar while its session is open"""
+        try:
+            from stocks.refresh import update_prioritized_stock_prices
+            
+            # The trigger covers whole hours on weekdays; holidays, the half hour
+            # before the open and half-day afternoons are skipped here
+            calendar = CALENDARS[calendar_name]
+            if not calendar.is_open():
+                logger.debug(f"Market closed for {calendar_name}, skipping update")
+                return None
+            
+            result = update_prioritized_stock_prices(calendar=calendar)
             logger.info(f"Market hours update completed: {result}")
             return result
         except Exception as e:
             logger.error(f"Error in market hours update: {e}")
             return None
     
+    def market_close_update(self, calendar_name='US'):
+        """Record closing prices once a session has ended"""
+        try:
+            from stocks.refresh import update_closing_prices
+            
+            calendar = CALENDARS[calendar_name]
+            if calendar.session(calendar.local_date()) is None:
+                logger.debug(f"No session today for {calendar_name}, skipping closing update")
+                return None
+            
+            result = update_closing_prices(calendar)
+            logger.info(f"Market close update completed: {result}")
+            return result
+        except Exception as e:
+            logger.error(f"Error in market close update: {e}")
+            return None
+    
     def daily_cleanup(self):
         """Daily cleanup of old data and maintenance tasks"""
         try:
-            from stocks.services import cleanup_old_prices
+            from stocks.services import cleanup_old_prices, cleanup_old_rollups, compact_price_rollups
             from alerts.services import cleanup_old_alerts
             
-            # Clean up old stock prices (keep last 30 days)
-            prices_cleaned = cleanup_old_prices(days=30)
+            # Fold any remaining ticks into the rollups before raw history is dropped
+            compact_price_rollups()
+            
+            # Clean up old raw stock prices (longer ranges live in the rollups)
+            prices_cleaned = cleanup_old_prices(days=settings.RAW_PRICE_RETENTION_DAYS)
+            rollups_cleaned = cleanup_old_rollups(settings.ROLLUP_RETENTION_DAYS)
             
             # Clean up old alert history (keep last 90 days)
             alerts_cleaned = cleanup_old_alerts(days=90)
             
-            logger.info(f"Daily cleanup completed - Prices: {prices_cleaned}, Alerts: {alerts_cleaned}")
-            return {"prices_cleaned": prices_cleaned, "alerts_cleaned": alerts_cleaned}
+            # Reload the alert index, dropping tombstones and alerts deleted elsewhere
+            self.load_alert_index()
+            
+            logger.info(
+                f"Daily cleanup completed - Prices: {prices_cleaned}, Rollups: {rollups_cleaned}, Alerts: {alerts_cleaned}"
+            )
+            return {
+                "prices_cleaned": prices_cleaned,
+                "rollups_cleaned": rollups_cleaned,
+                "alerts_cleaned": alerts_cleaned
+            }
         except Exception as e:
             logger.error(f"Error in daily cleanup: {e}")
             return None
@@ -128,6 +281,7 @@ class StockScheduler:
             if not self.is_running:
                 self.scheduler.start()
                 self.is_running = True
+                self.warm_start()
                 logger.info("Stock scheduler started successfully")
                 return True
             else:
@@ -142,6 +296,7 @@ class StockScheduler:
         try:
             if self.is_running:
                 self.scheduler.shutdown()
+                self.save_evaluation_snapshot()
                 self.is_running = False
                 logger.info("Stock scheduler stopped successfully")
                 return True
@@ -1,3 +1,25 @@
 from django.test import TestCase
+from unittest.mock import patch
 
-# Create your tests here.
+from .services import StockScheduler
+
+class StockSchedulerJobsTest(TestCase):
+    def test_price_updates_follow_market_calendars(self):
+        """Test price updates are scheduled per exchange calendar instead of around the clock"""
+        scheduler = StockScheduler()
+        job_ids = {job.id for job in scheduler.scheduler.get_jobs()}
+        
+        self.assertIn('market_hours_update_US', job_ids)
+        self.assertIn('market_close_update_US', job_ids)
+        self.assertNotIn('update_stock_prices', job_ids)
+        
+        trigger = str(scheduler.scheduler.get_job('market_hours_update_US').trigger)
+        self.assertIn("day_of_week='mon-fri'", trigger)
+        self.assertIn("hour='9-15'", trigger)
+    
+    @patch('stocks.refresh.update_prioritized_stock_prices')
+    def test_market_hours_update_skips_closed_market(self, mock_update):
+        """Test the session job does nothing while the market is closed"""
+        with patch('stocks.market_calendar.MarketCalendar.is_open', return_value=False):
+            self.assertIsNone(StockScheduler().market_hours_update('US'))
+        mock_update.assert_not_called()
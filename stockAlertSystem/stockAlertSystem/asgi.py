@@ -3,4 +3,9 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'stockAlertSystem.settings')
 
+# Serves the regular API plus long-lived streams such as /api/realtime/events/,
+# e.g. `uvicorn stockAlertSystem.asgi:application`. Realtime events are fanned out
+# in-process, so run the scheduler in the same process as the ASGI server.
+# The price refresh endpoints are async views and only avoid blocking a worker
+# while the upstream API call is in flight when served from here.
 application = get_asgi_application()
@@ -0,0 +1,113 @@
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+
+class CreatedAtCursorPagination(CursorPagination):
+    """
+    Keyset pagination on (created_at, id), newest first.
+    DRF's cursor only records the first ordering field and skips ties with an
+    offset; here the cursor holds every ordering field and the next page is the
+    rows strictly after it, so each page is a seek on the composite index and
+    deep pages cost the same as the first one.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            (offset, reverse, current_position) = (0, False, None)
+        else:
+            (offset, reverse, current_position) = self.cursor
+
+        if reverse:
+            queryset = queryset.order_by(*self._reversed_ordering())
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if current_position is not None:
+            queryset = self._seek(queryset, current_position, reverse)
+
+        # Fetch one extra row to learn whether another page follows
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = results[:self.page_size]
+
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+        else:
+            has_following_position = False
+            following_position = None
+
+        if reverse:
+            # Reverse pages were queried backwards; return them in display order
+            self.page = list(reversed(self.page))
+            self.has_next = (current_position is not None) or (offset > 0)
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = (current_position is not None) or (offset > 0)
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def _reversed_ordering(self):
+        return tuple(order[1:] if order.startswith('-') else f'-{order}' for order in self.ordering)
+
+    def _seek(self, queryset, position, reverse):
+        """Rows ordered strictly after `position` on every ordering field"""
+        try:
+            values = json.loads(position)
+            if not isinstance(values, list) or len(values) != len(self.ordering):
+                raise ValueError("Cursor does not match the ordering")
+
+            after = Q()
+            for i, order in enumerate(self.ordering):
+                field = order.lstrip('-')
+                lookup = 'lt' if order.startswith('-') != reverse else 'gt'
+                ties = {self.ordering[j].lstrip('-'): values[j] for j in range(i)}
+                after |= Q(**ties, **{f'{field}__{lookup}': values[i]})
+            return queryset.filter(after)
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for order in ordering:
+            field_name = order.lstrip('-')
+            if isinstance(instance, dict):
+                values.append(str(instance[field_name]))
+            else:
+                values.append(str(getattr(instance, field_name)))
+        return json.dumps(values)
+
+class TriggeredAtCursorPagination(CreatedAtCursorPagination):
+    """Keyset pagination on (triggered_at, id) for alert history"""
+    ordering = ('-triggered_at', '-id')
+
+class SymbolCursorPagination(CreatedAtCursorPagination):
+    """Keyset pagination on the unique stock symbol"""
+    ordering = ('symbol',)
@@ -33,7 +33,8 @@ INSTALLED_APPS = [
     'alerts.apps.AlertsConfig',
     'stocks.apps.StocksConfig',
     'notifications.apps.NotificationsConfig',
-    'scheduler.apps.SchedulerConfig'
+    'scheduler.apps.SchedulerConfig',
+    'realtime.apps.RealtimeConfig'
 ]
 
 MIDDLEWARE = [
@@ -64,6 +65,25 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'stockAlertSystem.wsgi.application'
+# Streaming endpoints (realtime events) need the ASGI application
+ASGI_APPLICATION = 'stockAlertSystem.asgi.application'
+
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Price quotes written through by the ingest pipeline. Use a shared backend
+    # (e.g. django.core.cache.backends.redis.RedisCache) when running more than one process.
+    'quotes': {
+        'BACKEND': config('QUOTE_CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('QUOTE_CACHE_LOCATION', default='quotes'),
+    },
+}
+QUOTE_CACHE_ALIAS = 'quotes'
+# Shared backends hold quotes until the next write; a per-process cache only
+# sees its own writes, so entries there expire quickly and are reloaded from the database
+QUOTE_CACHE_TIMEOUT = 5 if CACHES['quotes']['BACKEND'].endswith('LocMemCache') else None
 
 
 DATABASES = {
@@ -111,7 +131,11 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
-    )
+    ),
+    # Cursor pagination on every list endpoint; clients may lower or raise
+    # the page size with ?page_size= up to the paginator's max_page_size
+    'DEFAULT_PAGINATION_CLASS': 'stockAlertSystem.pagination.CreatedAtCursorPagination',
+    'PAGE_SIZE': 50,
 }
 
 SIMPLE_JWT = {
@@ -135,7 +159,42 @@ APSCHEDULER_JOB_DEFAULTS = {
 # STOCK ALERT SYSTEM SETTINGS
 STOCK_UPDATE_INTERVAL = 2  # minutes
 ALERT_CHECK_INTERVAL = 4   # minutes
-MARKET_HOURS_UPDATE_INTERVAL = 3  # minutes during market hours
+MARKET_HOURS_UPDATE_INTERVAL = 1  # minutes between price update runs during market sessions
+
+# Adaptive price refresh (stocks/refresh.py): minutes between refreshes per tier.
+# Stocks near a live alert target or moving fast are hot; stocks without alerts are idle.
+# During market sessions the updater runs every MARKET_HOURS_UPDATE_INTERVAL minutes and
+# spends at most PRICE_REFRESH_BUDGET API calls per run.
+PRICE_REFRESH_INTERVALS = {
+    'hot': 1,
+    'warm': 3,
+    'cool': 10,
+    'idle': 30,
+}
+PRICE_REFRESH_BUDGET = 50
+
+# Streaming indicators kept for every stock (stocks/indicators.py), fed by each
+# recorded price: rolling min/max/mean/stddev windows in minutes and EMA periods
+# in ticks.
+INDICATOR_STATS_WINDOWS = [15, 60]
+INDICATOR_EMA_PERIODS = [12, 26]
+# Readers catch the indicator engine up with other processes' ticks at most this often (seconds)
+INDICATOR_SYNC_INTERVAL = 10
+
+# In-memory evaluation state (alert index, duration timers, indicators) is
+# snapshotted every EVALUATION_SNAPSHOT_INTERVAL minutes and on shutdown, so a
+# restart loads it and replays only the database changes made since.
+EVALUATION_SNAPSHOT_PATH = config('EVALUATION_SNAPSHOT_PATH', default=str(BASE_DIR / 'var' / 'evaluation_snapshot.bin'))
+EVALUATION_SNAPSHOT_INTERVAL = 5
+
+# Price history retention. Raw ticks are only kept briefly; long ranges are
+# served from the OHLC rollup tables (None keeps an interval forever)
+RAW_PRICE_RETENTION_DAYS = 7
+ROLLUP_RETENTION_DAYS = {
+    '1m': 30,
+    '1h': 365,
+    '1d': None,
+}
 
 # Email Configuration
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
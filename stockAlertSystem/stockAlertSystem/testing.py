@@ -0,0 +1,34 @@
+from django.contrib.auth.models import User
+from django.db import connection
+
+
+class IndexUsageTestMixin:
+    """
+    Shared setup for EXPLAIN checks that hot queries are served by their indexes.
+    Mix in before TestCase and call super().setUp() before creating test rows.
+    """
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        
+        # Tiny test tables make Postgres prefer sequential scans; ask for index plans
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = off')
+    
+    def paginated(self, queryset, pagination_class, after=None):
+        """The query pagination_class runs for the page after instance `after` (or the first page)"""
+        paginator = pagination_class()
+        queryset = queryset.order_by(*paginator.ordering)
+        if after is not None:
+            position = paginator._get_position_from_instance(after, paginator.ordering)
+            queryset = paginator._seek(queryset, position, reverse=False)
+        return queryset[:paginator.page_size + 1]
+    
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan, f"Expected {index_name} in plan:\n{plan}")
@@ -14,4 +14,5 @@ urlpatterns = [
     path('api/alerts/', include('alerts.urls', namespace='alerts')),
     path('api/scheduler/', include('scheduler.urls', namespace='scheduler')),
     path('api/notifications/', include('notifications.urls', namespace='notifications')),
+    path('api/realtime/', include('realtime.urls', namespace='realtime')),
 ]
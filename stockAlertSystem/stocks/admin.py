@@ -1,12 +1,12 @@
 from django.contrib import admin
-from .models import Stock, StockPrice
+from .models import Stock, StockPrice, StockPriceRollup, RollupWatermark
 
 @admin.register(Stock)
 class StockAdmin(admin.ModelAdmin):
     list_display = ['symbol', 'name', 'price', 'currency', 'exchange', 'is_active', 'last_updated']
     list_filter = ['currency', 'exchange', 'is_active', 'last_updated']
     search_fields = ['symbol', 'name']
-    readonly_fields = ['last_updated', 'created_at']
+    readonly_fields = ['last_updated', 'price_changed_at', 'created_at']
     list_editable = ['is_active']
     
     fieldsets = (
@@ -29,3 +29,15 @@ class StockPriceAdmin(admin.ModelAdmin):
     search_fields = ['stock__symbol', 'stock__name']
     readonly_fields = ['timestamp']
     date_hierarchy = 'timestamp'
+
+@admin.register(StockPriceRollup)
+class StockPriceRollupAdmin(admin.ModelAdmin):
+    list_display = ['stock', 'interval', 'bucket_start', 'open', 'high', 'low', 'close', 'tick_count']
+    list_filter = ['interval', 'stock']
+    search_fields = ['stock__symbol']
+    date_hierarchy = 'bucket_start'
+
+@admin.register(RollupWatermark)
+class RollupWatermarkAdmin(admin.ModelAdmin):
+    list_display = ['name', 'compacted_until', 'updated_at']
+    readonly_fields = ['updated_at']
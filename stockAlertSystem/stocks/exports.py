@@ -0,0 +1,89 @@
+import csv
+import json
+from datetime import datetime, time
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+# Rows fetched per database round trip while streaming an export
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+class Echo:
+    """Pseudo-buffer that hands each written line straight back to the caller"""
+    def write(self, value):
+        return value
+
+
+def parse_time_bound(value, end_of_day=False):
+    """
+    Parse an ISO datetime or date query parameter into an aware datetime.
+    Bare dates cover the whole day, so an end bound of 2024-01-31 includes that day.
+    """
+    if not value:
+        return None
+
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"Invalid date or datetime: {value}")
+        parsed = datetime.combine(day, time.max if end_of_day else time.min)
+
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, timezone.get_current_timezone())
+    return parsed
+
+
+def parse_time_range(params):
+    """Read the optional 'start'/'end' query parameters"""
+    start = parse_time_bound(params.get('start'))
+    end = parse_time_bound(params.get('end'), end_of_day=True)
+
+    if start and end and start > end:
+        raise ValueError("start must be before end")
+    return start, end
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def stream_csv(header, rows):
+    """Yield a CSV document one line at a time"""
+    writer = csv.writer(Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow([_csv_value(value) for value in row])
+
+
+def stream_ndjson(header, rows):
+    """Yield one JSON object per line, keeping decimals exact"""
+    for row in rows:
+        yield json.dumps(dict(zip(header, row)), cls=DjangoJSONEncoder) + '\n'
+
+
+def streaming_export_response(rows, header, output, filename):
+    """
+    Build a StreamingHttpResponse for the given rows iterator.
+    Rows are consumed lazily so memory stays flat regardless of export size.
+    """
+    if output == 'csv':
+        content = stream_csv(header, rows)
+    else:
+        content = stream_ndjson(header, rows)
+
+    response = StreamingHttpResponse(content, content_type=EXPORT_FORMATS[output])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{output}"'
+    return response
@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+# Prices are stored with two decimal places, so whole cents represent them exactly
+CENTS_PER_UNIT = 100
+CENT = Decimal('0.01')
+
+def to_cents(value):
+    """Integer cents for a Decimal, str, int or float price; None stays None"""
+    if value is None:
+        return None
+    if isinstance(value, int):
+        return value * CENTS_PER_UNIT
+    if not isinstance(value, Decimal):
+        value = Decimal(str(value))
+    return int(value.quantize(CENT, rounding=ROUND_HALF_UP).scaleb(2))
+
+def from_cents(cents):
+    """Decimal price for integer cents, for the API and model edge"""
+    if cents is None:
+        return None
+    return Decimal(cents).scaleb(-2).quantize(CENT)
+
+def parse_cents(text):
+    """
+    Integer cents from a decimal string such as "150.25000" (half-up), without
+    the float round trip. Raises ValueError for anything that is not a number.
+    """
+    text = str(text).strip()
+    negative = text.startswith('-')
+    whole, _, fraction = text.lstrip('+-').partition('.')
+    if not (whole or fraction) or (whole and not whole.isdigit()) or (fraction and not fraction.isdigit()):
+        # Exponents and other spellings Decimal accepts
+        try:
+            return to_cents(Decimal(text))
+        except InvalidOperation:
+            raise ValueError(f"Invalid price: {text!r}")
+
+    fraction = (fraction + '000')[:3]
+    cents = int(whole or 0) * CENTS_PER_UNIT + int(fraction[:2]) + (fraction[2] >= '5')
+    return -cents if negative else cents
+
+# Timestamps are stored as integer microseconds since the epoch in snapshots
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+def to_micros(value):
+    """Integer microseconds since the epoch for an aware datetime; None stays None"""
+    return None if value is None else (value - EPOCH) // MICROSECOND
+
+def from_micros(value):
+    return None if value is None else EPOCH + value * MICROSECOND
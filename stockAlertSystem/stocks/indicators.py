@@ -0,0 +1,537 @@
+import logging
+import math
+import threading
+from array import array
+from collections import deque
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .fixedpoint import to_cents, to_micros, from_micros
+
+logger = logging.getLogger(__name__)
+
+# Ticks recorded by other processes are replayed from StockPrice; re-read this
+# much before the last sync so late commits are not missed
+SYNC_OVERLAP = timedelta(seconds=5)
+
+# Bump when indicator classes change shape; older snapshots are then ignored
+SNAPSHOT_VERSION = 2
+
+# Snapshot arrays and how each series encoding maps onto them: (value array, timestamped)
+SNAPSHOT_ARRAYS = (('times', 'q'), ('cents', 'q'), ('values', 'd'))
+SERIES_ENCODINGS = {
+    'timed_cents': ('cents', True),
+    'timed_values': ('values', True),
+    'cents': ('cents', False),
+}
+
+class ChangeWindow:
+    """
+    Price change over the last `minutes`: keeps the ticks inside the window plus
+    the newest one before it, which is the reference price. O(1) amortized per tick.
+    """
+    # Snapshot layout: scalar attributes, timestamp attributes and deque attributes
+    FIELDS = ()
+    TIME_FIELDS = ()
+    SERIES = {'ticks': 'timed_cents'}
+
+    def __init__(self, minutes):
+        self.span = timedelta(minutes=minutes)
+        self.ticks = deque()
+
+    def push(self, timestamp, cents):
+        self.ticks.append((timestamp, cents))
+        start = timestamp - self.span
+        while len(self.ticks) > 1 and self.ticks[1][0] <= start:
+            self.ticks.popleft()
+
+    def prices(self):
+        """(reference, latest) in cents, or None until the window has two ticks"""
+        if len(self.ticks) < 2:
+            return None
+        return self.ticks[0][1], self.ticks[-1][1]
+
+    def moved(self, direction, threshold_bp):
+        """
+        Whether the price rose ('above'), fell ('below') or moved either way
+        ('either') by at least threshold_bp basis points within the window
+        """
+        prices = self.prices()
+        if prices is None or not prices[0]:
+            return False
+        reference, latest = prices
+        if direction == 'above':
+            change = latest - reference
+        elif direction == 'below':
+            change = reference - latest
+        elif direction == 'either':
+            change = abs(latest - reference)
+        else:
+            return False
+        # Integer cross-multiplication keeps the comparison exact
+        return change * 10000 >= threshold_bp * reference
+
+    def change_percent(self):
+        prices = self.prices()
+        if prices is None or not prices[0]:
+            return None
+        return (prices[1] - prices[0]) * 100 / prices[0]
+
+class RollingStats:
+    """
+    Min, max, mean and variance of the values seen in the `minutes` up to the
+    newest one.
+    Min/max come from monotonic deques and mean/variance from Welford's
+    update run forwards on arrival and backwards on expiry, so each tick is
+    O(1) amortized.
+    """
+    FIELDS = ('count', 'mean', 'm2')
+    TIME_FIELDS = ()
+    SERIES = {'values': 'timed_values', 'mins': 'timed_values', 'maxes': 'timed_values'}
+
+    def __init__(self, minutes):
+        self.span = timedelta(minutes=minutes)
+        self.values = deque()
+        self.mins = deque()
+        self.maxes = deque()
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def push(self, timestamp, value):
+        self.values.append((timestamp, value))
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+        while self.mins and self.mins[-1][1] >= value:
+            self.mins.pop()
+        self.mins.append((timestamp, value))
+        while self.maxes and self.maxes[-1][1] <= value:
+            self.maxes.pop()
+        self.maxes.append((timestamp, value))
+
+        start = timestamp - self.span
+        while self.values[0][0] <= start:
+            _, old = self.values.popleft()
+            self.count -= 1
+            if not self.count:
+                self.mean = self.m2 = 0.0
+                continue
+            delta = old - self.mean
+            self.mean -= delta / self.count
+            self.m2 = max(self.m2 - delta * (old - self.mean), 0.0)
+        while self.mins[0][0] <= start:
+            self.mins.popleft()
+        while self.maxes[0][0] <= start:
+            self.maxes.popleft()
+
+    @property
+    def min(self):
+        return self.mins[0][1] if self.count else None
+
+    @property
+    def max(self):
+        return self.maxes[0][1] if self.count else None
+
+    @property
+    def variance(self):
+        """Population variance, as the volatility estimate has always used"""
+        return self.m2 / self.count if self.count else None
+
+    @property
+    def stddev(self):
+        variance = self.variance
+        return math.sqrt(variance) if variance is not None else None
+
+class ReturnStats(RollingStats):
+    """RollingStats over tick-to-tick returns instead of prices; stddev is volatility"""
+    FIELDS = RollingStats.FIELDS + ('last',)
+
+    def __init__(self, minutes):
+        super().__init__(minutes)
+        self.last = None
+
+    def push(self, timestamp, cents):
+        last, self.last = self.last, cents
+        if last:
+            super().push(timestamp, cents / last - 1)
+
+class MovingAverage:
+    """
+    Simple or exponential moving average over `period` ticks, in cents, plus the
+    times the price last crossed above and below it
+    """
+    FIELDS = ('total', 'value', 'count', 'side')
+    TIME_FIELDS = ('crossed_above_at', 'crossed_below_at')
+    SERIES = {'window': 'cents'}
+
+    def __init__(self, kind, period):
+        self.kind = kind
+        self.period = period
+        self.window = deque(maxlen=period)
+        self.total = 0
+        self.value = None
+        self.count = 0
+        self.side = 0
+        self.crossed_above_at = None
+        self.crossed_below_at = None
+
+    def push(self, timestamp, cents):
+        self.count += 1
+        if self.kind == 'sma':
+            if len(self.window) == self.period:
+                self.total -= self.window[0]
+            self.window.append(cents)
+            self.total += cents
+            if len(self.window) < self.period:
+                return
+            self.value = self.total / self.period
+            # Exact: compare price * period with the window total
+            scaled = cents * self.period
+            side = (scaled > self.total) - (scaled < self.total)
+        else:
+            alpha = 2 / (self.period + 1)
+            self.value = cents if self.value is None else self.value + alpha * (cents - self.value)
+            if self.count < self.period:
+                return
+            side = (cents > self.value) - (cents < self.value)
+
+        if side and side != self.side:
+            if self.side < 0:
+                self.crossed_above_at = timestamp
+            elif self.side > 0:
+                self.crossed_below_at = timestamp
+            self.side = side
+
+    def crossed_since(self, direction, since):
+        """Whether the price crossed in `direction` ('above'/'below') after `since`"""
+        crossed_at = self.crossed_above_at if direction == 'above' else self.crossed_below_at
+        return crossed_at is not None and (since is None or crossed_at > since)
+
+class StockIndicators:
+    """
+    Indicators registered for one stock; every tick updates each of them once.
+    Ticks must arrive in time order: push() ignores older ones and returns False,
+    and IndicatorEngine.sync() rebuilds the stock when such a tick turns up.
+    """
+    def __init__(self):
+        self.last_timestamp = None
+        self.indicators = {}
+        # Ticks stamped before this are assumed to be in the indicators already
+        self.tracked_since = timezone.now()
+
+    def push(self, timestamp, cents):
+        if self.last_timestamp is not None and timestamp <= self.last_timestamp:
+            return False
+        self.last_timestamp = timestamp
+        for indicator in self.indicators.values():
+            indicator.push(timestamp, cents)
+        return True
+
+class IndicatorEngine:
+    """
+    Per-stock incremental indicators shared by every consumer (alerts, refresh
+    planning, the API). Ticks are pushed at ingest; sync() replays ticks other
+    processes recorded, rebuilding a stock from history when one of them is older
+    than ticks already applied. A newly required indicator is seeded once from
+    StockPrice history, and the whole engine can be snapshotted for a warm restart.
+    """
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self.stocks = {}
+            self.synced_at = None
+            # StockPrice id -> timestamp of ticks applied inside the sync overlap
+            self.applied = {}
+
+    def push(self, stock_id, timestamp, cents, tick_id=None):
+        """Feed one recorded tick; stocks seen for the first time get the default indicators"""
+        with self._lock:
+            stock = self.stocks.get(stock_id)
+            if stock is not None:
+                if stock.push(timestamp, cents) and tick_id is not None:
+                    self.applied[tick_id] = timestamp
+                return
+        # Seeded from history, which already holds this tick
+        self.require_defaults(stock_id)
+
+    def require_defaults(self, stock_id):
+        for key in default_indicator_keys():
+            self.require(stock_id, key)
+
+    def summary(self, stock_id):
+        """
+        Current default indicator values for a stock, each read in O(1). Prices
+        are in cents; volatility is the stddev of tick-to-tick returns.
+        """
+        self.require_defaults(stock_id)
+        with self._lock:
+            indicators = self.stocks[stock_id].indicators
+            windows = {}
+            for minutes in settings.INDICATOR_STATS_WINDOWS:
+                stats = indicators[('stats', minutes)]
+                windows[f"{minutes}m"] = {
+                    'count': stats.count,
+                    'min': stats.min,
+                    'max': stats.max,
+                    'mean': stats.mean if stats.count else None,
+                    'stddev': stats.stddev,
+                }
+            volatility = {
+                f"{minutes}m": indicators[('returns', minutes)].stddev
+                for minutes in settings.INDICATOR_STATS_WINDOWS
+            }
+            emas = {
+                str(period): indicators[('ema', period)].value
+                for period in settings.INDICATOR_EMA_PERIODS
+            }
+            return {
+                'last_timestamp': self.stocks[stock_id].last_timestamp,
+                'windows': windows,
+                'volatility': volatility,
+                'ema': emas,
+            }
+
+    def require(self, stock_id, key):
+        """
+        Get the indicator for key ('change'|'stats'|'returns', minutes) or
+        ('sma'|'ema', period), creating and seeding it from history on first use.
+        The history is read outside the engine lock so ticks for other stocks are
+        not held up; if this stock took a tick meanwhile, the seed is read again.
+        """
+        while True:
+            with self._lock:
+                stock = self.stocks.get(stock_id)
+                if stock is not None and key in stock.indicators:
+                    return stock.indicators[key]
+                until = stock.last_timestamp if stock is not None else None
+
+            seeded_at = timezone.now()
+            history = self._history(stock_id, key, until)
+
+            with self._lock:
+                stock = self.stocks.get(stock_id)
+                if stock is not None and key in stock.indicators:
+                    return stock.indicators[key]
+                if (stock.last_timestamp if stock is not None else None) != until:
+                    continue
+
+                indicator = self._create(key)
+                for timestamp, cents in history:
+                    indicator.push(timestamp, cents)
+                if stock is None:
+                    stock = self.stocks[stock_id] = StockIndicators()
+                    stock.tracked_since = seeded_at
+                    stock.last_timestamp = history[-1][0] if history else None
+                stock.indicators[key] = indicator
+                if self.synced_at is None:
+                    self.synced_at = timezone.now()
+                return indicator
+
+    def _create(self, key):
+        kind, size = key
+        if kind == 'change':
+            return ChangeWindow(size)
+        if kind == 'stats':
+            return RollingStats(size)
+        if kind == 'returns':
+            return ReturnStats(size)
+        return MovingAverage(kind, size)
+
+    def _history(self, stock_id, key, until=None):
+        """Ticks needed to warm an indicator up, oldest first"""
+        from .models import StockPrice
+
+        kind, size = key
+        ticks = StockPrice.objects.filter(stock_id=stock_id)
+        if until is not None:
+            ticks = ticks.filter(timestamp__lte=until)
+        if kind in ('change', 'stats', 'returns'):
+            start = (until or timezone.now()) - timedelta(minutes=size)
+            rows = list(ticks.filter(timestamp__gt=start).order_by('timestamp').values_list('timestamp', 'price'))
+            if kind != 'stats':
+                # Plus the tick before the window: the change reference, or the
+                # base of the first return
+                rows = list(ticks.filter(timestamp__lte=start).values_list('timestamp', 'price')[:1]) + rows
+        else:
+            # A full window plus enough earlier ticks to know which side the price
+            # is on; EMAs also need a few periods to converge
+            limit = size * 2 if kind == 'sma' else size * 4
+            rows = list(ticks.values_list('timestamp', 'price')[:limit])[::-1]
+        return [(timestamp, to_cents(price)) for timestamp, price in rows]
+
+    def sync(self):
+        """
+        Replay ticks recorded since the last sync for stocks with indicators.
+        A tick older than the newest one already applied (its transaction committed
+        late) cannot be folded in incrementally, so that stock's indicators are
+        rebuilt from history instead. Returns the number of ticks taken in.
+        """
+        from .models import StockPrice
+
+        with self._lock:
+            if self.synced_at is None or not self.stocks:
+                return 0
+            started_at = timezone.now()
+            rows = StockPrice.objects.filter(
+                stock_id__in=list(self.stocks), timestamp__gte=self.synced_at - SYNC_OVERLAP
+            ).order_by('timestamp', 'id').values_list('id', 'stock_id', 'timestamp', 'price')
+            count = 0
+            rebuilt = set()
+            for tick_id, stock_id, timestamp, price in rows:
+                if tick_id in self.applied:
+                    continue
+                self.applied[tick_id] = timestamp
+                stock = self.stocks[stock_id]
+                if stock_id in rebuilt or timestamp < stock.tracked_since:
+                    continue
+                if not stock.push(timestamp, to_cents(price)):
+                    logger.info(f"Late tick for stock {stock_id} at {timestamp.isoformat()}; rebuilding its indicators")
+                    self._rebuild(stock_id)
+                    rebuilt.add(stock_id)
+                count += 1
+            self.synced_at = started_at
+            horizon = started_at - SYNC_OVERLAP
+            self.applied = {tick_id: timestamp for tick_id, timestamp in self.applied.items() if timestamp >= horizon}
+            return count
+
+    def sync_if_stale(self):
+        """
+        sync() unless the last one ran within INDICATOR_SYNC_INTERVAL seconds, so
+        per-request and per-chunk readers share one catch-up query
+        """
+        with self._lock:
+            max_age = timedelta(seconds=settings.INDICATOR_SYNC_INTERVAL)
+            if self.synced_at is not None and timezone.now() - self.synced_at < max_age:
+                return 0
+            return self.sync()
+
+    def _rebuild(self, stock_id):
+        """Re-seed every indicator of a stock from StockPrice history"""
+        keys = list(self.stocks.pop(stock_id).indicators)
+        for key in keys:
+            self.require(stock_id, key)
+
+    def snapshot(self):
+        """
+        Engine state for a fast warm start, as (meta, arrays): JSON-safe metadata
+        per indicator plus the deque contents packed into typed arrays
+        """
+        columns = {name: array(typecode) for name, typecode in SNAPSHOT_ARRAYS}
+        stocks = []
+        with self._lock:
+            for stock_id, stock in self.stocks.items():
+                indicators = []
+                for (kind, size), indicator in stock.indicators.items():
+                    fields = {name: getattr(indicator, name) for name in indicator.FIELDS}
+                    fields.update({name: to_micros(getattr(indicator, name)) for name in indicator.TIME_FIELDS})
+                    series = {}
+                    for name, encoding in indicator.SERIES.items():
+                        series[name] = pack_series(columns, encoding, getattr(indicator, name))
+                    indicators.append({'kind': kind, 'size': size, 'fields': fields, 'series': series})
+                stocks.append({
+                    'id': stock_id,
+                    'last_timestamp': to_micros(stock.last_timestamp),
+                    'indicators': indicators,
+                })
+            meta = {'version': SNAPSHOT_VERSION, 'synced_at': to_micros(self.synced_at), 'stocks': stocks}
+        return meta, list(columns.items())
+
+    def restore(self, meta, arrays):
+        """
+        Load state written by snapshot(); ticks recorded after it are replayed by
+        the next sync(). Returns False (leaving the engine empty) for snapshots
+        of another version and raises ValueError for malformed ones.
+        """
+        with self._lock:
+            self.clear()
+            if meta.get('version') != SNAPSHOT_VERSION:
+                return False
+            arrays = dict(arrays)
+            for name, typecode in SNAPSHOT_ARRAYS:
+                if name not in arrays or arrays[name].typecode != typecode:
+                    raise ValueError(f"Missing or mistyped indicator array {name}")
+
+            try:
+                stocks = {}
+                for item in meta['stocks']:
+                    stock = StockIndicators()
+                    stock.last_timestamp = from_micros(item['last_timestamp'])
+                    stock.tracked_since = from_micros(meta['synced_at']) or stock.tracked_since
+                    for entry in item['indicators']:
+                        key = (entry['kind'], entry['size'])
+                        if key[0] not in INDICATOR_KINDS or not isinstance(key[1], int) or key[1] <= 0:
+                            raise ValueError(f"Unknown indicator {key}")
+                        indicator = self._create(key)
+                        for name in indicator.FIELDS:
+                            value = entry['fields'][name]
+                            if value is not None and not isinstance(value, (int, float)):
+                                raise ValueError(f"Bad {entry['kind']} field {name}")
+                            setattr(indicator, name, value)
+                        for name in indicator.TIME_FIELDS:
+                            setattr(indicator, name, from_micros(entry['fields'][name]))
+                        for name, encoding in indicator.SERIES.items():
+                            current = getattr(indicator, name)
+                            values = unpack_series(arrays, encoding, entry['series'][name])
+                            setattr(indicator, name, deque(values, maxlen=current.maxlen))
+                        stock.indicators[key] = indicator
+                    stocks[int(item['id'])] = stock
+            except (KeyError, TypeError) as e:
+                raise ValueError(f"Malformed indicator snapshot: {e}")
+
+            self.stocks = stocks
+            self.synced_at = from_micros(meta['synced_at'])
+            return True
+
+INDICATOR_KINDS = ('change', 'stats', 'returns', 'sma', 'ema')
+
+def pack_series(columns, encoding, items):
+    """Append a deque to the snapshot arrays; returns its (time_start, value_start, length)"""
+    value_name, timed = SERIES_ENCODINGS[encoding]
+    times, values = columns['times'], columns[value_name]
+    time_start, value_start = len(times), len(values)
+    for item in items:
+        if timed:
+            timestamp, item = item
+            times.append(to_micros(timestamp))
+        values.append(item)
+    return [time_start if timed else None, value_start, len(values) - value_start]
+
+def unpack_series(arrays, encoding, location):
+    value_name, timed = SERIES_ENCODINGS[encoding]
+    time_start, value_start, length = location
+    starts = (value_start, time_start) if timed else (value_start,)
+    if min(starts + (length,)) < 0:
+        raise ValueError("Indicator series out of range")
+    values = arrays[value_name][value_start:value_start + length]
+    times = arrays['times'][time_start:time_start + length] if timed else None
+    if len(values) != length or (timed and len(times) != length):
+        raise ValueError("Indicator series out of range")
+    return zip(map(from_micros, times), values) if timed else values
+
+def default_indicator_keys():
+    """Indicators kept for every stock that receives ticks"""
+    keys = []
+    for minutes in settings.INDICATOR_STATS_WINDOWS:
+        keys += [('stats', minutes), ('returns', minutes)]
+    return keys + [('ema', period) for period in settings.INDICATOR_EMA_PERIODS]
+
+# Global indicator engine instance
+indicator_engine_instance = None
+indicator_engine_lock = threading.Lock()
+
+def get_indicator_engine():
+    """Get or create the global per-stock indicator engine"""
+    global indicator_engine_instance
+    if indicator_engine_instance is None:
+        with indicator_engine_lock:
+            if indicator_engine_instance is None:
+                indicator_engine_instance = IndicatorEngine()
+    return indicator_engine_instance
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from stocks.services import compact_price_rollups, ROLLUP_BATCH_SIZE
+
+class Command(BaseCommand):
+    help = 'Fold stock price ticks newer than the rollup watermark into the OHLC rollup tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=ROLLUP_BATCH_SIZE,
+            help='Number of ticks folded per transaction',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Compacting price rollups...')
+        processed = compact_price_rollups(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Compacted {processed} price ticks'))
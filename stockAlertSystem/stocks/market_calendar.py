@@ -0,0 +1,148 @@
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+from django.utils import timezone
+
+def easter_sunday(year):
+    """Gregorian Easter date (anonymous Gregorian algorithm)"""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+def nth_weekday(year, month, weekday, n):
+    """n-th given weekday (Monday=0) of a month; n=-1 is the last one"""
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = date(year, month + 1, 1) - timedelta(days=1) if month < 12 else date(year, 12, 31)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+def observed(day, saturday_to_friday=True):
+    """NYSE observance: Sunday holidays move to Monday, Saturday ones to Friday"""
+    if day.weekday() == 6:
+        return day + timedelta(days=1)
+    if day.weekday() == 5:
+        return day - timedelta(days=1) if saturday_to_friday else None
+    return day
+
+def us_equity_holidays(year):
+    """Full-day NYSE/NASDAQ closures for a year"""
+    holidays = {
+        # A Saturday New Year's Day is not observed on the previous Friday
+        observed(date(year, 1, 1), saturday_to_friday=False): "New Year's Day",
+        nth_weekday(year, 1, 0, 3): "Martin Luther King Jr. Day",
+        nth_weekday(year, 2, 0, 3): "Presidents' Day",
+        easter_sunday(year) - timedelta(days=2): "Good Friday",
+        nth_weekday(year, 5, 0, -1): "Memorial Day",
+        observed(date(year, 7, 4)): "Independence Day",
+        nth_weekday(year, 9, 0, 1): "Labor Day",
+        nth_weekday(year, 11, 3, 4): "Thanksgiving Day",
+        observed(date(year, 12, 25)): "Christmas Day",
+    }
+    if year >= 2022:
+        holidays[observed(date(year, 6, 19))] = "Juneteenth"
+    holidays.pop(None, None)
+    return holidays
+
+def us_equity_early_closes(year):
+    """Half-day sessions closing at 13:00 local time"""
+    holidays = us_equity_holidays(year)
+    candidates = [
+        date(year, 7, 3),
+        nth_weekday(year, 11, 3, 4) + timedelta(days=1),  # day after Thanksgiving
+        date(year, 12, 24),
+    ]
+    return {day for day in candidates if day.weekday() < 5 and day not in holidays}
+
+class MarketCalendar:
+    """
+    Trading sessions for a group of exchanges: regular hours, holidays and half-days,
+    all in the exchange's local time
+    """
+    def __init__(self, name, tz, open_time, close_time, early_close_time, exchanges,
+                 holidays_for_year, early_closes_for_year):
+        self.name = name
+        self.timezone = ZoneInfo(tz)
+        self.open_time = open_time
+        self.close_time = close_time
+        self.early_close_time = early_close_time
+        self.exchanges = frozenset(exchanges)
+        self.holidays_for_year = lru_cache(maxsize=None)(holidays_for_year)
+        self.early_closes_for_year = lru_cache(maxsize=None)(early_closes_for_year)
+
+    def is_trading_day(self, day):
+        return day.weekday() < 5 and day not in self.holidays_for_year(day.year)
+
+    def session(self, day):
+        """(open, close) aware datetimes for a local date, or None when closed"""
+        if not self.is_trading_day(day):
+            return None
+        close_time = self.early_close_time if day in self.early_closes_for_year(day.year) else self.close_time
+        return (
+            datetime.combine(day, self.open_time, tzinfo=self.timezone),
+            datetime.combine(day, close_time, tzinfo=self.timezone),
+        )
+
+    def local_date(self, at=None):
+        return (at or timezone.now()).astimezone(self.timezone).date()
+
+    def is_open(self, at=None):
+        at = at or timezone.now()
+        session = self.session(self.local_date(at))
+        return session is not None and session[0] <= at < session[1]
+
+    def last_close(self, at=None):
+        """Close of the most recent session that has ended by `at`"""
+        at = at or timezone.now()
+        day = self.local_date(at)
+        while True:
+            session = self.session(day)
+            if session is not None and session[1] <= at:
+                return session[1]
+            day -= timedelta(days=1)
+
+    def next_open(self, at=None):
+        """Open of the next session starting at or after `at`"""
+        at = at or timezone.now()
+        day = self.local_date(at)
+        while True:
+            session = self.session(day)
+            if session is not None and session[0] >= at:
+                return session[0]
+            day += timedelta(days=1)
+
+US_EQUITIES = MarketCalendar(
+    name='US',
+    tz='America/New_York',
+    open_time=time(9, 30),
+    close_time=time(16, 0),
+    early_close_time=time(13, 0),
+    exchanges=['NASDAQ', 'NYSE', 'AMEX', 'NYSEARCA', 'ARCA', 'BATS', 'CBOE'],
+    holidays_for_year=us_equity_holidays,
+    early_closes_for_year=us_equity_early_closes,
+)
+
+CALENDARS = {calendar.name: calendar for calendar in [US_EQUITIES]}
+
+# Stocks on exchanges no calendar lists follow the US session
+DEFAULT_CALENDAR = US_EQUITIES
+
+def get_calendars():
+    return list(CALENDARS.values())
+
+def get_calendar(exchange):
+    """Calendar governing a Stock.exchange value"""
+    exchange = (exchange or '').upper()
+    for calendar in CALENDARS.values():
+        if exchange in calendar.exchanges:
+            return calendar
+    return DEFAULT_CALENDAR
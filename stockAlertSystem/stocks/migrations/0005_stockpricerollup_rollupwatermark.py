@@ -0,0 +1,47 @@
+# Generated by Django 5.2.4 on 2026-10-19 04:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0004_alter_stock_price_alter_stockprice_price'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_price_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Rollup Watermark',
+                'verbose_name_plural': 'Rollup Watermarks',
+            },
+        ),
+        migrations.CreateModel(
+            name='StockPriceRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('interval', models.CharField(choices=[('1m', '1 Minute'), ('1h', '1 Hour'), ('1d', '1 Day')], max_length=3)),
+                ('bucket_start', models.DateTimeField()),
+                ('open', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('high', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('low', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('close', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('tick_count', models.IntegerField(default=0)),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_rollups', to='stocks.stock')),
+            ],
+            options={
+                'verbose_name': 'Stock Price Rollup',
+                'verbose_name_plural': 'Stock Price Rollups',
+                'ordering': ['-bucket_start'],
+                'constraints': [models.UniqueConstraint(fields=('stock', 'interval', 'bucket_start'), name='unique_stock_rollup_bucket')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-19 04:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0005_stockpricerollup_rollupwatermark'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stock',
+            name='price_changed_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.4 on 2026-10-19 05:38
+
+from django.db import migrations, models
+
+
+def forwards_watermarks(apps, schema_editor):
+    """Carry each id watermark over as the timestamp of the tick it pointed at"""
+    RollupWatermark = apps.get_model('stocks', 'RollupWatermark')
+    StockPrice = apps.get_model('stocks', 'StockPrice')
+    for watermark in RollupWatermark.objects.all():
+        watermark.compacted_until = StockPrice.objects.filter(
+            id__lte=watermark.last_price_id
+        ).order_by('-timestamp').values_list('timestamp', flat=True).first()
+        watermark.save(update_fields=['compacted_until'])
+
+
+def backwards_watermarks(apps, schema_editor):
+    RollupWatermark = apps.get_model('stocks', 'RollupWatermark')
+    StockPrice = apps.get_model('stocks', 'StockPrice')
+    for watermark in RollupWatermark.objects.all():
+        if watermark.compacted_until is None:
+            continue
+        watermark.last_price_id = StockPrice.objects.filter(
+            timestamp__lte=watermark.compacted_until
+        ).order_by('-id').values_list('id', flat=True).first() or 0
+        watermark.save(update_fields=['last_price_id'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0006_stock_price_changed_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rollupwatermark',
+            name='compacted_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(forwards_watermarks, backwards_watermarks),
+        migrations.RemoveField(
+            model_name='rollupwatermark',
+            name='last_price_id',
+        ),
+        migrations.AddIndex(
+            model_name='stockprice',
+            index=models.Index(fields=['timestamp', 'id'], name='stocks_stoc_timesta_6a5a9b_idx'),
+        ),
+    ]
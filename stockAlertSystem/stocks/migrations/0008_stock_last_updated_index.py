@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-19 06:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0007_rollupwatermark_compacted_until'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='stock',
+            name='last_updated',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
@@ -1,11 +1,17 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.utils import timezone
 
 class Stock(models.Model):
     symbol = models.CharField(max_length=10, unique=True)  # e.g. AAPL
     name = models.CharField(max_length=100, blank=True)    # optional company name
     price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
-    last_updated = models.DateTimeField(auto_now=True)
+    # Indexed for the price version (newest last_updated)
+    last_updated = models.DateTimeField(auto_now=True, db_index=True)
+    # Set only when a recorded price differs from the previous one; the alert
+    # checker uses it to skip stocks whose price has not moved
+    price_changed_at = models.DateTimeField(null=True, blank=True, db_index=True)
     
     # Additional fields for better stock information
     currency = models.CharField(max_length=3, default='USD')
@@ -13,6 +19,32 @@ class Stock(models.Model):
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(default=timezone.now)
 
+    # Price as last read from or written to the database, to detect changes on save
+    _stored_price = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._stored_price = instance.__dict__.get('price')
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        if fields is None or 'price' in fields:
+            self._stored_price = self.price
+
+    def save(self, *args, **kwargs):
+        # Every write path (ingest, admin, API) marks a price change the same way
+        update_fields = kwargs.get('update_fields')
+        writes_price = update_fields is None or 'price' in update_fields
+        if writes_price and self.price != self._stored_price:
+            self.price_changed_at = timezone.now()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'price_changed_at'}
+        super().save(*args, **kwargs)
+        if writes_price:
+            self._stored_price = self.price
+
     def __str__(self):
         if self.price is not None:
             return f"{self.symbol} - ${self.price}"
@@ -24,6 +56,23 @@ class Stock(models.Model):
         verbose_name = "Stock"
         verbose_name_plural = "Stocks"
 
+# Any stock write (price updates, admin edits) is written through to the quote cache.
+# The old quote is dropped at once and the new one written when the write commits,
+# so readers never see a price that may still be rolled back. Cached stock payloads
+# are keyed by the price version, which moves with last_updated (see get_price_version).
+@receiver(post_save, sender=Stock)
+def write_quote_on_save(sender, instance, **kwargs):
+    from .quotes import write_quote, evict_quote
+    evict_quote(instance.symbol)
+    fields = (instance.symbol, instance.price, instance.last_updated)
+    transaction.on_commit(lambda: write_quote(*fields))
+
+@receiver(post_delete, sender=Stock)
+def evict_quote_on_delete(sender, instance, **kwargs):
+    from .quotes import evict_quote
+    symbol = instance.symbol
+    transaction.on_commit(lambda: evict_quote(symbol))
+
 class StockPrice(models.Model):
     """Historical stock price data for duration alerts"""
     stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='price_history')
@@ -37,7 +86,51 @@ class StockPrice(models.Model):
         # Index for efficient querying
         indexes = [
             models.Index(fields=['stock', '-timestamp']),
+            # Rollup compaction walks ticks in time order across all stocks
+            models.Index(fields=['timestamp', 'id']),
         ]
     
     def __str__(self):
         return f"{self.stock.symbol} - ${self.price} at {self.timestamp.strftime('%Y-%m-%d %H:%M')}"
+
+class StockPriceRollup(models.Model):
+    """OHLC rollup of StockPrice ticks per stock and interval, built incrementally by compaction"""
+    INTERVALS = [
+        ('1m', '1 Minute'),
+        ('1h', '1 Hour'),
+        ('1d', '1 Day'),
+    ]
+    
+    stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='price_rollups')
+    interval = models.CharField(max_length=3, choices=INTERVALS)
+    bucket_start = models.DateTimeField()
+    open = models.DecimalField(max_digits=10, decimal_places=2)
+    high = models.DecimalField(max_digits=10, decimal_places=2)
+    low = models.DecimalField(max_digits=10, decimal_places=2)
+    close = models.DecimalField(max_digits=10, decimal_places=2)
+    tick_count = models.IntegerField(default=0)
+    
+    class Meta:
+        ordering = ['-bucket_start']
+        verbose_name = "Stock Price Rollup"
+        verbose_name_plural = "Stock Price Rollups"
+        # Also serves range scans by (stock, interval, bucket_start)
+        constraints = [
+            models.UniqueConstraint(fields=['stock', 'interval', 'bucket_start'], name='unique_stock_rollup_bucket'),
+        ]
+    
+    def __str__(self):
+        return f"{self.stock.symbol} {self.interval} {self.bucket_start.strftime('%Y-%m-%d %H:%M')}"
+
+class RollupWatermark(models.Model):
+    """Timestamp of the newest StockPrice tick already folded into the rollup tables"""
+    name = models.CharField(max_length=50, unique=True)
+    compacted_until = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = "Rollup Watermark"
+        verbose_name_plural = "Rollup Watermarks"
+    
+    def __str__(self):
+        return f"{self.name} @ {self.compacted_until}"
@@ -0,0 +1,94 @@
+import logging
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .fixedpoint import to_cents
+
+logger = logging.getLogger(__name__)
+
+# Quotes are written through on every stock save and never expire on their own;
+# each entry carries the version (last_updated) of the write that produced it, and
+# the price both as a Decimal (API edge) and integer cents (evaluation loops).
+# Bump the prefix whenever the entry layout changes.
+QUOTE_KEY_PREFIX = 'quote:v2'
+
+def get_quote_cache():
+    """The cache backend holding quotes; point it at a shared backend in production"""
+    return caches[settings.QUOTE_CACHE_ALIAS]
+
+def quote_key(symbol):
+    return f"{QUOTE_KEY_PREFIX}:{symbol}"
+
+def version_from_datetime(value):
+    return int(value.timestamp() * 1_000_000) if value else 0
+
+def build_quote(symbol, price, updated_at):
+    return {
+        'symbol': symbol,
+        'price': price,
+        'price_cents': to_cents(price),
+        'updated_at': updated_at,
+        'version': version_from_datetime(updated_at),
+    }
+
+def write_quote(symbol, price, updated_at):
+    """Write-through of a committed stock save (the ingest path and any other write)"""
+    quote = build_quote(symbol, price, updated_at)
+    get_quote_cache().set(quote_key(symbol), quote, settings.QUOTE_CACHE_TIMEOUT)
+    return quote
+
+def evict_quote(symbol):
+    """Drop a cached quote; readers reload it"""
+    get_quote_cache().delete(quote_key(symbol))
+
+def get_quotes(symbols):
+    """
+    Multi-get quotes for many symbols in one cache round trip.
+    Misses are loaded with a single query and written back unless a write-through
+    got there first. Unknown symbols are omitted.
+    """
+    from .models import Stock
+
+    symbols = set(symbols)
+    if not symbols:
+        return {}
+
+    quote_cache = get_quote_cache()
+    cached = quote_cache.get_many([quote_key(symbol) for symbol in symbols])
+    quotes = {quote['symbol']: quote for quote in cached.values()}
+
+    missing = symbols - set(quotes)
+    if missing:
+        loaded = {
+            symbol: build_quote(symbol, price, updated_at)
+            for symbol, price, updated_at in Stock.objects.filter(
+                symbol__in=missing
+            ).values_list('symbol', 'price', 'last_updated')
+        }
+        if loaded:
+            # add, not set: a write-through landing after our read is newer and must win
+            for symbol, quote in loaded.items():
+                quote_cache.add(quote_key(symbol), quote, settings.QUOTE_CACHE_TIMEOUT)
+            logger.debug(f"Loaded {len(loaded)} quotes from the database")
+        quotes.update(loaded)
+
+    return quotes
+
+def get_quote(symbol):
+    """Quote for one symbol, or None if the stock does not exist"""
+    return get_quotes([symbol]).get(symbol)
+
+def get_price_version():
+    """
+    Current price version as (newest last_updated, stock count), used for ETags,
+    Last-Modified and to key cached stock payloads. It is read from the database
+    (an index lookup plus a count of the small stock table) rather than kept in
+    the cache, so concurrent writers cannot move it backwards and it only ever
+    reflects committed writes; deleting a stock changes the count.
+    """
+    from django.db.models import Count, Max
+    from .models import Stock
+
+    version = Stock.objects.aggregate(latest=Max('last_updated'), count=Count('id'))
+    return version['latest'], version['count']
@@ -0,0 +1,205 @@
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Refresh tiers, most urgent first. Intervals (minutes) come from settings.PRICE_REFRESH_INTERVALS.
+REFRESH_TIERS = ('hot', 'warm', 'cool', 'idle')
+
+# Recent ticks used to estimate volatility (stddev of tick-to-tick returns)
+VOLATILITY_WINDOW = timedelta(hours=1)
+HIGH_VOLATILITY = 0.005  # 0.5% per tick
+VOLATILITY_FLOOR = 0.001  # keeps the distance score finite for flat prices
+
+# Distance to the nearest trigger, as a fraction of the price and in recent volatilities
+HOT_PROXIMITY = 0.005
+WARM_PROXIMITY = 0.02
+HOT_DISTANCE = 3
+WARM_DISTANCE = 10
+
+def get_trigger_distances():
+    """
+    Relative distance from each stock's price to its nearest live alert target,
+    keyed by stock id. Stocks without alerts that can still fire are omitted.
+    Targets come from the resident alert index rather than an alert query.
+    """
+    from alerts.index import get_alert_index
+    from .fixedpoint import to_cents
+    from .models import Stock
+
+    index = get_alert_index()
+    index.sync()
+    prices = {
+        stock_id: to_cents(price)
+        for stock_id, price in Stock.objects.values_list('id', 'price')
+    }
+    return index.trigger_distances(prices)
+
+def get_volatilities(stock_ids):
+    """
+    Standard deviation of tick-to-tick returns over VOLATILITY_WINDOW per stock id,
+    read from the shared indicator engine instead of a StockPrice scan
+    """
+    from .indicators import get_indicator_engine
+
+    engine = get_indicator_engine()
+    engine.sync_if_stale()
+    key = ('returns', int(VOLATILITY_WINDOW.total_seconds() // 60))
+    volatilities = {}
+    for stock_id in stock_ids:
+        stddev = engine.require(stock_id, key).stddev
+        if stddev is not None:
+            volatilities[stock_id] = stddev
+    return volatilities
+
+def refresh_tier(distance, volatility):
+    """
+    Pick a refresh tier from the distance to the nearest trigger (None when the
+    stock has no live alerts) and its recent volatility
+    """
+    if distance is not None:
+        sigmas = distance / max(volatility, VOLATILITY_FLOOR)
+        if distance <= HOT_PROXIMITY or sigmas <= HOT_DISTANCE:
+            return 'hot'
+        if distance <= WARM_PROXIMITY or sigmas <= WARM_DISTANCE or volatility >= HIGH_VOLATILITY:
+            return 'warm'
+        return 'cool'
+    return 'cool' if volatility >= HIGH_VOLATILITY else 'idle'
+
+def get_calendar_stocks(calendar=None):
+    """Active stocks, optionally limited to those trading on the given calendar"""
+    from .models import Stock
+    from .market_calendar import get_calendar
+
+    stocks = Stock.objects.filter(is_active=True)
+    if calendar is None:
+        return list(stocks)
+    return [stock for stock in stocks if get_calendar(stock.exchange) is calendar]
+
+def plan_refresh(now=None, calendar=None):
+    """
+    Rank active stocks that are due for a refresh: most urgent tier first, then
+    the stalest. Stocks without a price yet are always due.
+    """
+    now = now or timezone.now()
+    # A stock refreshed by one updater run is slightly less than a run period old
+    # at the next; without this slack every tier would refresh one run late
+    slack = timedelta(minutes=settings.MARKET_HOURS_UPDATE_INTERVAL)
+    distances = get_trigger_distances()
+    stocks = get_calendar_stocks(calendar)
+    volatilities = get_volatilities([stock.id for stock in stocks])
+
+    plan = []
+    for stock in stocks:
+        volatility = volatilities.get(stock.id, 0.0)
+        tier = refresh_tier(distances.get(stock.id), volatility)
+        if stock.price is None:
+            tier = 'hot'
+
+        interval = timedelta(minutes=settings.PRICE_REFRESH_INTERVALS[tier])
+        age = now - stock.last_updated
+        if stock.price is not None and age < interval - slack:
+            continue
+
+        plan.append({
+            'stock': stock,
+            'tier': tier,
+            'distance': distances.get(stock.id),
+            'volatility': volatility,
+            'age': age,
+        })
+
+    plan.sort(key=lambda item: (REFRESH_TIERS.index(item['tier']), -item['age']))
+    return plan
+
+def refresh_stocks(items):
+    """Fetch and record prices for plan items; returns (updated, failed, per-tier counts)"""
+    from .services import fetch_stock_price, record_stock_price, compact_price_rollups
+
+    updated_count = 0
+    failed_count = 0
+    tiers = defaultdict(int)
+
+    for item in items:
+        stock = item['stock']
+        try:
+            new_price = fetch_stock_price(stock.symbol)
+            if new_price:
+                old_price = record_stock_price(stock, new_price)
+                updated_count += 1
+                tiers[item['tier']] += 1
+                logger.info(f"Updated {stock.symbol} ({item['tier']}): ${old_price} -> ${new_price}")
+            else:
+                failed_count += 1
+                logger.warning(f"Failed to get price data for {stock.symbol}")
+        except Exception as e:
+            failed_count += 1
+            logger.error(f"Error updating {stock.symbol}: {e}")
+
+    if updated_count:
+        compact_price_rollups()
+
+    return updated_count, failed_count, dict(tiers)
+
+def update_prioritized_stock_prices(budget=None, calendar=None):
+    """
+    Refresh the most urgent due stocks, spending at most `budget` API calls.
+    Used by the APScheduler in place of refreshing every stock equally.
+    """
+    try:
+        budget = settings.PRICE_REFRESH_BUDGET if budget is None else budget
+        plan = plan_refresh(calendar=calendar)
+        selected = plan[:budget]
+
+        updated_count, failed_count, tiers = refresh_stocks(selected)
+
+        result = {
+            'updated_count': updated_count,
+            'failed_count': failed_count,
+            'due_count': len(plan),
+            'deferred_count': len(plan) - len(selected),
+            'tiers': tiers,
+            'timestamp': timezone.now().isoformat()
+        }
+
+        logger.info(f"Prioritized price update completed: {result}")
+        return result
+
+    except Exception as e:
+        logger.error(f"Error in update_prioritized_stock_prices: {e}")
+        return None
+
+def update_closing_prices(calendar, now=None):
+    """
+    Refresh every stock on the calendar not yet updated since the last session
+    closed, so off-hours reads see the closing price. Used once after each close.
+    """
+    try:
+        now = now or timezone.now()
+        closed_at = calendar.last_close(now)
+        items = [
+            {'stock': stock, 'tier': 'close'}
+            for stock in get_calendar_stocks(calendar)
+            if stock.price is None or stock.last_updated < closed_at
+        ]
+
+        updated_count, failed_count, _ = refresh_stocks(items)
+
+        result = {
+            'calendar': calendar.name,
+            'closed_at': closed_at.isoformat(),
+            'updated_count': updated_count,
+            'failed_count': failed_count,
+            'timestamp': timezone.now().isoformat()
+        }
+
+        logger.info(f"Closing price update completed: {result}")
+        return result
+
+    except Exception as e:
+        logger.error(f"Error in update_closing_prices: {e}")
+        return None
@@ -8,17 +8,26 @@ class StockPriceSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'timestamp']
 
 class StockSerializer(serializers.ModelSerializer):
-    price_history = StockPriceSerializer(many=True, read_only=True)
+    """Current quote only; price history is served by the bounded history endpoint"""
     current_price = serializers.DecimalField(source='price', max_digits=10, decimal_places=2, read_only=True)
     
     class Meta:
         model = Stock
         fields = [
             'id', 'symbol', 'name', 'current_price', 'last_updated', 'currency', 
-            'exchange', 'is_active', 'created_at', 'price_history'
+            'exchange', 'is_active', 'created_at'
         ]
         read_only_fields = ['id', 'current_price', 'last_updated', 'created_at']
 
+class PriceBucketSerializer(serializers.Serializer):
+    """One OHLC bucket of downsampled price history"""
+    timestamp = serializers.DateTimeField()
+    open = serializers.DecimalField(max_digits=10, decimal_places=2)
+    high = serializers.DecimalField(max_digits=10, decimal_places=2)
+    low = serializers.DecimalField(max_digits=10, decimal_places=2)
+    close = serializers.DecimalField(max_digits=10, decimal_places=2)
+    count = serializers.IntegerField()
+
 class StockCreateSerializer(serializers.ModelSerializer):
     """Simplified serializer for creating stocks"""
     class Meta:
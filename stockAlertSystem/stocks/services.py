@@ -1,12 +1,22 @@
+import asyncio
+import heapq
+import httpx
 import requests
 import time
 import logging
+import weakref
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.core.cache import cache
-from decimal import Decimal
 import random
+import threading
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from django.utils import timezone
-from datetime import timedelta
+from datetime import datetime, timedelta, timezone as dt_timezone
+from .quotes import get_quote, get_quote_cache
+from .fixedpoint import parse_cents, from_cents, to_cents
+from .indicators import get_indicator_engine
 
 logger = logging.getLogger(__name__)
 
@@ -25,6 +35,92 @@ def check_rate_limit():
     cache.set(RATE_LIMIT_KEY, current_calls + 1, RATE_LIMIT_WINDOW)
     return True
 
+TWELVE_DATA_PRICE_URL = "https://api.twelvedata.com/price"
+MAX_PRICE_CENTS = 100_000_000  # $1,000,000: anything above is treated as a bad payload
+API_TIMEOUT = 8  # seconds
+
+# Connection pooling: one keep-alive pool shared by every thread, so repeated
+# fetches reuse the TLS connection instead of handshaking per symbol
+HTTP_POOL_MAXSIZE = 10
+HTTP_RETRY_TOTAL = 3
+HTTP_RETRY_BACKOFF = 0.5  # seconds, doubled per attempt
+HTTP_RETRY_JITTER = 0.5  # seconds of random jitter added to each backoff
+HTTP_RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+class RequestPacer:
+    """
+    Spaces API calls evenly so bursts never exceed the provider's rate limit.
+    Callers reserve the next free slot and wait until it arrives; thread-safe.
+    """
+    def __init__(self, calls, period):
+        self.interval = period / calls
+        self.next_slot = 0.0
+        self.lock = threading.Lock()
+    
+    def reserve(self):
+        """Claim the next slot and return how many seconds to wait for it"""
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+            return slot - now
+    
+    def wait(self):
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+api_pacer = RequestPacer(RATE_LIMIT_MAX, RATE_LIMIT_WINDOW)
+
+# Global session instance
+http_session = None
+http_session_lock = threading.Lock()
+
+def get_http_session():
+    """Get or create the pooled HTTP session used for Twelve Data calls"""
+    global http_session
+    if http_session is None:
+        with http_session_lock:
+            if http_session is None:
+                retry = Retry(
+                    total=HTTP_RETRY_TOTAL,
+                    backoff_factor=HTTP_RETRY_BACKOFF,
+                    backoff_jitter=HTTP_RETRY_JITTER,
+                    status_forcelist=HTTP_RETRY_STATUSES,
+                    allowed_methods=['GET'],
+                    respect_retry_after_header=True,
+                    raise_on_status=False
+                )
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_MAXSIZE, max_retries=retry)
+                session = requests.Session()
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                http_session = session
+    return http_session
+
+def _parse_price_payload(symbol, data):
+    """Validate a Twelve Data /price response and return the price"""
+    if "price" in data and data["price"]:
+        # Parsed straight to integer cents; Decimal only at the model edge
+        price_cents = parse_cents(data["price"])
+        price = from_cents(price_cents)
+        
+        # Validate price is reasonable
+        if price_cents <= 0 or price_cents > MAX_PRICE_CENTS:
+            raise Exception(f"Invalid price received: ${price}")
+        
+        logger.info(f"Successfully fetched price for {symbol}: ${price}")
+        return price
+        
+    elif "status" in data and data["status"] == "error":
+        error_msg = data.get("message", "Unknown API error")
+        logger.error(f"API error for {symbol}: {error_msg}")
+        raise Exception(f"API error: {error_msg}")
+        
+    else:
+        logger.error(f"Unexpected API response for {symbol}: {data}")
+        raise Exception("Unexpected API response format")
+
 def fetch_stock_price(symbol):
     """
     Fetch stock price from Twelve Data API with rate limiting and error handling
@@ -32,37 +128,16 @@ def fetch_stock_price(symbol):
     if not check_rate_limit():
         raise Exception("API rate limit exceeded. Please wait before making more requests.")
     
-    api_key = settings.TWELVE_DATA_API_KEY
-    
-    url = f"https://api.twelvedata.com/price?symbol={symbol}&apikey={api_key}"
+    params = {'symbol': symbol, 'apikey': settings.TWELVE_DATA_API_KEY}
     
     try:
-        # Add random delay to avoid overwhelming the API
-        time.sleep(random.uniform(0.1, 0.5))
+        # Space calls evenly across the rate limit window
+        api_pacer.wait()
         
-        response = requests.get(url, timeout=8)
+        response = get_http_session().get(TWELVE_DATA_PRICE_URL, params=params, timeout=API_TIMEOUT)
         response.raise_for_status()
         
-        data = response.json()
-        
-        if "price" in data and data["price"]:
-            price = float(data["price"])
-            
-            # Validate price is reasonable
-            if price <= 0 or price > 1000000:
-                raise Exception(f"Invalid price received: ${price}")
-            
-            logger.info(f"Successfully fetched price for {symbol}: ${price}")
-            return Decimal(str(price))
-            
-        elif "status" in data and data["status"] == "error":
-            error_msg = data.get("message", "Unknown API error")
-            logger.error(f"API error for {symbol}: {error_msg}")
-            raise Exception(f"API error: {error_msg}")
-            
-        else:
-            logger.error(f"Unexpected API response for {symbol}: {data}")
-            raise Exception("Unexpected API response format")
+        return _parse_price_payload(symbol, response.json())
             
     except requests.exceptions.Timeout:
         logger.error(f"Timeout fetching price for {symbol}")
@@ -80,22 +155,86 @@ def fetch_stock_price(symbol):
         logger.error(f"Unexpected error fetching price for {symbol}: {str(e)}")
         raise Exception(f"Failed to fetch price: {str(e)}")
 
-def get_cached_stock_price(symbol, cache_timeout=300):
+# One async HTTP client per event loop, so async views reuse pooled connections
+_async_clients = weakref.WeakKeyDictionary()
+
+def get_async_http_client():
+    """Shared httpx.AsyncClient for the running event loop, speaking HTTP/2 when the server does"""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed:
+        # Transport-level retries only cover failed connects; status retries are below
+        transport = httpx.AsyncHTTPTransport(
+            http2=True,
+            retries=HTTP_RETRY_TOTAL,
+            limits=httpx.Limits(max_connections=HTTP_POOL_MAXSIZE, max_keepalive_connections=HTTP_POOL_MAXSIZE)
+        )
+        client = _async_clients[loop] = httpx.AsyncClient(transport=transport, timeout=API_TIMEOUT)
+    return client
+
+async def _aget_with_retries(client, url, params):
+    """GET with the same jittered backoff on 429/5xx that the sync session uses"""
+    for attempt in range(HTTP_RETRY_TOTAL + 1):
+        response = await client.get(url, params=params)
+        if response.status_code not in HTTP_RETRY_STATUSES or attempt == HTTP_RETRY_TOTAL:
+            return response
+        
+        retry_after = response.headers.get('Retry-After', '')
+        if retry_after.isdigit():
+            delay = min(int(retry_after), API_TIMEOUT)
+        else:
+            delay = HTTP_RETRY_BACKOFF * (2 ** attempt) + random.uniform(0, HTTP_RETRY_JITTER)
+        logger.warning(f"Retrying {url} after HTTP {response.status_code} in {delay:.2f}s")
+        await asyncio.sleep(delay)
+
+async def afetch_stock_price(symbol):
     """
-    Get stock price from cache or fetch from API
+    Async variant of fetch_stock_price for async views: the API call is awaited
+    on the event loop instead of holding a worker thread for its duration
     """
-    cache_key = f"stock_price_{symbol}"
-    cached_price = cache.get(cache_key)
+    if not await sync_to_async(check_rate_limit)():
+        raise Exception("API rate limit exceeded. Please wait before making more requests.")
     
-    if cached_price is not None:
-        logger.debug(f"Using cached price for {symbol}: ${cached_price}")
-        return cached_price
+    params = {'symbol': symbol, 'apikey': settings.TWELVE_DATA_API_KEY}
     
     try:
-        price = fetch_stock_price(symbol)
-        # Cache the price for 5 minutes
-        cache.set(cache_key, price, cache_timeout)
-        return price
+        delay = api_pacer.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        
+        response = await _aget_with_retries(get_async_http_client(), TWELVE_DATA_PRICE_URL, params)
+        response.raise_for_status()
+        
+        return _parse_price_payload(symbol, response.json())
+        
+    except httpx.TimeoutException:
+        logger.error(f"Timeout fetching price for {symbol}")
+        raise Exception("API request timeout")
+        
+    except httpx.HTTPError as e:
+        logger.error(f"Request error for {symbol}: {str(e)}")
+        raise Exception(f"Request failed: {str(e)}")
+        
+    except ValueError as e:
+        logger.error(f"Invalid price data for {symbol}: {str(e)}")
+        raise Exception("Invalid price data received")
+        
+    except Exception as e:
+        logger.error(f"Unexpected error fetching price for {symbol}: {str(e)}")
+        raise Exception(f"Failed to fetch price: {str(e)}")
+
+def get_cached_stock_price(symbol):
+    """
+    Get the current stock price from the quote cache, falling back to the API
+    for symbols that are not tracked yet
+    """
+    quote = get_quote(symbol)
+    if quote is not None:
+        logger.debug(f"Using cached price for {symbol}: ${quote['price']}")
+        return quote['price']
+    
+    try:
+        return fetch_stock_price(symbol)
         
     except Exception as e:
         logger.error(f"Failed to fetch price for {symbol}: {str(e)}")
@@ -107,6 +246,7 @@ def batch_fetch_stock_prices(symbols, max_concurrent=5):
     """
     results = {}
     
+    # fetch_stock_price paces itself against the rate limit, so batches need no extra delay
     for i in range(0, len(symbols), max_concurrent):
         batch = symbols[i:i + max_concurrent]
         
@@ -116,10 +256,6 @@ def batch_fetch_stock_prices(symbols, max_concurrent=5):
                 results[symbol] = {'success': True, 'price': price}
             except Exception as e:
                 results[symbol] = {'success': False, 'error': str(e)}
-        
-        # Add delay between batches to respect rate limits
-        if i + max_concurrent < len(symbols):
-            time.sleep(1)
     
     return results
 
@@ -168,6 +304,29 @@ def get_api_status():
         'rate_limit_reset_seconds': reset_seconds
     }
 
+def record_stock_price(stock, new_price):
+    """
+    Single ingest point for a fetched price: update the stock, append the
+    history tick and push it to realtime subscribers. Returns the old price.
+    """
+    from .models import StockPrice
+    from realtime.services import publish_price_tick
+    
+    old_price = stock.price
+    stock.price = new_price
+    stock.last_updated = timezone.now()
+    stock.save()
+    
+    # Create price history record
+    tick = StockPrice.objects.create(
+        stock=stock,
+        price=new_price
+    )
+    
+    get_indicator_engine().push(stock.id, tick.timestamp, to_cents(new_price), tick_id=tick.id)
+    publish_price_tick(stock.symbol, new_price, tick.timestamp)
+    return old_price
+
 def update_all_stock_prices():
     """
     Update prices for all active stocks over 80 seconds to respect API rate limits
@@ -207,18 +366,7 @@ def update_all_stock_prices():
                 # Fetch and update price
                 new_price = fetch_stock_price(stock.symbol)
                 if new_price:
-                    old_price = stock.price
-                    stock.price = new_price
-                    stock.last_updated = timezone.now()
-                    stock.save()
-                    
-                    # Create price history record
-                    from .models import StockPrice
-                    StockPrice.objects.create(
-                        stock=stock,
-                        price=new_price
-                    )
-                    
+                    old_price = record_stock_price(stock, new_price)
                     updated_count += 1
                     logger.info(f"Updated {stock.symbol}: ${old_price} -> ${new_price}")
                 else:
@@ -237,6 +385,9 @@ def update_all_stock_prices():
                     time.sleep(delay_between_requests)
                 continue
         
+        if updated_count:
+            compact_price_rollups()
+        
         result = {
             'updated_count': updated_count,
             'failed_count': failed_count,
@@ -258,12 +409,19 @@ def cleanup_old_prices(days=30):
     Used by the APScheduler for daily cleanup
     """
     try:
-        from .models import StockPrice
+        from .models import StockPrice, RollupWatermark
+        
+        # Never drop ticks that have not been folded into the rollups yet, including
+        # late ones compaction may still pick up from behind its watermark
+        compacted_until = RollupWatermark.objects.filter(
+            name=ROLLUP_WATERMARK
+        ).values_list('compacted_until', flat=True).first()
+        if compacted_until is None:
+            logger.info("Price rollups not compacted yet; keeping all stock prices")
+            return 0
         
-        cutoff_date = timezone.now() - timedelta(days=days)
-        deleted_count, _ = StockPrice.objects.filter(
-            timestamp__lt=cutoff_date
-        ).delete()
+        cutoff_date = min(timezone.now() - timedelta(days=days), compacted_until - ROLLUP_OVERLAP)
+        deleted_count, _ = StockPrice.objects.filter(timestamp__lt=cutoff_date).delete()
         
         logger.info(f"Cleaned up {deleted_count} old stock prices (older than {days} days)")
         return deleted_count
@@ -272,6 +430,146 @@ def cleanup_old_prices(days=30):
         logger.error(f"Error cleaning up old prices: {e}")
         return 0
 
+# Single-flight: concurrent on-demand refreshes of one symbol share a single API call.
+# The leader's result is kept for a short window so callers arriving just after it
+# finishes reuse it too; the lock lives in the quote cache so it spans processes
+# whenever that cache is shared.
+SINGLE_FLIGHT_WINDOW = 5  # seconds
+SINGLE_FLIGHT_TIMEOUT = 15  # seconds a caller waits for another caller's fetch
+SINGLE_FLIGHT_POLL_INTERVAL = 0.1  # seconds
+
+class _Flight:
+    """An in-process call that other threads can wait on"""
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+def _call_across_processes(key, func):
+    shared = get_quote_cache()
+    result_key = f"single_flight:{key}:result"
+    lock_key = f"single_flight:{key}:lock"
+    deadline = time.monotonic() + SINGLE_FLIGHT_TIMEOUT
+    
+    while True:
+        outcome = shared.get(result_key)
+        if outcome is not None:
+            break
+        
+        if shared.add(lock_key, 1, SINGLE_FLIGHT_TIMEOUT):
+            try:
+                try:
+                    outcome = ('ok', func())
+                except Exception as e:
+                    outcome = ('error', str(e))
+                shared.set(result_key, outcome, SINGLE_FLIGHT_WINDOW)
+            finally:
+                shared.delete(lock_key)
+            break
+        
+        if time.monotonic() >= deadline:
+            raise Exception(f"Timed out waiting for in-flight request {key}")
+        time.sleep(SINGLE_FLIGHT_POLL_INTERVAL)
+    
+    status, value = outcome
+    if status == 'error':
+        raise Exception(value)
+    return value
+
+def single_flight(key, func):
+    """
+    Run func once for all concurrent callers using the same key.
+    Threads in this process wait for the leader directly; other processes
+    wait on the shared cache lock. Every caller gets the same result or error.
+    """
+    with _flights_lock:
+        flight = _flights.get(key)
+        is_leader = flight is None
+        if is_leader:
+            flight = _flights[key] = _Flight()
+    
+    if not is_leader:
+        if not flight.done.wait(SINGLE_FLIGHT_TIMEOUT):
+            raise Exception(f"Timed out waiting for in-flight request {key}")
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+    
+    try:
+        flight.result = _call_across_processes(key, func)
+        return flight.result
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        with _flights_lock:
+            _flights.pop(key, None)
+        flight.done.set()
+
+async def _acall_across_processes(key, func):
+    shared = get_quote_cache()
+    result_key = f"single_flight:{key}:result"
+    lock_key = f"single_flight:{key}:lock"
+    deadline = time.monotonic() + SINGLE_FLIGHT_TIMEOUT
+    
+    while True:
+        outcome = await shared.aget(result_key)
+        if outcome is not None:
+            break
+        
+        if await shared.aadd(lock_key, 1, SINGLE_FLIGHT_TIMEOUT):
+            try:
+                try:
+                    outcome = ('ok', await func())
+                except Exception as e:
+                    outcome = ('error', str(e))
+                await shared.aset(result_key, outcome, SINGLE_FLIGHT_WINDOW)
+            finally:
+                await shared.adelete(lock_key)
+            break
+        
+        if time.monotonic() >= deadline:
+            raise Exception(f"Timed out waiting for in-flight request {key}")
+        await asyncio.sleep(SINGLE_FLIGHT_POLL_INTERVAL)
+    
+    status, value = outcome
+    if status == 'error':
+        raise Exception(value)
+    return value
+
+# In-flight async calls, keyed by (event loop, key)
+_async_flights = {}
+
+async def asingle_flight(key, func):
+    """
+    Async variant of single_flight for coroutine functions. Coroutines on the
+    same event loop await the leader's future; the cache lock (shared with the
+    sync variant) coordinates with threads and other processes.
+    """
+    loop = asyncio.get_running_loop()
+    flight = _async_flights.get((loop, key))
+    if flight is not None:
+        return await asyncio.wait_for(asyncio.shield(flight), SINGLE_FLIGHT_TIMEOUT)
+    
+    flight = _async_flights[(loop, key)] = loop.create_future()
+    # Nobody may be waiting; mark the outcome as retrieved so errors are not reported twice
+    flight.add_done_callback(lambda f: f.cancelled() or f.exception())
+    try:
+        result = await _acall_across_processes(key, func)
+        flight.set_result(result)
+        return result
+    except Exception as e:
+        flight.set_exception(e)
+        raise
+    except asyncio.CancelledError:
+        flight.cancel()
+        raise
+    finally:
+        _async_flights.pop((loop, key), None)
+
 def update_single_stock_price(symbol):
     """
     Update price for a single stock
@@ -286,22 +584,52 @@ def update_single_stock_price(symbol):
         except Stock.DoesNotExist:
             return f"Error: Stock {symbol} not found or inactive"
         
-        # Fetch new price
-        new_price = fetch_stock_price(symbol)
+        def refresh():
+            new_price = fetch_stock_price(stock.symbol)
+            if not new_price:
+                return None, None
+            old_price = record_stock_price(stock, new_price)
+            compact_price_rollups()
+            return old_price, new_price
+        
+        # Concurrent refreshes of the same symbol share one fetch and one recorded tick
+        old_price, new_price = single_flight(f"price:{stock.symbol}", refresh)
+        
+        if new_price:
+            logger.info(f"Updated {symbol}: ${old_price} -> ${new_price}")
+            return f"Updated {symbol}: ${old_price} -> ${new_price}"
+        
+        return f"Error: Failed to fetch price for {symbol}"
+        
+    except Exception as e:
+        error_msg = f"Error: Failed to update {symbol}: {str(e)}"
+        logger.error(error_msg)
+        return error_msg
+
+async def aupdate_single_stock_price(symbol):
+    """
+    Async variant of update_single_stock_price used by the async views.
+    The API call is awaited; only the database writes run in a worker thread.
+    """
+    try:
+        from .models import Stock
+        
+        try:
+            stock = await Stock.objects.aget(symbol=symbol.upper(), is_active=True)
+        except Stock.DoesNotExist:
+            return f"Error: Stock {symbol} not found or inactive"
+        
+        async def refresh():
+            new_price = await afetch_stock_price(stock.symbol)
+            if not new_price:
+                return None, None
+            old_price = await sync_to_async(record_stock_price)(stock, new_price)
+            await sync_to_async(compact_price_rollups)()
+            return old_price, new_price
+        
+        old_price, new_price = await asingle_flight(f"price:{stock.symbol}", refresh)
         
         if new_price:
-            old_price = stock.price
-            stock.price = new_price
-            stock.last_updated = timezone.now()
-            stock.save()
-            
-            # Create price history record
-            from .models import StockPrice
-            StockPrice.objects.create(
-                stock=stock,
-                price=new_price
-            )
-            
             logger.info(f"Updated {symbol}: ${old_price} -> ${new_price}")
             return f"Updated {symbol}: ${old_price} -> ${new_price}"
         
@@ -311,3 +639,304 @@ def update_single_stock_price(symbol):
         error_msg = f"Error: Failed to update {symbol}: {str(e)}"
         logger.error(error_msg)
         return error_msg
+
+# Supported downsampling intervals for the price history API
+HISTORY_INTERVALS = {
+    '1m': timedelta(minutes=1),
+    '5m': timedelta(minutes=5),
+    '15m': timedelta(minutes=15),
+    '1h': timedelta(hours=1),
+    '4h': timedelta(hours=4),
+    '1d': timedelta(days=1),
+}
+MAX_HISTORY_BUCKETS = 500
+DEFAULT_HISTORY_RANGE = timedelta(days=1)
+
+def floor_to_interval(timestamp, interval):
+    """
+    Align a timestamp to the start of its interval bucket (UTC epoch aligned)
+    """
+    step = int(interval.total_seconds())
+    epoch_seconds = int(timestamp.timestamp())
+    return datetime.fromtimestamp(epoch_seconds - epoch_seconds % step, tz=dt_timezone.utc)
+
+def choose_history_interval(start, end):
+    """
+    Pick the finest interval that keeps the range within MAX_HISTORY_BUCKETS
+    """
+    span = end - start
+    for name, interval in HISTORY_INTERVALS.items():
+        if span / interval <= MAX_HISTORY_BUCKETS:
+            return name
+    raise ValueError(f"Range too large; at most {MAX_HISTORY_BUCKETS} daily buckets are allowed")
+
+# Raw tick rollups maintained by compact_price_rollups
+ROLLUP_INTERVALS = {
+    '1m': timedelta(minutes=1),
+    '1h': timedelta(hours=1),
+    '1d': timedelta(days=1),
+}
+# Rollup table each history interval is read from
+ROLLUP_SOURCES = {
+    '1m': '1m',
+    '5m': '1m',
+    '15m': '1m',
+    '1h': '1h',
+    '4h': '1h',
+    '1d': '1d',
+}
+ROLLUP_WATERMARK = 'price_rollups'
+ROLLUP_BATCH_SIZE = 5000
+# How far behind the watermark each compaction run re-reads for late-committed ticks
+ROLLUP_OVERLAP = timedelta(minutes=2)
+
+def _fold_ohlc(buckets, step, rows):
+    """
+    Merge (timestamp, open, high, low, close, count) rows into step-sized buckets.
+    Rows must arrive in time order; raw ticks are rows where open == high == low == close.
+    """
+    for timestamp, open_, high, low, close, count in rows:
+        bucket_start = floor_to_interval(timestamp, step)
+        bucket = buckets.get(bucket_start)
+        if bucket is None:
+            buckets[bucket_start] = {
+                'timestamp': bucket_start,
+                'open': open_,
+                'high': high,
+                'low': low,
+                'close': close,
+                'count': count,
+            }
+            continue
+        bucket['high'] = max(bucket['high'], high)
+        bucket['low'] = min(bucket['low'], low)
+        bucket['close'] = close
+        bucket['count'] += count
+
+def _recompute_rollups(minute_keys):
+    """
+    Rebuild the 1m rollups for a set of (stock_id, bucket_start) keys from raw ticks,
+    then the 1h and 1d rollups containing them from the next finer level. Buckets are
+    recomputed whole, so doing it twice is harmless. Returns how many ticks the 1m
+    rollups gained.
+    """
+    from .models import StockPrice, StockPriceRollup
+    
+    added = 0
+    keys = minute_keys
+    levels = list(ROLLUP_INTERVALS.items())
+    for position, (interval, step) in enumerate(levels):
+        stock_ids = {stock_id for stock_id, _ in keys}
+        starts = {bucket_start for _, bucket_start in keys}
+        if position == 0:
+            rows = (
+                (stock_id, timestamp, price, price, price, price, 1)
+                for stock_id, timestamp, price in StockPrice.objects.filter(
+                    stock_id__in=stock_ids, timestamp__gte=min(starts), timestamp__lt=max(starts) + step
+                ).order_by('timestamp', 'id').values_list('stock_id', 'timestamp', 'price')
+            )
+        else:
+            rows = StockPriceRollup.objects.filter(
+                stock_id__in=stock_ids,
+                interval=levels[position - 1][0],
+                bucket_start__gte=min(starts),
+                bucket_start__lt=max(starts) + step,
+            ).order_by('bucket_start').values_list(
+                'stock_id', 'bucket_start', 'open', 'high', 'low', 'close', 'tick_count'
+            )
+        
+        rows_by_stock = {}
+        for stock_id, *row in rows:
+            rows_by_stock.setdefault(stock_id, []).append(row)
+        folded = {}
+        for stock_id, stock_rows in rows_by_stock.items():
+            _fold_ohlc(folded.setdefault(stock_id, {}), step, stock_rows)
+        
+        existing = {
+            (rollup.stock_id, rollup.bucket_start): rollup
+            for rollup in StockPriceRollup.objects.filter(
+                interval=interval, stock_id__in=stock_ids, bucket_start__in=starts
+            )
+        }
+        to_update = []
+        to_create = []
+        for stock_id, bucket_start in keys:
+            bucket = folded.get(stock_id, {}).get(bucket_start)
+            if bucket is None:
+                continue
+            rollup = existing.get((stock_id, bucket_start))
+            if rollup is None:
+                rollup = StockPriceRollup(stock_id=stock_id, interval=interval, bucket_start=bucket_start, tick_count=0)
+                to_create.append(rollup)
+            else:
+                to_update.append(rollup)
+            if position == 0:
+                added += bucket['count'] - rollup.tick_count
+            rollup.open = bucket['open']
+            rollup.high = bucket['high']
+            rollup.low = bucket['low']
+            rollup.close = bucket['close']
+            rollup.tick_count = bucket['count']
+        
+        StockPriceRollup.objects.bulk_create(to_create)
+        StockPriceRollup.objects.bulk_update(to_update, ['open', 'high', 'low', 'close', 'tick_count'])
+        
+        if position + 1 < len(levels):
+            coarser = levels[position + 1][1]
+            keys = {(stock_id, floor_to_interval(bucket_start, coarser)) for stock_id, bucket_start in keys}
+    return added
+
+def compact_price_rollups(batch_size=ROLLUP_BATCH_SIZE):
+    """
+    Fold recent StockPrice ticks into the 1m/1h/1d rollup tables.
+    The watermark is the time of the newest tick compacted so far. Each run re-reads
+    ROLLUP_OVERLAP before it, so a tick whose transaction committed after a newer one
+    was compacted is still picked up, and every bucket a batch touches is recomputed
+    whole, so re-reading ticks never counts them twice. Batches run holding the
+    watermark row lock. Returns the number of ticks newly added to the rollups.
+    """
+    from django.db import transaction
+    from django.db.models import Q
+    from .models import StockPrice, RollupWatermark
+    
+    processed = 0
+    cursor = None
+    try:
+        while True:
+            with transaction.atomic():
+                RollupWatermark.objects.get_or_create(name=ROLLUP_WATERMARK)
+                watermark = RollupWatermark.objects.select_for_update().get(name=ROLLUP_WATERMARK)
+                if cursor is None and watermark.compacted_until:
+                    cursor = (watermark.compacted_until - ROLLUP_OVERLAP, 0)
+            
+                # Page by (timestamp, id) so ticks sharing a timestamp are never skipped
+                ticks = StockPrice.objects.order_by('timestamp', 'id')
+                if cursor:
+                    ticks = ticks.filter(
+                        Q(timestamp__gt=cursor[0]) | Q(timestamp=cursor[0], id__gt=cursor[1])
+                    )
+                ticks = list(ticks.values_list('timestamp', 'id', 'stock_id')[:batch_size])
+                if not ticks:
+                    break
+            
+                processed += _recompute_rollups({
+                    (stock_id, floor_to_interval(timestamp, ROLLUP_INTERVALS['1m']))
+                    for timestamp, _, stock_id in ticks
+                })
+            
+                cursor = ticks[-1][:2]
+                if watermark.compacted_until is None or cursor[0] > watermark.compacted_until:
+                    watermark.compacted_until = cursor[0]
+                watermark.save()
+        
+            if len(ticks) < batch_size:
+                break
+    except Exception as e:
+        logger.error(f"Error compacting price rollups: {e}")
+    
+    if processed:
+        logger.info(f"Compacted {processed} price ticks into rollups")
+    return processed
+
+def cleanup_old_rollups(retention_days):
+    """
+    Delete rollups older than the per-interval retention; None keeps an interval forever
+    """
+    try:
+        from .models import StockPriceRollup
+        
+        deleted_count = 0
+        for interval, days in retention_days.items():
+            if days is None:
+                continue
+            cutoff_date = timezone.now() - timedelta(days=days)
+            deleted, _ = StockPriceRollup.objects.filter(
+                interval=interval, bucket_start__lt=cutoff_date
+            ).delete()
+            deleted_count += deleted
+        
+        logger.info(f"Cleaned up {deleted_count} old price rollups")
+        return deleted_count
+        
+    except Exception as e:
+        logger.error(f"Error cleaning up old rollups: {e}")
+        return 0
+
+def get_price_history_ohlc(stock, start=None, end=None, interval=None):
+    """
+    Downsample a stock's price history into OHLC buckets.
+    Buckets are read from the rollup tables, plus any raw ticks not yet compacted.
+    Rollup buckets cut by start or end are rebuilt from raw ticks inside the range
+    while raw ticks are still retained (RAW_PRICE_RETENTION_DAYS); past that, the
+    range is widened to whole rollup buckets (1m, 1h or 1d per ROLLUP_SOURCES).
+    The range is capped at MAX_HISTORY_BUCKETS buckets, so the response size
+    is bounded no matter how much raw history exists.
+    """
+    from django.db.models import Q
+    from .models import StockPrice, StockPriceRollup, RollupWatermark
+    
+    end = end or timezone.now()
+    start = start or end - DEFAULT_HISTORY_RANGE
+    if start >= end:
+        raise ValueError("start must be before end")
+    
+    if interval is None:
+        interval = choose_history_interval(start, end)
+    elif interval not in HISTORY_INTERVALS:
+        raise ValueError(f"Unsupported interval: {interval}. Choose from {', '.join(HISTORY_INTERVALS)}")
+    
+    step = HISTORY_INTERVALS[interval]
+    if (end - start) / step > MAX_HISTORY_BUCKETS:
+        raise ValueError(
+            f"Range too large for interval {interval}; at most {MAX_HISTORY_BUCKETS} buckets are allowed"
+        )
+    
+    source = ROLLUP_SOURCES[interval]
+    source_step = ROLLUP_INTERVALS[source]
+    compacted_until = RollupWatermark.objects.filter(
+        name=ROLLUP_WATERMARK
+    ).values_list('compacted_until', flat=True).first()
+    raw_since = timezone.now() - timedelta(days=settings.RAW_PRICE_RETENTION_DAYS)
+    
+    # Edge buckets only partly inside the range come from raw ticks when those still exist
+    first_bucket = floor_to_interval(start, source_step)
+    last_bucket = floor_to_interval(end, source_step)
+    trimmed = set()
+    raw_ranges = Q()
+    if first_bucket < start and start >= raw_since:
+        trimmed.add(first_bucket)
+        raw_ranges |= Q(timestamp__lt=first_bucket + source_step)
+    if last_bucket >= raw_since:
+        trimmed.add(last_bucket)
+        raw_ranges |= Q(timestamp__gte=last_bucket)
+    if compacted_until is None:
+        raw_ranges = Q()
+    else:
+        raw_ranges |= Q(timestamp__gt=compacted_until)
+    
+    rollups = StockPriceRollup.objects.filter(
+        stock=stock,
+        interval=source,
+        bucket_start__gte=first_bucket,
+        bucket_start__lte=end,
+    ).exclude(bucket_start__in=trimmed).order_by('bucket_start').values_list(
+        'bucket_start', 'open', 'high', 'low', 'close', 'tick_count'
+    )
+    raw_ticks = StockPrice.objects.filter(
+        raw_ranges, stock=stock, timestamp__gte=start, timestamp__lte=end
+    ).order_by('timestamp', 'id').values_list('timestamp', 'price')
+    
+    buckets = {}
+    _fold_ohlc(buckets, step, heapq.merge(
+        rollups.iterator(chunk_size=2000),
+        ((timestamp, price, price, price, price, 1) for timestamp, price in raw_ticks.iterator(chunk_size=2000)),
+        key=lambda row: row[0],
+    ))
+    
+    return {
+        'symbol': stock.symbol,
+        'interval': interval,
+        'start': start,
+        'end': end,
+        'buckets': sorted(buckets.values(), key=lambda bucket: bucket['timestamp']),
+    }
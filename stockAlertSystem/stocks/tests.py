@@ -8,11 +8,14 @@ from decimal import Decimal
 from unittest.mock import patch, MagicMock
 import json
 
-from .models import Stock, StockPrice
+from .models import Stock, StockPrice, StockPriceRollup, RollupWatermark
 from .services import (
     fetch_stock_price, check_rate_limit, validate_stock_symbol, 
-    get_api_status, get_cached_stock_price
+    get_api_status, get_cached_stock_price, compact_price_rollups,
+    cleanup_old_prices, get_price_history_ohlc, record_stock_price, floor_to_interval,
+    single_flight, update_single_stock_price, afetch_stock_price, aupdate_single_stock_price
 )
+from .quotes import get_quote, get_quotes, get_quote_cache
 # from .tasks import update_single_stock_price, initialize_stocks
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
@@ -70,6 +73,26 @@ class StockModelTest(TestCase):
         self.assertEqual(self.stock.price_history.count(), 2)
         self.assertEqual(self.stock.price_history.first().price, Decimal('155.00'))
     
+    def test_price_edit_marks_price_changed(self):
+        """Test any save that changes the price (e.g. an admin edit) sets price_changed_at"""
+        from django.contrib.admin.sites import site
+        from django.test import RequestFactory
+        Stock.objects.filter(id=self.stock.id).update(price_changed_at=None)
+        stock = Stock.objects.get(id=self.stock.id)
+        
+        stock.name = 'Apple'
+        stock.save()
+        self.assertIsNone(Stock.objects.get(id=stock.id).price_changed_at)
+        
+        admin = site._registry[Stock]
+        form = admin.get_form(RequestFactory().get('/'), stock)(
+            instance=stock, data={'symbol': 'AAPL', 'name': 'Apple', 'price': '151.00',
+                                  'currency': 'USD', 'exchange': 'NASDAQ', 'is_active': True}
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        admin.save_model(RequestFactory().post('/'), form.save(commit=False), form, change=True)
+        self.assertIsNotNone(Stock.objects.get(id=stock.id).price_changed_at)
+    
     def test_stock_ordering(self):
         """Test stock ordering by symbol"""
         Stock.objects.create(symbol='GOOGL', name='Google')
@@ -170,14 +193,14 @@ class StockServicesTest(TestCase):
         
         self.assertEqual(status_info['rate_limit_max'], 100)
     
-    @patch('stocks.services.requests.get')
-    def test_fetch_stock_price_success(self, mock_get):
+    @patch('stocks.services.get_http_session')
+    def test_fetch_stock_price_success(self, mock_session):
         """Test successful stock price fetching"""
         # Mock successful API response
         mock_response = MagicMock()
         mock_response.json.return_value = {'price': '150.50'}
         mock_response.raise_for_status.return_value = None
-        mock_get.return_value = mock_response
+        mock_session.return_value.get.return_value = mock_response
         
         # Mock rate limit check
         with patch('stocks.services.check_rate_limit', return_value=True):
@@ -185,8 +208,8 @@ class StockServicesTest(TestCase):
             
         self.assertEqual(price, Decimal('150.50'))
     
-    @patch('stocks.services.requests.get')
-    def test_fetch_stock_price_api_error(self, mock_get):
+    @patch('stocks.services.get_http_session')
+    def test_fetch_stock_price_api_error(self, mock_session):
         """Test API error handling"""
         # Mock API error response
         mock_response = MagicMock()
@@ -195,7 +218,7 @@ class StockServicesTest(TestCase):
             'message': 'API key invalid'
         }
         mock_response.raise_for_status.return_value = None
-        mock_get.return_value = mock_response
+        mock_session.return_value.get.return_value = mock_response
         
         # Mock rate limit check
         with patch('stocks.services.check_rate_limit', return_value=True):
@@ -204,11 +227,11 @@ class StockServicesTest(TestCase):
             
             self.assertIn('API error: API key invalid', str(context.exception))
     
-    @patch('stocks.services.requests.get')
-    def test_fetch_stock_price_timeout(self, mock_get):
+    @patch('stocks.services.get_http_session')
+    def test_fetch_stock_price_timeout(self, mock_session):
         """Test timeout error handling"""
         # Mock timeout error
-        mock_get.side_effect = Exception('Request timeout')
+        mock_session.return_value.get.side_effect = Exception('Request timeout')
         
         # Mock rate limit check
         with patch('stocks.services.check_rate_limit', return_value=True):
@@ -217,6 +240,26 @@ class StockServicesTest(TestCase):
             
             self.assertIn('Request timeout', str(context.exception))
 
+    def test_http_session_is_pooled_and_retries(self):
+        """Test one shared session with retries on 429/5xx is reused for every call"""
+        from .services import get_http_session, HTTP_RETRY_STATUSES
+        session = get_http_session()
+        self.assertIs(get_http_session(), session)
+        
+        retry = session.get_adapter('https://api.twelvedata.com').max_retries
+        self.assertEqual(set(retry.status_forcelist), set(HTTP_RETRY_STATUSES))
+        self.assertGreater(retry.backoff_jitter, 0)
+    
+    def test_pacer_spaces_calls(self):
+        """Test the pacer hands out evenly spaced slots to back-to-back callers"""
+        from .services import RequestPacer
+        pacer = RequestPacer(calls=10, period=1)
+        
+        delays = [pacer.reserve() for _ in range(3)]
+        self.assertEqual(delays[0], 0)
+        self.assertAlmostEqual(delays[1], 0.1, places=2)
+        self.assertAlmostEqual(delays[2], 0.2, places=2)
+
 class StockAPITest(APITestCase):
     def setUp(self):
         self.client = APIClient()
@@ -225,11 +268,13 @@ class StockAPITest(APITestCase):
             email='test@example.com',
             password='testpass123'
         )
-        self.stock = Stock.objects.create(
-            symbol='AAPL',
-            name='Apple Inc.',
-            price=Decimal('150.00')
-        )
+        # Committed, so the quote is written through
+        with self.captureOnCommitCallbacks(execute=True):
+            self.stock = Stock.objects.create(
+                symbol='AAPL',
+                name='Apple Inc.',
+                price=Decimal('150.00')
+            )
         
         # Get JWT token
         refresh = RefreshToken.for_user(self.user)
@@ -241,8 +286,8 @@ class StockAPITest(APITestCase):
         response = self.client.get(url)
         
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]['symbol'], 'AAPL')
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['symbol'], 'AAPL')
     
     def test_stock_detail(self):
         """Test retrieving specific stock details"""
@@ -253,13 +298,108 @@ class StockAPITest(APITestCase):
         self.assertEqual(response.data['symbol'], 'AAPL')
         self.assertEqual(response.data['name'], 'Apple Inc.')
     
+    def test_stock_payload_excludes_price_history(self):
+        """Test list and detail views only return current quote fields"""
+        StockPrice.objects.create(stock=self.stock, price=Decimal('150.00'))
+        
+        response = self.client.get(reverse('stocks:stock-list'))
+        self.assertNotIn('price_history', response.data['results'][0])
+        self.assertEqual(response.data['results'][0]['current_price'], '150.00')
+        
+        response = self.client.get(reverse('stocks:stock-detail', args=[self.stock.id]))
+        self.assertNotIn('price_history', response.data)
+    
+    def test_stock_history_ohlc_buckets(self):
+        """Test history endpoint downsamples ticks into OHLC buckets"""
+        from datetime import datetime, timedelta, timezone as dt_timezone
+        base = datetime(2024, 1, 15, 14, 0, tzinfo=dt_timezone.utc)
+        for minutes, price in [(1, '150.00'), (20, '155.00'), (40, '148.00'), (50, '151.00'), (70, '152.00')]:
+            record = StockPrice.objects.create(stock=self.stock, price=Decimal(price))
+            record.timestamp = base + timedelta(minutes=minutes)
+            record.save()
+        
+        url = reverse('stocks:stock-history', args=[self.stock.id])
+        response = self.client.get(url, {
+            'start': base.isoformat(),
+            'end': (base + timedelta(hours=2)).isoformat(),
+            'interval': '1h',
+        })
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['interval'], '1h')
+        buckets = response.data['buckets']
+        self.assertEqual(len(buckets), 2)
+        self.assertEqual(
+            (buckets[0]['open'], buckets[0]['high'], buckets[0]['low'], buckets[0]['close'], buckets[0]['count']),
+            ('150.00', '155.00', '148.00', '151.00', 4)
+        )
+        self.assertEqual(buckets[1]['open'], '152.00')
+    
+    def test_stock_history_is_capped(self):
+        """Test history endpoint refuses ranges that exceed the bucket cap"""
+        url = reverse('stocks:stock-history', args=[self.stock.id])
+        response = self.client.get(url, {'start': '2024-01-01', 'end': '2024-03-01', 'interval': '1m'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+        # Without an interval the finest one that fits the cap is chosen
+        response = self.client.get(url, {'start': '2024-01-01', 'end': '2024-03-01'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['interval'], '4h')
+    
+    def test_stock_list_conditional_get(self):
+        """Test unchanged clients get 304 until the next price update"""
+        cache.clear()
+        url = reverse('stocks:stock-list')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+        
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        
+        from .services import record_stock_price
+        with self.captureOnCommitCallbacks(execute=True):
+            record_stock_price(self.stock, Decimal('151.00'))
+        
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data['results'][0]['current_price'], '151.00')
+    
+    def test_deleting_newest_stock_changes_the_etag(self):
+        """Test deleting the most recently written stock still invalidates the cached list"""
+        cache.clear()
+        url = reverse('stocks:stock-list')
+        other = Stock.objects.create(symbol='MSFT', name='Microsoft', price=Decimal('300.00'))
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertEqual(len(response.data['results']), 2)
+        
+        other.delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([stock['symbol'] for stock in response.data['results']], ['AAPL'])
+    
+    def test_stock_detail_payload_is_cached(self):
+        """Test repeated detail requests reuse the cached payload between price updates"""
+        cache.clear()
+        url = reverse('stocks:stock-detail', args=[self.stock.id])
+        first = self.client.get(url)
+        
+        # Only the JWT user lookup and the price version read hit the database
+        # once the payload is cached
+        with self.assertNumQueries(2):
+            second = self.client.get(url)
+        self.assertEqual(first.data, second.data)
+    
     def test_update_stock_price(self):
         """Test updating stock price via API"""
         url = reverse('stocks:update-price')
         data = {'symbol': 'AAPL'}
         
         # Mock the service function instead of the task
-        with patch('stocks.views.update_single_stock_price') as mock_service:
+        with patch('stocks.views.aupdate_single_stock_price') as mock_service:
             mock_service.return_value = 'Price updated successfully for AAPL'
             
             response = self.client.post(url, data, format='json')
@@ -275,7 +415,15 @@ class StockAPITest(APITestCase):
         response = self.client.post(url, data, format='json')
         
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
-        self.assertIn('error', response.data)
+        self.assertIn('error', response.json())
+    
+    def test_update_stock_price_requires_authentication(self):
+        """Test the async refresh endpoint rejects anonymous requests"""
+        self.client.credentials()
+        
+        response = self.client.post(reverse('stocks:update-price'), {'symbol': 'AAPL'}, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
     
     def test_unauthorized_access(self):
         """Test that unauthorized users cannot access stocks"""
@@ -286,6 +434,697 @@ class StockAPITest(APITestCase):
         
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
 
+class StockPriceExportAPITest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.stock = Stock.objects.create(symbol='AAPL', name='Apple Inc.', price=Decimal('150.00'))
+        other = Stock.objects.create(symbol='MSFT', name='Microsoft', price=Decimal('300.00'))
+        
+        from datetime import timedelta
+        now = timezone.now()
+        for minutes_ago, price in [(90, '148.00'), (30, '149.50'), (5, '150.00')]:
+            record = StockPrice.objects.create(stock=self.stock, price=Decimal(price))
+            record.timestamp = now - timedelta(minutes=minutes_ago)
+            record.save()
+        StockPrice.objects.create(stock=other, price=Decimal('300.00'))
+        
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+    
+    def test_export_csv_filtered_by_symbol(self):
+        """Test CSV export streams only the requested symbol in time order"""
+        url = reverse('stocks:export-prices')
+        response = self.client.get(url, {'symbol': 'aapl', 'output': 'csv'})
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().strip().splitlines()
+        self.assertEqual(lines[0], 'symbol,price,timestamp')
+        self.assertEqual([line.split(',')[1] for line in lines[1:]], ['148.00', '149.50', '150.00'])
+    
+    def test_export_ndjson_time_range(self):
+        """Test NDJSON export honours the start bound"""
+        from datetime import timedelta
+        url = reverse('stocks:export-prices')
+        start = (timezone.now() - timedelta(minutes=60)).isoformat()
+        response = self.client.get(url, {'symbol': 'AAPL', 'output': 'ndjson', 'start': start})
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['price'] for row in rows], ['149.50', '150.00'])
+        self.assertEqual(rows[0]['symbol'], 'AAPL')
+    
+    def test_export_invalid_params(self):
+        """Test export rejects unknown formats and bad dates"""
+        url = reverse('stocks:export-prices')
+        
+        response = self.client.get(url, {'output': 'xml'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+        response = self.client.get(url, {'start': 'yesterday'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_export_rejects_range_past_raw_retention(self):
+        """Test export refuses ranges starting before raw ticks are pruned instead of returning a partial file"""
+        from datetime import timedelta
+        url = reverse('stocks:export-prices')
+        start = (timezone.now() - timedelta(days=30)).isoformat()
+        response = self.client.get(url, {'symbol': 'AAPL', 'start': start})
+        
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('error', response.data)
+
+class StockPriceRollupTest(TestCase):
+    def setUp(self):
+        from datetime import datetime, timezone as dt_timezone
+        self.stock = Stock.objects.create(symbol='AAPL', name='Apple Inc.', price=Decimal('150.00'))
+        self.base = datetime(2024, 1, 15, 14, 0, tzinfo=dt_timezone.utc)
+    
+    def add_tick(self, minutes, price):
+        from datetime import timedelta
+        record = StockPrice.objects.create(stock=self.stock, price=Decimal(price))
+        record.timestamp = self.base + timedelta(minutes=minutes)
+        record.save()
+        return record
+    
+    def test_compaction_builds_rollups_incrementally(self):
+        """Test compaction folds only ticks newer than the watermark"""
+        self.add_tick(0, '150.00')
+        self.add_tick(10, '155.00')
+        self.assertEqual(compact_price_rollups(), 2)
+        
+        hour = StockPriceRollup.objects.get(stock=self.stock, interval='1h')
+        self.assertEqual((hour.open, hour.high, hour.low, hour.close, hour.tick_count),
+                         (Decimal('150.00'), Decimal('155.00'), Decimal('150.00'), Decimal('155.00'), 2))
+        self.assertEqual(StockPriceRollup.objects.filter(interval='1m').count(), 2)
+        
+        # Nothing new since the watermark
+        self.assertEqual(compact_price_rollups(), 0)
+        
+        last = self.add_tick(20, '145.00')
+        self.assertEqual(compact_price_rollups(), 1)
+        hour.refresh_from_db()
+        self.assertEqual((hour.low, hour.close, hour.tick_count), (Decimal('145.00'), Decimal('145.00'), 3))
+        self.assertEqual(RollupWatermark.objects.get().compacted_until, last.timestamp)
+    
+    def test_compaction_picks_up_late_ticks(self):
+        """Test a tick committed after a newer one was compacted still reaches the rollups"""
+        from django.db.models import Sum
+        self.add_tick(0, '150.00')
+        self.add_tick(2, '152.00')
+        compact_price_rollups()
+        
+        # Stamped before the watermark, but committed after the run
+        self.add_tick(1, '149.00')
+        self.assertEqual(compact_price_rollups(), 1)
+        
+        hour = StockPriceRollup.objects.get(stock=self.stock, interval='1h')
+        self.assertEqual((hour.open, hour.low, hour.close, hour.tick_count),
+                         (Decimal('150.00'), Decimal('149.00'), Decimal('152.00'), 3))
+        
+        # Re-reading the overlap again changes nothing
+        self.assertEqual(compact_price_rollups(), 0)
+        total = StockPriceRollup.objects.filter(interval='1m').aggregate(Sum('tick_count'))
+        self.assertEqual(total['tick_count__sum'], 3)
+    
+    def test_late_tick_updates_bucket_open(self):
+        """Test a late tick earlier in an existing bucket becomes its open"""
+        self.add_tick(1, '150.00')
+        compact_price_rollups()
+        late = self.add_tick(0, '148.00')
+        self.assertEqual(compact_price_rollups(), 1)
+        
+        for interval in ('1m', '1h', '1d'):
+            rollup = StockPriceRollup.objects.get(stock=self.stock, interval=interval, bucket_start__lte=late.timestamp)
+            self.assertEqual(rollup.open, Decimal('148.00'))
+    
+    def test_history_reads_rollups_and_pending_ticks(self):
+        """Test history merges compacted rollups with ticks past the watermark"""
+        from datetime import timedelta
+        self.add_tick(0, '150.00')
+        compact_price_rollups()
+        self.add_tick(30, '160.00')
+        
+        history = get_price_history_ohlc(
+            self.stock, start=self.base, end=self.base + timedelta(hours=1), interval='1h'
+        )
+        self.assertEqual(len(history['buckets']), 1)
+        bucket = history['buckets'][0]
+        self.assertEqual((bucket['open'], bucket['high'], bucket['close'], bucket['count']),
+                         (Decimal('150.00'), Decimal('160.00'), Decimal('160.00'), 2))
+    
+    def test_cleanup_keeps_uncompacted_ticks(self):
+        """Test raw tick cleanup never drops ticks missing from the rollups"""
+        from datetime import timedelta
+        self.base = timezone.now() - timedelta(days=10)
+        self.add_tick(0, '150.00')
+        self.add_tick(5, '150.50')
+        compact_price_rollups()
+        self.add_tick(6, '151.00')
+        
+        # The tick inside the compaction overlap stays too
+        self.assertEqual(cleanup_old_prices(days=7), 1)
+        self.assertEqual(StockPrice.objects.count(), 2)
+    
+    def test_history_trims_edge_buckets_to_range(self):
+        """Test recent edge buckets only include ticks inside the requested range"""
+        from datetime import timedelta
+        self.base = floor_to_interval(timezone.now() - timedelta(hours=3), timedelta(hours=1))
+        self.add_tick(10, '140.00')
+        self.add_tick(40, '150.00')
+        self.add_tick(70, '160.00')
+        self.add_tick(100, '170.00')
+        compact_price_rollups()
+        
+        history = get_price_history_ohlc(
+            self.stock,
+            start=self.base + timedelta(minutes=30),
+            end=self.base + timedelta(minutes=80),
+            interval='1h',
+        )
+        self.assertEqual(
+            [(bucket['open'], bucket['close'], bucket['count']) for bucket in history['buckets']],
+            [(Decimal('150.00'), Decimal('150.00'), 1), (Decimal('160.00'), Decimal('160.00'), 1)],
+        )
+
+class StockQuoteCacheTest(TestCase):
+    def setUp(self):
+        self.aapl = Stock.objects.create(symbol='AAPL', name='Apple Inc.', price=Decimal('150.00'))
+        self.msft = Stock.objects.create(symbol='MSFT', name='Microsoft', price=Decimal('300.00'))
+    
+    def test_ingest_writes_through(self):
+        """Test a recorded price is readable from the quote cache without a query once committed"""
+        with self.captureOnCommitCallbacks(execute=True):
+            record_stock_price(self.aapl, Decimal('151.25'))
+        
+        with self.assertNumQueries(0):
+            quote = get_quote('AAPL')
+        self.assertEqual(quote['price'], Decimal('151.25'))
+        self.assertEqual(get_cached_stock_price('AAPL'), Decimal('151.25'))
+    
+    def test_uncommitted_price_is_not_cached(self):
+        """Test a save drops the old quote at once but only caches the new price on commit"""
+        from .quotes import quote_key
+        with self.captureOnCommitCallbacks() as callbacks:
+            record_stock_price(self.aapl, Decimal('152.00'))
+        self.assertIsNone(get_quote_cache().get(quote_key('AAPL')))
+        
+        for callback in callbacks:
+            callback()
+        self.assertEqual(get_quote_cache().get(quote_key('AAPL'))['price'], Decimal('152.00'))
+    
+    def test_miss_fill_does_not_overwrite_newer_write(self):
+        """Test a reader's DB fill loses to a write-through that landed after its cache read"""
+        from .quotes import quote_key, write_quote
+        quote_cache = get_quote_cache()
+        quote_cache.clear()
+        newer = timezone.now()
+        
+        def miss_then_concurrent_write(keys):
+            write_quote('AAPL', Decimal('155.00'), newer)
+            return {}
+        
+        with patch.object(quote_cache, 'get_many', side_effect=miss_then_concurrent_write):
+            get_quotes(['AAPL'])
+        self.assertEqual(quote_cache.get(quote_key('AAPL'))['price'], Decimal('155.00'))
+    
+    def test_multi_get_loads_misses_in_one_query(self):
+        """Test cache misses for many symbols are filled by a single query"""
+        get_quote_cache().clear()
+        
+        with self.assertNumQueries(1):
+            quotes = get_quotes(['AAPL', 'MSFT', 'UNKNOWN'])
+        self.assertEqual(set(quotes), {'AAPL', 'MSFT'})
+        self.assertEqual(quotes['MSFT']['price'], Decimal('300.00'))
+        
+        with self.assertNumQueries(0):
+            get_quotes(['AAPL', 'MSFT'])
+    
+    def test_delete_evicts_quote(self):
+        """Test deleting a stock removes its quote"""
+        self.msft.delete()
+        self.assertIsNone(get_quote('MSFT'))
+
+class SingleFlightTest(TestCase):
+    def setUp(self):
+        get_quote_cache().clear()
+        self.stock = Stock.objects.create(symbol='AAPL', name='Apple Inc.', price=Decimal('150.00'))
+    
+    def test_concurrent_callers_share_one_call(self):
+        """Test concurrent callers for one key run the function once and share its result"""
+        import threading
+        started, release = threading.Event(), threading.Event()
+        calls = []
+        
+        def fetch():
+            calls.append(1)
+            started.set()
+            release.wait(2)
+            return Decimal('151.00')
+        
+        results = []
+        leader = threading.Thread(target=lambda: results.append(single_flight('price:AAPL', fetch)))
+        leader.start()
+        started.wait(2)
+        followers = [
+            threading.Thread(target=lambda: results.append(single_flight('price:AAPL', fetch)))
+            for _ in range(4)
+        ]
+        for follower in followers:
+            follower.start()
+        release.set()
+        for thread in [leader] + followers:
+            thread.join(2)
+        
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [Decimal('151.00')] * 5)
+    
+    def test_waits_for_other_process(self):
+        """Test a caller waits on another process's lock and reuses its result"""
+        import threading
+        shared = get_quote_cache()
+        shared.add('single_flight:price:MSFT:lock', 1, 15)
+        
+        def other_process_finishes():
+            shared.set('single_flight:price:MSFT:result', ('ok', Decimal('300.00')), 5)
+            shared.delete('single_flight:price:MSFT:lock')
+        threading.Timer(0.2, other_process_finishes).start()
+        
+        fetch = MagicMock()
+        self.assertEqual(single_flight('price:MSFT', fetch), Decimal('300.00'))
+        fetch.assert_not_called()
+    
+    @patch('stocks.services.fetch_stock_price')
+    def test_refresh_within_window_reuses_fetch(self, mock_fetch):
+        """Test back-to-back refreshes of a symbol make one API call and record one tick"""
+        mock_fetch.return_value = Decimal('152.00')
+        
+        first = update_single_stock_price('AAPL')
+        second = update_single_stock_price('AAPL')
+        
+        self.assertEqual(first, second)
+        mock_fetch.assert_called_once_with('AAPL')
+        self.assertEqual(StockPrice.objects.filter(stock=self.stock).count(), 1)
+
+class AsyncStockServicesTest(TestCase):
+    def setUp(self):
+        get_quote_cache().clear()
+        self.stock = Stock.objects.create(symbol='AAPL', name='Apple Inc.', price=Decimal('150.00'))
+    
+    def mock_client(self, handler):
+        import httpx
+        return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    
+    async def test_afetch_stock_price(self):
+        """Test the async fetch parses the API response without blocking"""
+        import httpx
+        client = self.mock_client(lambda request: httpx.Response(200, json={'price': '151.75'}))
+        
+        with patch('stocks.services.get_async_http_client', return_value=client), \
+             patch('stocks.services.check_rate_limit', return_value=True):
+            price = await afetch_stock_price('AAPL')
+        
+        self.assertEqual(price, Decimal('151.75'))
+    
+    async def test_afetch_stock_price_api_error(self):
+        """Test async fetch surfaces API errors like the sync variant"""
+        import httpx
+        client = self.mock_client(
+            lambda request: httpx.Response(200, json={'status': 'error', 'message': 'API key invalid'})
+        )
+        
+        with patch('stocks.services.get_async_http_client', return_value=client), \
+             patch('stocks.services.check_rate_limit', return_value=True):
+            with self.assertRaises(Exception) as context:
+                await afetch_stock_price('AAPL')
+        
+        self.assertIn('API error: API key invalid', str(context.exception))
+    
+    async def test_afetch_retries_rate_limited_response(self):
+        """Test async fetch backs off and retries after a 429"""
+        import httpx
+        responses = iter([httpx.Response(429, headers={'Retry-After': '0'}), httpx.Response(200, json={'price': '152.00'})])
+        client = self.mock_client(lambda request: next(responses))
+        
+        with patch('stocks.services.get_async_http_client', return_value=client), \
+             patch('stocks.services.check_rate_limit', return_value=True):
+            price = await afetch_stock_price('AAPL')
+        
+        self.assertEqual(price, Decimal('152.00'))
+    
+    async def test_concurrent_async_refreshes_share_one_fetch(self):
+        """Test simultaneous async refreshes of a symbol make one API call"""
+        import asyncio
+        calls = []
+        
+        async def fake_fetch(symbol):
+            calls.append(symbol)
+            await asyncio.sleep(0.05)
+            return Decimal('153.00')
+        
+        with patch('stocks.services.afetch_stock_price', side_effect=fake_fetch):
+            results = await asyncio.gather(*[aupdate_single_stock_price('AAPL') for _ in range(5)])
+        
+        self.assertEqual(calls, ['AAPL'])
+        self.assertEqual(len(set(results)), 1)
+        self.assertTrue(results[0].startswith('Updated AAPL'))
+
+class FixedPointPriceTest(TestCase):
+    def test_parse_cents_without_float(self):
+        """Test API price strings parse to exact integer cents, rounding half up"""
+        from .fixedpoint import parse_cents
+        self.assertEqual(parse_cents("150.25000"), 15025)
+        self.assertEqual(parse_cents("0.295"), 30)
+        self.assertEqual(parse_cents("0.2949"), 29)
+        self.assertEqual(parse_cents("42"), 4200)
+        self.assertEqual(parse_cents("1.5e2"), 15000)
+        self.assertEqual(parse_cents("-1.005"), -101)
+        with self.assertRaises(ValueError):
+            parse_cents("n/a")
+    
+    def test_round_trip_and_quote_cents(self):
+        """Test cents convert back to two-place Decimals and quotes carry both forms"""
+        from .fixedpoint import to_cents, from_cents
+        from .quotes import get_quote
+        self.assertEqual(from_cents(to_cents(Decimal('199.99'))), Decimal('199.99'))
+        self.assertEqual(str(from_cents(5)), '0.05')
+        
+        Stock.objects.create(symbol='AAPL', name='Apple Inc.', price=Decimal('150.29'))
+        quote = get_quote('AAPL')
+        self.assertEqual((quote['price'], quote['price_cents']), (Decimal('150.29'), 15029))
+
+class IndicatorEngineTest(TestCase):
+    def setUp(self):
+        from .indicators import get_indicator_engine
+        self.engine = get_indicator_engine()
+        self.engine.clear()
+        self.stock = Stock.objects.create(symbol='AAPL', name='Apple Inc.', price=Decimal('100.00'))
+    
+    def test_change_window(self):
+        """Test the window measures change from the newest tick at or before its start"""
+        from datetime import timedelta
+        from .indicators import ChangeWindow
+        window = ChangeWindow(minutes=5)
+        start = timezone.now()
+        for minute, cents in [(0, 10000), (3, 10100), (6, 10300), (9, 10600)]:
+            window.push(start + timedelta(minutes=minute), cents)
+        
+        # Reference is the 10100 tick at minute 3, the newest one 5+ minutes old
+        self.assertEqual(window.prices(), (10100, 10600))
+        self.assertTrue(window.moved('above', 495))
+        self.assertFalse(window.moved('above', 496))
+        self.assertFalse(window.moved('below', 1))
+        self.assertTrue(window.moved('either', 400))
+    
+    def test_sma_crossings(self):
+        """Test crossings are recorded when the price changes side of its average"""
+        from .indicators import MovingAverage
+        sma = MovingAverage('sma', 3)
+        start = timezone.now()
+        from datetime import timedelta
+        for second, cents in enumerate([100, 100, 90, 95, 120]):
+            sma.push(start + timedelta(seconds=second), cents)
+        
+        self.assertEqual(sma.total, 305)
+        self.assertEqual(sma.crossed_above_at, start + timedelta(seconds=4))
+        self.assertIsNone(sma.crossed_below_at)
+        self.assertTrue(sma.crossed_since('above', start))
+        self.assertFalse(sma.crossed_since('above', start + timedelta(seconds=4)))
+    
+    def test_seeded_once_then_fed_at_ingest(self):
+        """Test a new indicator is warmed from history and then updated by each recorded tick"""
+        from .services import record_stock_price
+        for price in ['101.00', '102.00']:
+            record_stock_price(self.stock, Decimal(price))
+        
+        with self.assertNumQueries(1):
+            sma = self.engine.require(self.stock.id, ('sma', 2))
+        self.assertEqual(sma.total, 20300)
+        
+        record_stock_price(self.stock, Decimal('104.00'))
+        with self.assertNumQueries(0):
+            self.assertIs(self.engine.require(self.stock.id, ('sma', 2)), sma)
+        self.assertEqual(sma.total, 20600)
+        # Already-applied ticks are not replayed twice
+        self.engine.sync()
+        self.assertEqual(sma.total, 20600)
+
+    def test_seed_reads_history_outside_the_lock(self):
+        """Test seeding leaves the engine lock free and re-reads history if the stock ticked meanwhile"""
+        import threading
+        from .services import record_stock_price
+        record_stock_price(self.stock, Decimal('101.00'))
+        history = self.engine._history
+        lock_free = []
+        
+        def probe(*args):
+            def try_lock():
+                acquired = self.engine._lock.acquire(blocking=False)
+                lock_free.append(acquired)
+                if acquired:
+                    self.engine._lock.release()
+            thread = threading.Thread(target=try_lock)
+            thread.start()
+            thread.join()
+            if len(lock_free) == 1:
+                record_stock_price(self.stock, Decimal('103.00'))
+            return history(*args)
+        
+        with patch.object(self.engine, '_history', side_effect=probe):
+            sma = self.engine.require(self.stock.id, ('sma', 2))
+        self.assertEqual(lock_free, [True, True])
+        self.assertEqual(sma.total, 20400)
+    
+    def test_sync_rebuilds_stock_after_late_tick(self):
+        """Test a tick committed after a newer one was applied still reaches the indicators"""
+        from .services import record_stock_price
+        record_stock_price(self.stock, Decimal('101.00'))
+        record_stock_price(self.stock, Decimal('103.00'))
+        newest = StockPrice.objects.latest('timestamp')
+
+        # Another process stamped its tick first but committed it last
+        tracked_since = self.engine.stocks[self.stock.id].tracked_since
+        late = StockPrice.objects.create(stock=self.stock, price=Decimal('90.00'))
+        late.timestamp = tracked_since + (newest.timestamp - tracked_since) / 2
+        late.save()
+
+        self.assertEqual(self.engine.sync(), 1)
+        window = self.engine.summary(self.stock.id)['windows']['15m']
+        self.assertEqual((window['count'], window['min'], window['max']), (3, 9000, 10300))
+
+        # Nothing is rebuilt or replayed a second time
+        self.assertEqual(self.engine.sync(), 0)
+        self.assertEqual(self.engine.summary(self.stock.id)['windows']['15m']['count'], 3)
+
+    def test_readers_sync_only_when_stale(self):
+        """Test per-request syncs reuse a recent catch-up instead of querying each time"""
+        from datetime import timedelta
+        from django.conf import settings
+        from .services import record_stock_price
+        record_stock_price(self.stock, Decimal('101.00'))
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.engine.sync_if_stale(), 0)
+
+        StockPrice.objects.create(stock=self.stock, price=Decimal('105.00'))
+        self.engine.synced_at -= timedelta(seconds=settings.INDICATOR_SYNC_INTERVAL)
+        self.assertEqual(self.engine.sync_if_stale(), 1)
+        self.assertEqual(self.engine.summary(self.stock.id)['windows']['15m']['max'], 10500)
+
+    def test_rolling_stats_match_window(self):
+        """Test rolling min/max/mean/stddev equal a full recomputation over the window"""
+        import random
+        import statistics
+        from datetime import timedelta
+        from .indicators import RollingStats
+        stats = RollingStats(minutes=10)
+        rng = random.Random(7)
+        start = timezone.now()
+        ticks = [(start + timedelta(minutes=i * 0.7), rng.randint(9000, 11000)) for i in range(200)]
+        for i, (timestamp, cents) in enumerate(ticks):
+            stats.push(timestamp, cents)
+            window = [c for t, c in ticks[:i + 1] if t > timestamp - timedelta(minutes=10)]
+            self.assertEqual((stats.count, stats.min, stats.max), (len(window), min(window), max(window)))
+            self.assertAlmostEqual(stats.mean, statistics.fmean(window), places=6)
+            self.assertAlmostEqual(stats.stddev, statistics.pstdev(window), places=4)
+    
+    def test_recorded_ticks_feed_default_indicators(self):
+        """Test every recorded price updates the stats, volatility and EMAs read by the API"""
+        from .services import record_stock_price
+        for price in ['101.00', '99.00', '103.00']:
+            record_stock_price(self.stock, Decimal(price))
+        
+        with self.assertNumQueries(0):
+            summary = self.engine.summary(self.stock.id)
+        window = summary['windows']['60m']
+        self.assertEqual((window['count'], window['min'], window['max']), (3, 9900, 10300))
+        self.assertAlmostEqual(window['mean'], 10100)
+        self.assertIsNotNone(summary['volatility']['60m'])
+        self.assertIsNotNone(summary['ema']['12'])
+        
+        client = APIClient()
+        user = User.objects.create_user(username='testuser', email='test@example.com', password='testpass123')
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+        response = client.get(reverse('stocks:stock-indicators', args=[self.stock.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['windows']['60m']['max'], 103.0)
+    
+    def test_snapshot_restore_replays_newer_ticks(self):
+        """Test a restored snapshot keeps its windows and catches up on ticks recorded after it"""
+        from .services import record_stock_price
+        record_stock_price(self.stock, Decimal('101.00'))
+        meta, arrays = self.engine.snapshot()
+        # Metadata must survive the JSON header of the snapshot file
+        meta = json.loads(json.dumps(meta))
+        
+        # Another process records a tick while this one is down
+        self.engine.clear()
+        StockPrice.objects.create(stock=self.stock, price=Decimal('105.00'))
+        
+        self.assertTrue(self.engine.restore(meta, arrays))
+        self.engine.sync()
+        window = self.engine.summary(self.stock.id)['windows']['15m']
+        self.assertEqual((window['count'], window['min'], window['max']), (2, 10100, 10500))
+
+    def test_snapshot_rejects_malformed_state(self):
+        """Test restore validates indicator kinds and series bounds instead of trusting the file"""
+        from .services import record_stock_price
+        record_stock_price(self.stock, Decimal('101.00'))
+        meta, arrays = self.engine.snapshot()
+        
+        bad_kind = json.loads(json.dumps(meta))
+        bad_kind['stocks'][0]['indicators'][0]['kind'] = 'os.system'
+        with self.assertRaises(ValueError):
+            self.engine.restore(bad_kind, arrays)
+        
+        out_of_range = json.loads(json.dumps(meta))
+        out_of_range['stocks'][0]['indicators'][0]['series']['values'] = [0, 0, 10 ** 6]
+        with self.assertRaises(ValueError):
+            self.engine.restore(out_of_range, arrays)
+
+class AdaptiveRefreshTest(TestCase):
+    def setUp(self):
+        from alerts.models import Alert
+        from alerts.index import get_alert_index
+        from .indicators import get_indicator_engine
+        get_alert_index().clear()
+        get_indicator_engine().clear()
+        from datetime import timedelta
+        self.user = User.objects.create_user(username='testuser', email='test@example.com', password='testpass123')
+        self.near = Stock.objects.create(symbol='AAPL', name='Apple Inc.', price=Decimal('199.50'))
+        self.far = Stock.objects.create(symbol='MSFT', name='Microsoft', price=Decimal('300.00'))
+        self.quiet = Stock.objects.create(symbol='IBM', name='IBM', price=Decimal('140.00'))
+        Alert.objects.create(user=self.user, stock=self.near, alert_type='threshold',
+                             condition='above', target_price=Decimal('200.00'))
+        Alert.objects.create(user=self.user, stock=self.far, alert_type='threshold',
+                             condition='above', target_price=Decimal('400.00'))
+        # Every stock was last refreshed five minutes ago
+        Stock.objects.update(last_updated=timezone.now() - timedelta(minutes=5))
+    
+    def test_refresh_tiers(self):
+        """Test tiers follow trigger distance and volatility"""
+        from .refresh import refresh_tier
+        self.assertEqual(refresh_tier(0.002, 0.0), 'hot')
+        self.assertEqual(refresh_tier(0.015, 0.0), 'warm')
+        self.assertEqual(refresh_tier(0.05, 0.0), 'cool')
+        self.assertEqual(refresh_tier(0.02, 0.01), 'hot')
+        self.assertEqual(refresh_tier(0.05, 0.01), 'warm')
+        self.assertEqual(refresh_tier(None, 0.0), 'idle')
+        self.assertEqual(refresh_tier(None, 0.01), 'cool')
+    
+    def test_plan_only_includes_due_stocks(self):
+        """Test stocks near a trigger are due while idle ones wait for their interval"""
+        from .refresh import plan_refresh
+        plan = plan_refresh()
+        self.assertEqual([(item['stock'].symbol, item['tier']) for item in plan], [('AAPL', 'hot')])
+    
+    def test_tier_interval_is_met_on_time(self):
+        """Test a stock refreshed just under one interval ago is due at the run that completes it"""
+        from datetime import timedelta
+        from .refresh import plan_refresh
+        now = timezone.now()
+        # 1.75% from its target: warm, refreshed every 3 minutes
+        Stock.objects.filter(symbol='AAPL').update(price=Decimal('196.50'))
+        
+        # Refreshed by the run three minutes ago, a few seconds into that run
+        Stock.objects.filter(symbol='AAPL').update(last_updated=now - timedelta(minutes=3) + timedelta(seconds=5))
+        self.assertEqual([(item['stock'].symbol, item['tier']) for item in plan_refresh(now)], [('AAPL', 'warm')])
+        
+        # ...but not at the run in between
+        Stock.objects.filter(symbol='AAPL').update(last_updated=now - timedelta(minutes=2) + timedelta(seconds=5))
+        self.assertEqual(plan_refresh(now), [])
+    
+    @patch('stocks.services.fetch_stock_price')
+    def test_budget_spent_on_most_urgent(self, mock_fetch):
+        """Test the updater spends a limited budget on the hottest stocks first"""
+        from .refresh import update_prioritized_stock_prices
+        from datetime import timedelta
+        Stock.objects.filter(symbol='MSFT').update(last_updated=timezone.now() - timedelta(hours=1))
+        mock_fetch.return_value = Decimal('199.50')
+        
+        result = update_prioritized_stock_prices(budget=1)
+        
+        mock_fetch.assert_called_once_with('AAPL')
+        self.assertEqual((result['updated_count'], result['due_count'], result['deferred_count']), (1, 2, 1))
+        self.assertEqual(result['tiers'], {'hot': 1})
+
+class MarketCalendarTest(TestCase):
+    def setUp(self):
+        from .market_calendar import get_calendar
+        self.calendar = get_calendar('NASDAQ')
+    
+    def at(self, year, month, day, hour, minute=0):
+        from datetime import datetime
+        return datetime(year, month, day, hour, minute, tzinfo=self.calendar.timezone)
+    
+    def test_us_holidays(self):
+        """Test NYSE holiday rules, including observed and moving holidays"""
+        from datetime import date
+        from .market_calendar import us_equity_holidays
+        holidays = us_equity_holidays(2021)
+        self.assertIn(date(2021, 4, 2), holidays)     # Good Friday
+        self.assertIn(date(2021, 7, 5), holidays)     # Independence Day observed Monday
+        self.assertIn(date(2021, 12, 24), holidays)   # Christmas observed Friday
+        self.assertNotIn(date(2021, 12, 31), holidays)  # Saturday New Year's Day is not moved
+        self.assertIn(date(2024, 6, 19), us_equity_holidays(2024))
+    
+    def test_sessions(self):
+        """Test regular, half-day, weekend and holiday sessions"""
+        self.assertTrue(self.calendar.is_open(self.at(2024, 3, 5, 10)))
+        self.assertFalse(self.calendar.is_open(self.at(2024, 3, 5, 9, 15)))
+        self.assertFalse(self.calendar.is_open(self.at(2024, 3, 9, 12)))   # Saturday
+        self.assertFalse(self.calendar.is_open(self.at(2024, 11, 28, 12)))  # Thanksgiving
+        # Day after Thanksgiving closes at 13:00
+        self.assertTrue(self.calendar.is_open(self.at(2024, 11, 29, 12, 30)))
+        self.assertFalse(self.calendar.is_open(self.at(2024, 11, 29, 14)))
+    
+    def test_last_close_and_next_open(self):
+        """Test session boundaries skip weekends and holidays"""
+        # July 3rd 2024 was a half-day and July 4th a holiday
+        self.assertEqual(self.calendar.last_close(self.at(2024, 7, 4, 12)), self.at(2024, 7, 3, 13))
+        self.assertEqual(self.calendar.next_open(self.at(2024, 7, 4, 12)), self.at(2024, 7, 5, 9, 30))
+    
+    def test_closing_update_refreshes_stale_stocks_once(self):
+        """Test the post-close job only fetches stocks not updated since the close"""
+        from datetime import timedelta
+        from .refresh import update_closing_prices
+        stale = Stock.objects.create(symbol='AAPL', name='Apple Inc.', price=Decimal('150.00'))
+        Stock.objects.create(symbol='MSFT', name='Microsoft', price=Decimal('300.00'))
+        now = timezone.now()
+        closed_at = self.calendar.last_close(now)
+        Stock.objects.filter(pk=stale.pk).update(last_updated=closed_at - timedelta(minutes=10))
+        
+        with patch('stocks.services.fetch_stock_price', return_value=Decimal('151.00')) as mock_fetch:
+            result = update_closing_prices(self.calendar, now=now)
+        
+        mock_fetch.assert_called_once_with('AAPL')
+        self.assertEqual(result['updated_count'], 1)
+
 class StockTasksTest(TestCase):
     def setUp(self):
         self.stock = Stock.objects.create(
@@ -1,10 +1,16 @@
 from django.urls import path
-from .views import UpdateStockPriceView, StockListView, StockDetailView
+from .views import (
+    UpdateStockPriceView, StockListView, StockDetailView, StockPriceExportView, StockPriceHistoryView,
+    StockIndicatorsView,
+)
 
 app_name = 'stocks'
 
 urlpatterns = [
     path('stocks/', StockListView.as_view(), name='stock-list'),
     path('stocks/<int:pk>/', StockDetailView.as_view(), name='stock-detail'),
+    path('stocks/<int:pk>/history/', StockPriceHistoryView.as_view(), name='stock-history'),
+    path('stocks/<int:pk>/indicators/', StockIndicatorsView.as_view(), name='stock-indicators'),
     path('update-price/', UpdateStockPriceView.as_view(), name='update-price'),
+    path('export/prices/', StockPriceExportView.as_view(), name='export-prices'),
 ]
@@ -1,51 +1,230 @@
+import json
+from datetime import timedelta
+
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
 from rest_framework.generics import ListAPIView, RetrieveAPIView
-from .models import Stock
-from .services import fetch_stock_price, validate_stock_symbol, update_single_stock_price
-from .serializers import StockSerializer
+from django.conf import settings
+from django.shortcuts import get_object_or_404
+from django.http import JsonResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from .models import Stock, StockPrice
+from .services import (
+    validate_stock_symbol, aupdate_single_stock_price, get_price_history_ohlc
+)
+from accounts.authentication import aauthenticate_jwt
+from .quotes import get_price_version, version_from_datetime
+from .indicators import get_indicator_engine
+from .serializers import StockSerializer, PriceBucketSerializer
+from stockAlertSystem.pagination import SymbolCursorPagination
+from .exports import EXPORT_CHUNK_SIZE, EXPORT_FORMATS, parse_time_range, streaming_export_response
+
+
+# Cached payloads are keyed by price version, so the timeout only bounds memory
+STOCK_PAYLOAD_CACHE_TIMEOUT = 300  # seconds
+
+def price_version(request):
+    """get_price_version() read once per request for the ETag, Last-Modified and payload key"""
+    if getattr(request, '_price_version', None) is None:
+        request._price_version = get_price_version()
+    return request._price_version
 
+def stock_etag(request, *args, **kwargs):
+    latest, count = price_version(request)
+    return f"stocks-{version_from_datetime(latest)}-{count}"
 
-class StockListView(ListAPIView):
+def stock_last_modified(request, *args, **kwargs):
+    return price_version(request)[0]
+
+class CachedStockPayloadMixin:
+    """
+    Conditional GET and server-side payload caching for stock endpoints.
+    Clients holding the current ETag get a 304; everyone else shares one
+    serialized payload per price version until the next price update.
+    """
+    @method_decorator(condition(etag_func=stock_etag, last_modified_func=stock_last_modified))
+    def get(self, request, *args, **kwargs):
+        cache_key = f"stock_payload:{stock_etag(request)}:{request.build_absolute_uri()}"
+        data = cache.get(cache_key)
+        if data is None:
+            response = super().get(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            data = response.data
+            cache.set(cache_key, data, STOCK_PAYLOAD_CACHE_TIMEOUT)
+        
+        response = Response(data)
+        patch_cache_control(response, private=True, max_age=0, must_revalidate=True)
+        return response
+
+class StockListView(CachedStockPayloadMixin, ListAPIView):
     """View for listing all stocks"""
     queryset = Stock.objects.filter(is_active=True).order_by('symbol')
     serializer_class = StockSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = SymbolCursorPagination
 
-class StockDetailView(RetrieveAPIView):
+class StockDetailView(CachedStockPayloadMixin, RetrieveAPIView):
     """View for retrieving specific stock details"""
     queryset = Stock.objects.filter(is_active=True)
     serializer_class = StockSerializer
     permission_classes = [IsAuthenticated]
     lookup_field = 'pk'
 
-class UpdateStockPriceView(APIView):
+class StockPriceHistoryView(APIView):
+    """Downsampled OHLC price history for one stock, capped in size"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        stock = get_object_or_404(Stock, pk=pk, is_active=True)
+
+        try:
+            start, end = parse_time_range(request.query_params)
+            history = get_price_history_ohlc(
+                stock,
+                start=start,
+                end=end,
+                interval=request.query_params.get('interval') or None,
+            )
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+
+        return Response({
+            "symbol": history['symbol'],
+            "interval": history['interval'],
+            "start": history['start'],
+            "end": history['end'],
+            "buckets": PriceBucketSerializer(history['buckets'], many=True).data,
+        })
+
+def cents_to_price(cents):
+    """Indicator values are float cents; report them in price units"""
+    return None if cents is None else round(cents / 100, 4)
+
+class StockIndicatorsView(APIView):
+    """Streaming indicators for one stock, read from the in-memory engine"""
     permission_classes = [IsAuthenticated]
 
-    def post(self, request):
-        symbol = request.data.get("symbol")
+    def get(self, request, pk):
+        stock = get_object_or_404(Stock, pk=pk, is_active=True)
+
+        engine = get_indicator_engine()
+        engine.sync_if_stale()
+        summary = engine.summary(stock.id)
+
+        return Response({
+            "symbol": stock.symbol,
+            "last_tick": summary['last_timestamp'],
+            "windows": {
+                name: {
+                    "count": stats['count'],
+                    "min": cents_to_price(stats['min']),
+                    "max": cents_to_price(stats['max']),
+                    "mean": cents_to_price(stats['mean']),
+                    "stddev": cents_to_price(stats['stddev']),
+                    "volatility": summary['volatility'][name],
+                }
+                for name, stats in summary['windows'].items()
+            },
+            "ema": {period: cents_to_price(value) for period, value in summary['ema'].items()},
+        })
+
+def read_json_payload(request):
+    """Parse a JSON (or form-encoded) request body for plain Django views"""
+    if request.content_type == 'application/json':
+        payload = json.loads(request.body or b'{}')
+        if not isinstance(payload, dict):
+            raise ValueError("Request body must be a JSON object")
+        return payload
+    return request.POST
+
+@method_decorator(csrf_exempt, name='dispatch')
+class UpdateStockPriceView(View):
+    """
+    Refresh one stock's price from the API. Async, so a slow upstream call
+    does not tie up a worker; serve it through asgi.py to get the benefit.
+    """
+    async def post(self, request):
+        user = await aauthenticate_jwt(request)
+        if user is None:
+            return JsonResponse({"error": "Authentication credentials were not provided or are invalid"}, status=401)
+
+        try:
+            symbol = read_json_payload(request).get("symbol")
+        except ValueError:
+            return JsonResponse({"error": "Invalid JSON body"}, status=400)
 
         if not symbol:
-            return Response({"error": "Symbol is required"}, status=400)
+            return JsonResponse({"error": "Symbol is required"}, status=400)
 
         # Validate symbol format
         is_valid, message = validate_stock_symbol(symbol)
         if not is_valid:
-            return Response({"error": message}, status=400)
+            return JsonResponse({"error": message}, status=400)
 
         try:
-            # Use the update function that handles the database update
-            result = update_single_stock_price(symbol)
+            result = await aupdate_single_stock_price(symbol)
             if result and not result.startswith("Error:"):
-                return Response({
+                return JsonResponse({
                     "message": f"Price updated successfully for {symbol}",
                     "status": "success"
                 }, status=200)
             else:
-                return Response({
+                return JsonResponse({
                     "error": result or f"Failed to update price for {symbol}"
                 }, status=500)
         except Exception as e:
-            return Response({"error": str(e)}, status=500)
+            return JsonResponse({"error": str(e)}, status=500)
+
+class StockPriceExportView(APIView):
+    """
+    Stream raw price history as CSV or NDJSON, filtered by symbol and time range.
+    Raw ticks are only kept for RAW_PRICE_RETENTION_DAYS, so ranges starting
+    earlier are rejected rather than silently truncated; older history is
+    available as OHLC buckets from StockPriceHistoryView.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        output = request.query_params.get('output', 'csv').lower()
+        if output not in EXPORT_FORMATS:
+            return Response({"error": f"Unsupported output format: {output}"}, status=400)
+
+        try:
+            start, end = parse_time_range(request.query_params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+
+        retention = timedelta(days=settings.RAW_PRICE_RETENTION_DAYS)
+        if start and start < timezone.now() - retention:
+            return Response({
+                "error": f"Raw prices are kept for {retention.days} days; use the stock history endpoint for older ranges"
+            }, status=400)
+
+        prices = StockPrice.objects.all()
+        symbol = request.query_params.get('symbol', '').upper()
+        if symbol:
+            prices = prices.filter(stock__symbol=symbol)
+        if start:
+            prices = prices.filter(timestamp__gte=start)
+        if end:
+            prices = prices.filter(timestamp__lte=end)
+
+        rows = prices.order_by('timestamp', 'id').values_list(
+            'stock__symbol', 'price', 'timestamp'
+        ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+        return streaming_export_response(
+            rows,
+            header=['symbol', 'price', 'timestamp'],
+            output=output,
+            filename=f"prices_{symbol.lower() or 'all'}",
+        )